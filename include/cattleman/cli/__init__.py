@@ -1,8 +1,9 @@
 import argparse
 from abc import abstractmethod, ABC
-from typing import Optional
+from typing import Optional, List
 
-from cattleman.types import Arguments
+# same as cattleman.types.Arguments, kept here so that the CLI does not load the resource types
+Arguments = List[str]
 
 
 class AbstractCLICommand(ABC):
@@ -29,6 +30,22 @@ class AbstractCLICommand(ABC):
             action="store_true",
             help="Enable debug mode"
         )
+        parser.add_argument(
+            "--profile",
+            nargs="?",
+            default=None,
+            const="",
+            metavar="OUTPUT",
+            help="Run a sampling profiler and write the stacks (in the collapsed format used "
+                 "by flamegraph tools) to OUTPUT, defaults to ~/.cattleman/profiles/. "
+                 "Sending SIGUSR1 to a running process toggles the profiler"
+        )
+        parser.add_argument(
+            "--profile-interval",
+            default=0.01,
+            type=float,
+            help="Seconds between two samples of the profiler"
+        )
         return parser
 
     @classmethod
@@ -51,5 +68,6 @@ class AbstractCLICommand(ABC):
 
 
 __all__ = [
+    "Arguments",
     "AbstractCLICommand"
 ]
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import tempfile
+from typing import Optional, Dict, Any
+
+from .. import AbstractCLICommand, Arguments
+from ...logger import cmlogger
+from ...orchestrator.simulation import Scenario, Simulation
+from ...persistency import Persistency
+from ...utils.trace import TraceReplayer
+
+
+def _speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def _print(title: str, summary: Dict[str, Any], as_json: bool):
+    if as_json:
+        print(json.dumps(summary, indent=4))
+        return
+    print(title)
+    for key, value in summary.items():
+        print(f"  {key:28s} {value}")
+
+
+class CLIBenchCommand(AbstractCLICommand):
+
+    KEY = 'bench'
+
+    @staticmethod
+    def parser(parent: Optional[argparse.ArgumentParser] = None,
+               args: Optional[Arguments] = None) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(parents=[parent])
+        parser.add_argument(
+            "action",
+            choices=["replay", "simulate"],
+            help="Replay a trace recorded with 'cattle manager --record' or run a simulation"
+        )
+        parser.add_argument(
+            "trace",
+            nargs="?",
+            default=None,
+            help="Trace to replay"
+        )
+        parser.add_argument(
+            "--speed",
+            default=None,
+            type=_speed,
+            help="Replay speed, 1 for the recorded pace, N for N times faster, 'max' (default) "
+                 "for as fast as possible"
+        )
+        parser.add_argument(
+            "--db",
+            default=None,
+            help="Where to create the (fresh) database the trace is replayed against, "
+                 "defaults to a temporary file"
+        )
+        parser.add_argument(
+            "--hours",
+            default=1.0,
+            type=float,
+            help="Simulated hours"
+        )
+        parser.add_argument(
+            "--nodes",
+            default=100,
+            type=int,
+            help="Number of simulated nodes"
+        )
+        parser.add_argument(
+            "--seed",
+            default=0,
+            type=int,
+            help="Seed of the simulated scenario"
+        )
+        parser.add_argument(
+            "--json",
+            default=False,
+            action="store_true",
+            help="Print the report as JSON"
+        )
+        return parser
+
+    @staticmethod
+    def execute(parsed: argparse.Namespace) -> bool:
+        if parsed.action == "replay":
+            return CLIBenchCommand._replay(parsed)
+        return CLIBenchCommand._simulate(parsed)
+
+    @staticmethod
+    def _replay(parsed: argparse.Namespace) -> bool:
+        if parsed.trace is None:
+            cmlogger.error("A trace file is required, e.g., 'cattle bench replay trace.cbor'")
+            return False
+        database = parsed.db or os.path.join(tempfile.mkdtemp(prefix="cattle-bench-"),
+                                             "resources.db")
+        if os.path.exists(database):
+            cmlogger.error(f"The database '{database}' already exists, traces are replayed "
+                           f"against a fresh one.")
+            return False
+        report = TraceReplayer(parsed.trace, parsed.speed).replay(database)
+        summary = report.summary()
+        summary["database"] = database
+        for op, stats in sorted(report.operations.items()):
+            summary[f"{op}_ops"] = stats.items
+            summary[f"{op}_p99_ms"] = round(stats.percentile(99) * 1000, 3)
+        _print(f"Replayed '{parsed.trace}':", summary, parsed.json)
+        return True
+
+    @staticmethod
+    def _simulate(parsed: argparse.Namespace) -> bool:
+        # simulations never touch the database on disk
+        Persistency.relocate("resources", ":memory:")
+        scenario = Scenario.generate(hours=parsed.hours, nodes=parsed.nodes, seed=parsed.seed)
+        report = Simulation(scenario).run()
+        _print(f"Simulated {parsed.hours:g}h on {parsed.nodes} nodes:", report.summary(),
+               parsed.json)
+        return True
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+from typing import Optional
+
+from .. import AbstractCLICommand, Arguments
+from ...network.dns import DNSIndex
+from ...network.dns_server import DNSServer, DEFAULT_DNS_HOST, DEFAULT_DNS_PORT
+
+
+class CLIDNSCommand(AbstractCLICommand):
+
+    KEY = 'dns'
+
+    @staticmethod
+    def parser(parent: Optional[argparse.ArgumentParser] = None,
+               args: Optional[Arguments] = None) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(parents=[parent])
+        parser.add_argument(
+            "-H",
+            "--host",
+            default=DEFAULT_DNS_HOST,
+            help="Address to listen on"
+        )
+        parser.add_argument(
+            "-p",
+            "--port",
+            default=DEFAULT_DNS_PORT,
+            type=int,
+            help="UDP port to listen on"
+        )
+        return parser
+
+    @staticmethod
+    def execute(parsed: argparse.Namespace) -> bool:
+        # build the resolution index from the DNSRecord resources
+        index = DNSIndex()
+        index.load_from_disk()
+        index.attach()
+        # serve
+        server = DNSServer(index, parsed.host, parsed.port)
+        asyncio.run(server.serve_forever())
+        # ---
+        return True
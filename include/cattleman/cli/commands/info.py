@@ -1,8 +1,12 @@
 import argparse
+import json
+import os
 from typing import Optional
 
-from .. import AbstractCLICommand
-from ...types import Arguments
+from .. import AbstractCLICommand, Arguments
+from ...constants import STATS_DIR
+from ...logger import cmlogger
+from ...utils.misc import human_size
 
 
 class CLIInfoCommand(AbstractCLICommand):
@@ -13,9 +17,139 @@ class CLIInfoCommand(AbstractCLICommand):
     def parser(parent: Optional[argparse.ArgumentParser] = None,
                args: Optional[Arguments] = None) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(parents=[parent])
+        parser.add_argument(
+            "--queries",
+            default=False,
+            action="store_true",
+            help="Show the statistics of the database queries run by the manager "
+                 "(started with CATTLEMAN_QUERY_STATS=1)"
+        )
+        parser.add_argument(
+            "--memory",
+            default=False,
+            action="store_true",
+            help="Load the resources from disk (as the manager does) and show what holds "
+                 "the memory"
+        )
+        parser.add_argument(
+            "--allocations",
+            default=False,
+            action="store_true",
+            help="With --memory, also trace the allocations (tracemalloc) and show the largest "
+                 "allocation sites, this roughly doubles the memory used and the time it takes"
+        )
+        parser.add_argument(
+            "--top",
+            default=20,
+            type=int,
+            help="Number of entries to show in each table"
+        )
+        parser.add_argument(
+            "--json",
+            default=False,
+            action="store_true",
+            help="Print the statistics as JSON"
+        )
         return parser
 
     @staticmethod
     def execute(parsed: argparse.Namespace) -> bool:
-        # ---
+        if parsed.queries:
+            return CLIInfoCommand._queries(parsed)
+        if parsed.memory:
+            return CLIInfoCommand._memory(parsed)
+        return CLIInfoCommand._summary(parsed)
+
+    @staticmethod
+    def _summary(parsed: argparse.Namespace) -> bool:
+        import dataclasses
+        from ...persistency import Persistency
+        summary = Persistency.summary(recent=parsed.top)
+        if parsed.json:
+            print(json.dumps({**dataclasses.asdict(summary), "failing": summary.failing},
+                             indent=4))
+            return True
+        print(f"Database: {summary.path} ({human_size(summary.size)})")
+        print(f"Resources: {sum(summary.resources.values())}")
+        for table, count in summary.resources.items():
+            print(f"  {table:14s} {count:10d}")
+        print(f"Relations: {sum(summary.relations.values())}")
+        for relation, count in sorted(summary.relations.items()):
+            print(f"  {relation:14s} {count:10d}")
+        print(f"Failing: {summary.failing}")
+        for type, keys in sorted(summary.failures.items()):
+            for key, count in sorted(keys.items()):
+                print(f"  {type:14s} {key:14s} {count:10d}")
+        if summary.recent_failures:
+            print("Recent failures:")
+            for failure in summary.recent_failures:
+                print(f"  {failure['date']}  {failure['id']:32s} {failure['key']:14s} "
+                      f"{failure['description'] or ''}")
+        return True
+
+    @staticmethod
+    def _queries(parsed: argparse.Namespace) -> bool:
+        path = os.path.join(STATS_DIR, "queries.json")
+        if not os.path.isfile(path):
+            cmlogger.error("No query statistics found, run the manager with "
+                           "CATTLEMAN_QUERY_STATS=1 (and/or CATTLEMAN_SLOW_QUERY_MS=N).")
+            return False
+        with open(path, "rt") as fin:
+            stats = json.load(fin)
+        if parsed.json:
+            print(json.dumps(stats, indent=4))
+            return True
+        for database, statements in stats["databases"].items():
+            top = sorted(statements.items(), key=lambda s: s[1]["total_ms"], reverse=True)
+            print(f"Database '{database}' ({len(statements)} statements):")
+            print(f"  {'calls':>9s} {'total ms':>11s} {'p50 ms':>9s} {'p99 ms':>9s} "
+                  f"{'rows':>10s} {'slow':>6s}  statement")
+            for sql, s in top[:parsed.top]:
+                print(f"  {s['calls']:9d} {s['total_ms']:11.3f} {s['p50_ms']:9.3f} "
+                      f"{s['p99_ms']:9.3f} {s['rows']:10d} {s['slow']:6d}  {sql}")
+        return True
+
+    @staticmethod
+    def _memory(parsed: argparse.Namespace) -> bool:
+        from ...network.dns import DNSIndex
+        from ...network.ports import PortAllocator
+        from ...network.routing import RoutingTable
+        from ...orchestrator.planner import DependencyGraph
+        from ...persistency import Persistency
+        from ...utils.memory import MemoryAccountant
+        accountant = MemoryAccountant(top=parsed.top)
+        if parsed.allocations:
+            accountant.start()
+        # what the manager (and the proxy and DNS server) build on start
+        Persistency.load_from_disk()
+        caches = {}
+        for name, cache in [("ports", PortAllocator()), ("routing", RoutingTable()),
+                            ("dns", DNSIndex())]:
+            cache.load_from_disk()
+            caches[name] = cache
+        caches["relations"] = DependencyGraph.from_database()
+        report = accountant.report(caches)
+        accountant.stop()
+        if parsed.json:
+            print(json.dumps(report.summary(), indent=4))
+            return True
+        if parsed.allocations:
+            print(f"Traced: {human_size(report.traced)} "
+                  f"(peak {human_size(report.traced_peak)})")
+        print(f"KnowledgeBase: {human_size(report.index + report.resources)} "
+              f"(index {human_size(report.index)}, status lists {human_size(report.status)})")
+        print(f"  {'type':14s} {'count':>10s} {'total':>12s} {'mean':>12s} {'status':>12s}")
+        for type, usage in sorted(report.types.items(), key=lambda t: -t[1].bytes):
+            print(f"  {type:14s} {usage.count:10d} {human_size(usage.bytes):>12s} "
+                  f"{human_size(usage.mean):>12s} {human_size(usage.status):>12s}")
+        print("Caches and indices:")
+        for name, size in report.caches.items():
+            print(f"  {name:14s} {human_size(size):>12s}")
+        print("Largest resources:")
+        for size, id, _ in report.largest:
+            print(f"  {id:32s} {human_size(size):>12s}")
+        if parsed.allocations:
+            print("Largest allocation sites:")
+            for size, count, site in report.sites:
+                print(f"  {human_size(size):>12s} {count:10d}  {site}")
         return True
@@ -1,10 +1,15 @@
 import argparse
 from typing import Optional
 
-from .. import AbstractCLICommand
+from .. import AbstractCLICommand, Arguments
+from ...network.ports import PortAllocator
 from ...orchestrator.orchestrator import Orchestrator
 from ...persistency import Persistency
-from ...types import Arguments
+from ...utils.metrics import PrometheusExporter
+from ...utils.trace import TraceRecorder
+
+# how often query statistics (when enabled) are saved for 'cattle info --queries'
+QUERY_STATS_INTERVAL = 30.0
 
 
 class CLIManagerCommand(AbstractCLICommand):
@@ -15,15 +20,71 @@ class CLIManagerCommand(AbstractCLICommand):
     def parser(parent: Optional[argparse.ArgumentParser] = None,
                args: Optional[Arguments] = None) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(parents=[parent])
+        parser.add_argument(
+            "--record",
+            default=None,
+            help="Record the operations on the resources to this trace file "
+                 "(replay it with 'cattle bench replay')"
+        )
+        parser.add_argument(
+            "--metrics-file",
+            default=None,
+            help="Write the metrics (in Prometheus text format) to this file periodically, "
+                 "e.g., for the node exporter's textfile collector"
+        )
+        parser.add_argument(
+            "--metrics-port",
+            default=None,
+            type=int,
+            help="Serve the metrics (in Prometheus text format) on this local port"
+        )
+        parser.add_argument(
+            "--metrics-interval",
+            default=15.0,
+            type=float,
+            help="How often (in seconds) the metrics file is written"
+        )
         return parser
 
     @staticmethod
     def execute(parsed: argparse.Namespace) -> bool:
+        # start recording before anything touches the database
+        recorder = TraceRecorder(parsed.record) if parsed.record else None
+        if recorder is not None:
+            recorder.start()
         # load configuration from disk
         Persistency.load_from_disk()
+        # rebuild port reservations and keep them in sync with the Port resources
+        ports = PortAllocator()
+        ports.load_from_disk()
+        ports.attach()
         # create orchestrator (aka manager)
         orchestrator = Orchestrator()
+        if any(db.profiling for db in Persistency.databases().values()):
+            def save_query_stats(_):
+                Persistency.save_query_stats()
+                orchestrator.timers.schedule(QUERY_STATS_INTERVAL, save_query_stats)
+
+            orchestrator.timers.schedule(QUERY_STATS_INTERVAL, save_query_stats)
+        # export metrics
+        exporter = PrometheusExporter(orchestrator.metrics)
+        if parsed.metrics_port is not None:
+            exporter.serve(parsed.metrics_port)
+        if parsed.metrics_file:
+            def write_metrics(_):
+                exporter.write(parsed.metrics_file)
+                orchestrator.timers.schedule(parsed.metrics_interval, write_metrics)
+
+            write_metrics(None)
         # run orchestrator
-        orchestrator.run()
+        try:
+            orchestrator.run()
+        finally:
+            if recorder is not None:
+                recorder.stop()
+            Persistency.save_query_stats()
+            if parsed.metrics_file:
+                exporter.write(parsed.metrics_file)
+            exporter.close()
         # ---
         return True
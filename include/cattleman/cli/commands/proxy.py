@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+from typing import Optional
+
+from .. import AbstractCLICommand, Arguments
+from ...network.proxy import Proxy
+
+
+class CLIProxyCommand(AbstractCLICommand):
+
+    KEY = 'proxy'
+
+    @staticmethod
+    def parser(parent: Optional[argparse.ArgumentParser] = None,
+               args: Optional[Arguments] = None) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(parents=[parent])
+        parser.add_argument(
+            "-H",
+            "--host",
+            default="0.0.0.0",
+            help="Address to listen on"
+        )
+        parser.add_argument(
+            "--reload",
+            default=2.0,
+            type=float,
+            help="How often (in seconds) to check the database for changes to the port mappings"
+        )
+        parser.add_argument(
+            "--pool-size",
+            default=4,
+            type=int,
+            help="Number of connections to each TCP backend opened ahead of time, each one "
+                 "serves a single client"
+        )
+        parser.add_argument(
+            "--no-zero-copy",
+            default=False,
+            action="store_true",
+            help="Copy data through user space instead of using splice(2)"
+        )
+        parser.add_argument(
+            "--affinity",
+            default=False,
+            action="store_true",
+            help="Send each client to the same backend (consistent hashing on the client address)"
+        )
+        return parser
+
+    @staticmethod
+    def execute(parsed: argparse.Namespace) -> bool:
+        proxy = Proxy(parsed.host, pool_size=parsed.pool_size,
+                      zero_copy=False if parsed.no_zero_copy else None, affinity=parsed.affinity)
+
+        async def run():
+            # keep the routes in sync with the Service/Port resources
+            proxy.attach()
+            try:
+                await proxy.watch(parsed.reload)
+            finally:
+                proxy.detach()
+                await proxy.close()
+
+        asyncio.run(run())
+        # ---
+        return True
@@ -1,20 +1,34 @@
 import argparse
 import logging
+import os
+import signal
 import sys
+from typing import Type
 
 import cattleman
+from cattleman.cli import AbstractCLICommand
+from cattleman.constants import PROFILES_DIR
 from cattleman.exceptions import CattlemanException
 
 from cattleman.logger import cmlogger
-from cattleman.cli.commands.info import CLIInfoCommand
-from cattleman.cli.commands.manager import CLIManagerCommand
+from cattleman.utils.profiler import SamplingProfiler, install_toggle
 
+# commands are imported when they run, each one only pays for its own dependencies
 _supported_commands = {
-    'info': CLIInfoCommand,
-    'manager': CLIManagerCommand,
+    'bench': ('cattleman.cli.commands.bench', 'CLIBenchCommand'),
+    'dns': ('cattleman.cli.commands.dns', 'CLIDNSCommand'),
+    'info': ('cattleman.cli.commands.info', 'CLIInfoCommand'),
+    'manager': ('cattleman.cli.commands.manager', 'CLIManagerCommand'),
+    'proxy': ('cattleman.cli.commands.proxy', 'CLIProxyCommand'),
 }
 
 
+def _command(name: str) -> Type[AbstractCLICommand]:
+    module, klass = _supported_commands[name]
+    # unlike importlib.import_module, __import__ shows up in `python -X importtime`
+    return getattr(__import__(module, fromlist=[klass]), klass)
+
+
 def run():
     cmlogger.info(f"Cattleman - v{cattleman.__version__}")
     parser = argparse.ArgumentParser(add_help=False)
@@ -30,13 +44,20 @@ def run():
     # parse `command`
     parsed, remaining = parser.parse_known_args()
     # get command
-    command = _supported_commands[parsed.command]
+    command = _command(parsed.command)
     # let the command parse its arguments
     cmd_parser = command.get_parser(remaining)
     parsed = cmd_parser.parse_args(remaining)
     # enable debug
     if parsed.debug:
         cmlogger.setLevel(logging.DEBUG)
+    # profiler, started right away with --profile, or later with SIGUSR1
+    output = parsed.profile or os.path.join(PROFILES_DIR, f"{command.KEY}-{os.getpid()}.folded")
+    profiler = SamplingProfiler(output, interval=parsed.profile_interval)
+    if hasattr(signal, "SIGUSR1"):
+        install_toggle(profiler)
+    if parsed.profile is not None:
+        profiler.start()
     # execute command
     try:
         command.execute(parsed)
@@ -44,6 +65,8 @@ def run():
         cmlogger.error(str(e))
     except KeyboardInterrupt:
         cmlogger.info(f"Operation aborted by the user")
+    finally:
+        profiler.stop()
 
 
 if __name__ == '__main__':
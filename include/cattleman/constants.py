@@ -4,8 +4,11 @@ DEBUG = False
 
 USER_DATA_DIR = os.environ.get("CATTLEMAN_USER_DATA_DIR", os.path.expanduser("~/.cattleman"))
 DATABASES_DIR = os.path.join(USER_DATA_DIR, "databases")
+STATS_DIR = os.path.join(USER_DATA_DIR, "stats")
+PROFILES_DIR = os.path.join(USER_DATA_DIR, "profiles")
 
 DATABASE_SCHEMA_VERSION = "1.0"
+FRAGMENT_SCHEMA_VERSION = "1.0"
 
 UNDEFINED = object()
 REQUIRED = object()
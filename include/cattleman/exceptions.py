@@ -1,4 +1,4 @@
-from typing import Union, Tuple, Optional
+from typing import Union, Tuple, Optional, List
 
 
 class CattlemanException(RuntimeError):
@@ -52,3 +52,90 @@ class MissingParameterException(CattlemanException):
         msg = f"The method {klass.__name__}.{method} expects parameter '{parameter}' which was " \
               f"not passed."
         super(MissingParameterException, self).__init__(msg)
+
+
+class FragmentPatchException(CattlemanException):
+
+    def __init__(self, path: tuple, reason: str):
+        path = "/".join(map(str, path))
+        msg = f"Cannot patch fragment at '/{path}': {reason}."
+        super(FragmentPatchException, self).__init__(msg)
+
+
+class SchemaValidationException(CattlemanException):
+
+    def __init__(self, schema: str, version: str, error: str):
+        msg = f"Validation against schema '{schema}' (v{version}) failed: {error}"
+        super(SchemaValidationException, self).__init__(msg)
+
+
+class BackpressureException(CattlemanException):
+    pass
+
+
+class QueueFullException(BackpressureException):
+
+    def __init__(self, queue: str, capacity: int):
+        msg = f"Queue '{queue}' is full (capacity: {capacity}), try again later."
+        super(QueueFullException, self).__init__(msg)
+
+
+class RateLimitedException(BackpressureException):
+
+    def __init__(self, source: str, rate: float):
+        msg = f"Source '{source}' exceeded its rate limit of {rate:g} requests/s, " \
+              f"try again later."
+        super(RateLimitedException, self).__init__(msg)
+
+
+class SchedulingException(CattlemanException):
+
+    def __init__(self, pod: str, cluster: str):
+        msg = f"Could not find a node with enough capacity for pod '{pod}' in cluster '{cluster}'."
+        super(SchedulingException, self).__init__(msg)
+
+
+class PortConflictException(CattlemanException):
+
+    def __init__(self, port: int, protocol: str, ip: Optional[str] = None,
+                 owner: Optional[str] = None):
+        where = f" on {ip}" if ip else ""
+        extra = f" by '{owner}'" if owner else ""
+        msg = f"Port {port}/{protocol}{where} is already in use{extra}."
+        super(PortConflictException, self).__init__(msg)
+
+
+class PortsExhaustedException(CattlemanException):
+
+    def __init__(self, protocol: str, start: int, end: int):
+        msg = f"No free {protocol} ports left in the range [{start}, {end}]."
+        super(PortsExhaustedException, self).__init__(msg)
+
+
+class IPPoolNotFoundException(CattlemanException):
+
+    def __init__(self, name: str):
+        msg = f"IP pool with name '{name}' not found."
+        super(IPPoolNotFoundException, self).__init__(msg)
+
+
+class IPPoolExhaustedException(CattlemanException):
+
+    def __init__(self, name: str, network: str):
+        msg = f"IP pool '{name}' ({network}) has no free addresses left."
+        super(IPPoolExhaustedException, self).__init__(msg)
+
+
+class IPAddressConflictException(CattlemanException):
+
+    def __init__(self, address: str, pool: str):
+        msg = f"IP address {address} is already allocated in pool '{pool}'."
+        super(IPAddressConflictException, self).__init__(msg)
+
+
+class DependencyCycleException(CattlemanException):
+
+    def __init__(self, cycle: List[str]):
+        self.cycle = cycle
+        msg = f"The dependencies of the resources form a cycle: {' -> '.join(cycle)}."
+        super(DependencyCycleException, self).__init__(msg)
@@ -0,0 +1,254 @@
+import dataclasses
+import hashlib
+from enum import Enum
+from operator import itemgetter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple, Union
+
+from cattleman.exceptions import FragmentPatchException
+from cattleman.types import Fragment
+
+IdentityKey = Callable[[Any], Hashable]
+Path = Tuple[Hashable, ...]
+
+# list entries are matched by identity (e.g., services by application ID) instead of position
+IDENTITY_KEYS: Dict[str, IdentityKey] = {
+    "services": itemgetter("application"),
+    "retire": lambda value: value,
+}
+
+_DIGEST_SIZE = 16
+
+
+class ChangeType(Enum):
+    REMOVE = "remove"
+    REPLACE = "replace"
+    ADD = "add"
+
+
+@dataclasses.dataclass(frozen=True)
+class FragmentChange:
+    type: ChangeType
+    path: Path
+    value: Any = None
+    # position of the new entry inside its (keyed) list, only used by ADD on lists
+    index: Optional[int] = None
+
+
+class _Node:
+
+    __slots__ = ("digest", "value", "children", "keys")
+
+    def __init__(self, digest: bytes, value: Any, children: Union[None, Dict, List] = None,
+                 keys: Optional[List[Hashable]] = None):
+        self.digest: bytes = digest
+        self.value: Any = value
+        self.children: Union[None, Dict[str, '_Node'], List['_Node']] = children
+        self.keys: Optional[List[Hashable]] = keys
+
+
+def _leaf(value: Any) -> _Node:
+    encoded = f"{type(value).__name__}:{value!r}".encode("utf-8")
+    # short values are their own digest (shorter than a real digest, so they cannot collide)
+    if len(encoded) < _DIGEST_SIZE:
+        return _Node(encoded, value)
+    return _Node(hashlib.blake2b(encoded, digest_size=_DIGEST_SIZE).digest(), value)
+
+
+def _build(value: Any, field: Optional[str], identity_keys: Dict[str, IdentityKey]) -> _Node:
+    # dictionaries (digest does not depend on the order of the keys)
+    if isinstance(value, dict):
+        children = {k: _build(v, k, identity_keys) for k, v in value.items()}
+        hasher = hashlib.blake2b(b"d", digest_size=_DIGEST_SIZE)
+        for k in sorted(children, key=str):
+            hasher.update(str(k).encode("utf-8"))
+            hasher.update(children[k].digest)
+        return _Node(hasher.digest(), value, children)
+    # lists (digest depends on the order of the entries)
+    if isinstance(value, (list, tuple)):
+        children = [_build(v, None, identity_keys) for v in value]
+        hasher = hashlib.blake2b(b"l", digest_size=_DIGEST_SIZE)
+        for child in children:
+            hasher.update(child.digest)
+        return _Node(hasher.digest(), value, children, _identities(value, field, identity_keys))
+    # everything else is a leaf
+    return _leaf(value)
+
+
+def _identities(value: Iterable, field: Optional[str],
+                identity_keys: Dict[str, IdentityKey]) -> Optional[List[Hashable]]:
+    key = identity_keys.get(field, None)
+    if key is None:
+        return None
+    try:
+        keys = [key(v) for v in value]
+        hash(tuple(keys))
+    except (KeyError, TypeError, IndexError):
+        return None
+    # identities are only usable if they are unique
+    return keys if len(set(keys)) == len(keys) else None
+
+
+class FragmentTree:
+
+    def __init__(self, fragment: Fragment, identity_keys: Optional[Dict[str, IdentityKey]] = None):
+        self._fragment: Fragment = fragment
+        self._identity_keys: Dict[str, IdentityKey] = \
+            IDENTITY_KEYS if identity_keys is None else identity_keys
+        self._root: _Node = _build(fragment, None, self._identity_keys)
+
+    @property
+    def fragment(self) -> Fragment:
+        return self._fragment
+
+    @property
+    def digest(self) -> str:
+        return self._root.digest.hex()
+
+    @property
+    def identity_keys(self) -> Dict[str, IdentityKey]:
+        return self._identity_keys
+
+
+def diff(old: Union[Fragment, FragmentTree], new: Union[Fragment, FragmentTree]) \
+        -> List[FragmentChange]:
+    # hash trees can be reused across calls, so that a fragment is only hashed once
+    old = old if isinstance(old, FragmentTree) else FragmentTree(old)
+    new = new if isinstance(new, FragmentTree) else FragmentTree(new, old.identity_keys)
+    removed, replaced, added = [], [], []
+    _diff(old._root, new._root, (), removed, replaced, added)
+    # removals go first so that retired resources free up what new ones might need
+    return removed + replaced + added
+
+
+def _diff(a: _Node, b: _Node, path: Path, removed: List[FragmentChange],
+          replaced: List[FragmentChange], added: List[FragmentChange]):
+    # unchanged sub-trees are skipped without being visited
+    if a.digest == b.digest:
+        return
+    # dictionaries
+    if isinstance(a.children, dict) and isinstance(b.children, dict):
+        for k in a.children:
+            if k not in b.children:
+                removed.append(FragmentChange(ChangeType.REMOVE, path + (k,)))
+        for k, child in b.children.items():
+            if k not in a.children:
+                added.append(FragmentChange(ChangeType.ADD, path + (k,), child.value))
+            else:
+                _diff(a.children[k], child, path + (k,), removed, replaced, added)
+        return
+    # lists whose entries can be matched by identity
+    if a.keys is not None and b.keys is not None:
+        a_index = {k: i for i, k in enumerate(a.keys)}
+        b_index = {k: i for i, k in enumerate(b.keys)}
+        # entries that survive must keep their relative order, otherwise replace the whole list
+        a_common = [k for k in a.keys if k in b_index]
+        b_common = [k for k in b.keys if k in a_index]
+        if a_common == b_common:
+            for k in a.keys:
+                if k not in b_index:
+                    removed.append(FragmentChange(ChangeType.REMOVE, path + (k,)))
+            for i, (k, child) in enumerate(zip(b.keys, b.children)):
+                if k not in a_index:
+                    added.append(FragmentChange(ChangeType.ADD, path + (k,), child.value, i))
+                else:
+                    _diff(a.children[a_index[k]], child, path + (k,), removed, replaced, added)
+            return
+    # anything else is replaced as a whole
+    replaced.append(FragmentChange(ChangeType.REPLACE, path, b.value))
+
+
+def patch(fragment: Fragment, changes: Iterable[FragmentChange],
+          identity_keys: Optional[Dict[str, IdentityKey]] = None) -> Fragment:
+    identity_keys = IDENTITY_KEYS if identity_keys is None else identity_keys
+    # only the containers along the patched paths are copied, the rest is shared
+    result = Fragment(fragment)
+    copied: Set[int] = {id(result)}
+    indices: Dict[int, Dict[Hashable, int]] = {}
+    for change in changes:
+        if len(change.path) == 0:
+            if change.type is not ChangeType.REPLACE or not isinstance(change.value, dict):
+                raise FragmentPatchException(change.path, "only a dict can replace the root")
+            result = Fragment(change.value)
+            copied, indices = {id(result)}, {}
+            continue
+        parent, field = _descend(result, change.path[:-1], copied, indices, identity_keys)
+        _apply(parent, field, change, indices, identity_keys)
+    return result
+
+
+def _locate(container: Any, step: Hashable, field: Optional[str],
+            indices: Dict[int, Dict[Hashable, int]],
+            identity_keys: Dict[str, IdentityKey]) -> Optional[Union[str, int]]:
+    if isinstance(container, dict):
+        return step if step in container else None
+    if isinstance(container, list):
+        index = indices.get(id(container), None)
+        if index is None:
+            key = identity_keys.get(field, None)
+            if key is None:
+                return None
+            index = indices[id(container)] = {key(v): i for i, v in enumerate(container)}
+        return index.get(step, None)
+    return None
+
+
+def _descend(root: Fragment, path: Path, copied: Set[int],
+             indices: Dict[int, Dict[Hashable, int]],
+             identity_keys: Dict[str, IdentityKey]) -> Tuple[Any, Optional[str]]:
+    node, field = root, None
+    for i, step in enumerate(path):
+        slot = _locate(node, step, field, indices, identity_keys)
+        if slot is None:
+            raise FragmentPatchException(path[:i + 1], "path not found")
+        child = node[slot]
+        if not isinstance(child, (dict, list)):
+            raise FragmentPatchException(path[:i + 1], "not a container")
+        if id(child) not in copied:
+            fresh = type(child)(child)
+            copied.add(id(fresh))
+            # a copied list keeps the same entries, so its index stays valid
+            if id(child) in indices:
+                indices[id(fresh)] = indices[id(child)]
+            node[slot] = child = fresh
+        field = step if isinstance(node, dict) else None
+        node = child
+    return node, field
+
+
+def _apply(parent: Any, field: Optional[str], change: FragmentChange,
+           indices: Dict[int, Dict[Hashable, int]], identity_keys: Dict[str, IdentityKey]):
+    step = change.path[-1]
+    # adding to a dictionary
+    if change.type is ChangeType.ADD and isinstance(parent, dict):
+        if step in parent:
+            raise FragmentPatchException(change.path, "key already exists")
+        parent[step] = change.value
+        return
+    # adding to a keyed list
+    if change.type is ChangeType.ADD and isinstance(parent, list):
+        if _locate(parent, step, field, indices, identity_keys) is not None:
+            raise FragmentPatchException(change.path, "entry already exists")
+        index = len(parent) if change.index is None else change.index
+        parent.insert(index, change.value)
+        indices.pop(id(parent), None)
+        return
+    # remove/replace need the entry to exist
+    slot = _locate(parent, step, field if isinstance(parent, list) else None, indices,
+                   identity_keys)
+    if slot is None:
+        raise FragmentPatchException(change.path, "path not found")
+    if change.type is ChangeType.REMOVE:
+        del parent[slot]
+        indices.pop(id(parent), None)
+    else:
+        parent[slot] = change.value
+
+
+__all__ = [
+    "IDENTITY_KEYS",
+    "ChangeType",
+    "FragmentChange",
+    "FragmentTree",
+    "diff",
+    "patch",
+]
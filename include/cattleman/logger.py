@@ -1,10 +1,9 @@
 import logging
-import platform
 import sys
 from functools import partial
-from logging import Logger, StreamHandler, Formatter, getLogger
+from logging import Logger, StreamHandler, Formatter, getLogger, LogRecord
 
-from cpk.constants import DEBUG
+from cattleman.constants import DEBUG
 
 
 # create logger
@@ -13,24 +12,16 @@ cmlogger = getLogger('cattleman')
 cmlogger.setLevel(logging.INFO)
 
 
-def setup_logging_format(fmt: str):
-    logging.basicConfig(format=fmt)
-    # noinspection PyUnresolvedReferences
-    root = Logger.root
-    if root.handlers:
-        for handler in root.handlers:
-            if isinstance(handler, StreamHandler):
-                formatter = Formatter(fmt)
-                handler.setFormatter(formatter)
-    else:
-        logging.basicConfig(format=fmt)
-
+class ColoredFormatter(Formatter):
+    # colors the message (every line of it) by level, records are not modified so that other
+    # handlers (and the following ones) see the original message
 
-def add_coloring_to_emit_ansi(fn, indent: int = 0):
+    def __init__(self, fmt: str, indent: int = 0):
+        super(ColoredFormatter, self).__init__(fmt)
+        self._indent: int = indent
 
-    # add methods we need to the class
-    def new(*args):
-        levelno = args[1].levelno
+    def formatMessage(self, record: LogRecord) -> str:
+        levelno = record.levelno
         if levelno >= 50:
             color = "\x1b[31m"  # red
         elif levelno >= 40:
@@ -43,30 +34,29 @@ def add_coloring_to_emit_ansi(fn, indent: int = 0):
             color = "\x1b[35m"  # pink
         else:
             color = "\x1b[0m"  # normal
-        msg = str(args[1].msg)
-        lines = msg.split("\n")
+        tab = " " * (self._indent - 2) + ": "
+        lines = [f"{tab if i > 0 else ''}{color}{line}\x1b[0m"
+                 for i, line in enumerate(record.message.split("\n"))]
+        record = logging.makeLogRecord({**record.__dict__, "message": "\n".join(lines)})
+        return super(ColoredFormatter, self).formatMessage(record)
 
-        def color_line(enum_line):
-            i, line = enum_line
-            tab = " " * (indent - 2) + ": " if i > 0 else ""
-            return "%s%s%s%s" % (tab, color, line, "\x1b[0m")
 
-        lines = list(map(color_line, enumerate(lines)))
-        args[1].msg = "\n".join(lines)
-        return fn(*args)
-    # ---
-    return new
+def setup_logging_format(fmt: str, indent: int = 0):
+    logging.basicConfig(format=fmt)
+    # noinspection PyUnresolvedReferences
+    root = Logger.root
+    colored = sys.platform != "win32"
+    for handler in root.handlers:
+        if isinstance(handler, StreamHandler):
+            formatter = ColoredFormatter(fmt, indent) if colored else Formatter(fmt)
+            handler.setFormatter(formatter)
 
 
-format_indent = 15
-setup_logging_format("%(name)12s|%(levelname)8s : %(message)s")
 if DEBUG:
-    format_indent = 44
-    setup_logging_format("%(name)3s|%(filename)15s:%(lineno)-4s - %(funcName)-15s| %(message)s")
-
-if platform.system() != "Windows":
-    emit2 = add_coloring_to_emit_ansi(StreamHandler.emit, format_indent)
-    StreamHandler.emit = emit2
+    setup_logging_format("%(name)3s|%(filename)15s:%(lineno)-4s - %(funcName)-15s| %(message)s",
+                         indent=44)
+else:
+    setup_logging_format("%(name)12s|%(levelname)8s : %(message)s", indent=15)
 
 
 def plain(text: str = "", end: str = ""):
@@ -0,0 +1,217 @@
+import dataclasses
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple, List, Set, Callable, Iterable
+
+from cattleman.persistency import Persistency
+from cattleman.resources import DNSRecord
+from cattleman.types import DNSRecordType, ResourceID, IDNSRecord, ResourceEvents, ResourceType, \
+    PersistentResource
+
+logger = logging.getLogger("dns")
+
+# how long names that do not resolve are remembered
+NEGATIVE_TTL = 30
+# longest CNAME chain followed before giving up
+MAX_CHAIN_LENGTH = 16
+# answers kept in the cache (least recently used ones are dropped first)
+MAX_CACHE_ENTRIES = 65536
+
+CacheKey = Tuple[str, DNSRecordType]
+
+
+@dataclasses.dataclass(frozen=True)
+class DNSAnswerRecord:
+    name: str
+    type: DNSRecordType
+    value: str
+    ttl: int
+
+
+@dataclasses.dataclass(frozen=True)
+class DNSAnswer:
+    name: str
+    type: DNSRecordType
+    records: Tuple[DNSAnswerRecord, ...]
+    expires: float
+    # the CNAME chain loops back on itself (or is too long)
+    loop: bool = False
+
+    @property
+    def negative(self) -> bool:
+        return len(self.records) == 0 or self.records[-1].type is not self.type
+
+    @property
+    def ttl(self) -> int:
+        return min((r.ttl for r in self.records), default=NEGATIVE_TTL)
+
+    @property
+    def values(self) -> List[str]:
+        return [r.value for r in self.records if r.type is self.type]
+
+
+def normalize(name: str) -> str:
+    return name.rstrip(".").lower()
+
+
+class DNSIndex:
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic,
+                 negative_ttl: int = NEGATIVE_TTL, max_entries: int = MAX_CACHE_ENTRIES):
+        self._clock: Callable[[], float] = clock
+        self._negative_ttl: int = negative_ttl
+        self._max_entries: int = max_entries
+        # records are indexed by name only, type and value are read live from the resource
+        self._records: Dict[str, Dict[ResourceID, IDNSRecord]] = {}
+        self._names: Dict[ResourceID, str] = {}
+        # key -> (answer, names the answer went through)
+        self._cache: OrderedDict[CacheKey, Tuple[DNSAnswer, Tuple[str, ...]]] = OrderedDict()
+        # name -> cached answers that went through that name
+        self._dependents: Dict[str, Set[CacheKey]] = {}
+        self._listeners: List[Callable[[Set[str]], None]] = []
+        self._attached: bool = False
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def negative_ttl(self) -> int:
+        return self._negative_ttl
+
+    def exists(self, name: str) -> bool:
+        return normalize(name) in self._records
+
+    def add(self, record: IDNSRecord):
+        name = normalize(record.name)
+        self._records.setdefault(name, {})[record.id] = record
+        self._names[record.id] = name
+        self.invalidate(name)
+
+    def add_many(self, records: Iterable[IDNSRecord]):
+        names = set()
+        for record in records:
+            name = normalize(record.name)
+            self._records.setdefault(name, {})[record.id] = record
+            self._names[record.id] = name
+            names.add(name)
+        self.invalidate(*names)
+
+    def remove(self, record: IDNSRecord):
+        name = self._names.pop(record.id, None)
+        if name is None:
+            return
+        records = self._records.get(name, {})
+        records.pop(record.id, None)
+        if not records:
+            self._records.pop(name, None)
+        self.invalidate(name)
+
+    def invalidate(self, *names: str):
+        for name in names:
+            for key in list(self._dependents.get(name, ())):
+                self._forget(key)
+        for listener in self._listeners:
+            listener(set(names))
+
+    def on_invalidate(self, listener: Callable[[Set[str]], None]):
+        self._listeners.append(listener)
+
+    def _forget(self, key: CacheKey):
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return
+        for hop in entry[1]:
+            keys = self._dependents.get(hop, None)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[hop]
+
+    def resolve(self, name: str, type: DNSRecordType = DNSRecordType.A) -> DNSAnswer:
+        key = (normalize(name), type)
+        entry = self._cache.get(key, None)
+        if entry is not None and entry[0].expires > self._clock():
+            self._cache.move_to_end(key)
+            return entry[0]
+        # (re)compute
+        answer, chain = self._resolve(key[0], type)
+        self._forget(key)
+        self._cache[key] = answer, tuple(chain)
+        for hop in chain:
+            self._dependents.setdefault(hop, set()).add(key)
+        while len(self._cache) > self._max_entries:
+            self._forget(next(iter(self._cache)))
+        return answer
+
+    def _resolve(self, name: str, type: DNSRecordType) -> Tuple[DNSAnswer, List[str]]:
+        records: List[DNSAnswerRecord] = []
+        chain: List[str] = []
+        loop = False
+        current = name
+        while True:
+            if current in chain or len(chain) >= MAX_CHAIN_LENGTH:
+                loop = True
+                break
+            chain.append(current)
+            candidates = self._records.get(current, {}).values()
+            # records of the requested type
+            found = [r for r in candidates if r.type is type]
+            if found:
+                records.extend(DNSAnswerRecord(current, r.type, r.value, r.ttl) for r in found)
+                break
+            # follow CNAMEs (a name with a CNAME cannot have other records)
+            cname = next((r for r in candidates if r.type is DNSRecordType.CNAME), None)
+            if cname is None or type is DNSRecordType.CNAME:
+                break
+            records.append(DNSAnswerRecord(current, cname.type, cname.value, cname.ttl))
+            current = normalize(cname.value)
+        ttl = min((r.ttl for r in records), default=self._negative_ttl)
+        if loop or not records or records[-1].type is not type:
+            ttl = min(ttl, self._negative_ttl)
+        answer = DNSAnswer(name, type, tuple(records), self._clock() + ttl, loop)
+        return answer, chain
+
+    def load(self, records: Iterable[IDNSRecord]):
+        self.add_many(records)
+
+    def load_from_disk(self):
+        database = Persistency.database("resources")
+        self.add_many(
+            DNSRecord.deserialize(row["value"], dict(row)) for row in database.all("dns_records")
+        )
+        logger.debug(f"Loaded {len(self)} DNS records from disk.")
+
+    def attach(self):
+        if self._attached:
+            return
+        ResourceEvents.on_event(ResourceType.DNS_RECORD, self._on_event)
+        ResourceEvents.on_update(ResourceType.DNS_RECORD, self._on_update)
+        self._attached = True
+
+    def detach(self):
+        ResourceEvents.remove(self._on_event)
+        ResourceEvents.remove(self._on_update)
+        self._attached = False
+
+    def _on_event(self, record: PersistentResource, event: str):
+        # noinspection PyTypeChecker
+        record: IDNSRecord = record
+        if event == "created":
+            self.add(record)
+        elif event == "deleted":
+            self.remove(record)
+
+    def _on_update(self, record: PersistentResource, field: str, current, new):
+        if field in ("type", "value", "ttl") and record.id in self._names:
+            self.invalidate(self._names[record.id])
+
+
+__all__ = [
+    "MAX_CACHE_ENTRIES",
+    "NEGATIVE_TTL",
+    "DNSAnswerRecord",
+    "DNSAnswer",
+    "DNSIndex",
+    "normalize",
+]
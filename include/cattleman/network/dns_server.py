@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import math
+import socket
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple, Optional, Set, Callable, List
+
+from cattleman.network.dns import DNSIndex, DNSAnswer, normalize
+from cattleman.types import DNSRecordType
+
+logger = logging.getLogger("dns")
+
+DEFAULT_DNS_HOST = "127.0.0.1"
+DEFAULT_DNS_PORT = 5353
+# answers kept in wire format (least recently used ones are dropped first)
+MAX_WIRE_ENTRIES = 65536
+# largest UDP message without EDNS (RFC 1035, 4.2.1)
+MAX_UDP_SIZE = 512
+
+# wire-format codes
+QTYPE = {
+    1: DNSRecordType.A,
+    5: DNSRecordType.CNAME,
+    28: DNSRecordType.AAAA,
+}
+TYPE_CODE = {t: c for c, t in QTYPE.items()}
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+
+# (lowercase qname in wire format, qtype and qclass)
+WireKey = Tuple[bytes, bytes]
+# expires, flags and counts with/without RD, answer records, names the answer went through,
+# (offset, TTL) of every record and the records as last sent ([remaining seconds, bytes])
+WireEntry = Tuple[float, bytes, bytes, bytes, Tuple[str, ...], Tuple[Tuple[int, int], ...], list]
+
+
+def encode_name(name: str) -> bytes:
+    labels = [label.encode("idna") for label in normalize(name).split(".") if label]
+    return b"".join(bytes((len(label),)) + label for label in labels) + b"\x00"
+
+
+def parse_question(query: bytes) -> Optional[Tuple[int, WireKey]]:
+    # returns the offset of the end of the question and the cache key
+    i = 12
+    length = len(query)
+    while i < length:
+        n = query[i]
+        if n == 0:
+            end = i + 5
+            if end > length:
+                return None
+            return end, (query[12:i + 1].lower(), query[i + 1:end])
+        # compression pointers are not allowed in questions (and neither are labels > 63)
+        if n > 63:
+            return None
+        i += n + 1
+    return None
+
+
+class DNSResponder:
+
+    def __init__(self, index: DNSIndex, clock: Callable[[], float] = time.monotonic,
+                 max_entries: int = MAX_WIRE_ENTRIES, max_size: int = MAX_UDP_SIZE):
+        self._index: DNSIndex = index
+        self._clock: Callable[[], float] = clock
+        self._max_entries: int = max_entries
+        self._max_size: int = max_size
+        self._wire: OrderedDict[WireKey, WireEntry] = OrderedDict()
+        # name -> wire entries built from answers that went through that name
+        self._dependents: Dict[str, Set[WireKey]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        index.on_invalidate(self.invalidate)
+
+    def invalidate(self, names: Set[str]):
+        for name in names:
+            for key in list(self._dependents.get(name, ())):
+                self._forget(key)
+
+    def _forget(self, key: WireKey):
+        entry = self._wire.pop(key, None)
+        if entry is None:
+            return
+        for hop in entry[4]:
+            keys = self._dependents.get(hop, None)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[hop]
+
+    def respond(self, query: bytes) -> Optional[bytes]:
+        # hot path: dict lookup plus ID patch
+        question = parse_question(query) if len(query) > 12 else None
+        if question is None:
+            return None
+        end, key = question
+        # only plain queries (QR=0, OPCODE=0) with a single question are answered
+        if query[2] & 0xF8 or query[4:6] != b"\x00\x01":
+            if query[2] & 0x80:
+                # never answer responses
+                return None
+            return self._error(query, end, RCODE_NOTIMP if query[2] & 0x78 else RCODE_FORMERR)
+        entry = self._wire.get(key, None)
+        now = self._clock()
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            self._wire.move_to_end(key)
+            # the question is echoed as sent (resolvers may randomize the case of names)
+            return query[:2] + entry[1 if query[2] & 0x01 else 2] + query[12:end] + \
+                self._answers(entry, now)
+        self.misses += 1
+        entry = self._build(key)
+        if entry is None:
+            return self._error(query, end, RCODE_NOTIMP)
+        # drop the expired entry first, the new one may go through other names
+        self._forget(key)
+        self._wire[key] = entry
+        for hop in entry[4]:
+            self._dependents.setdefault(hop, set()).add(key)
+        while len(self._wire) > self._max_entries:
+            self._forget(next(iter(self._wire)))
+        return query[:2] + entry[1 if query[2] & 0x01 else 2] + query[12:end] + \
+            self._answers(entry, now)
+
+    @staticmethod
+    def _answers(entry: WireEntry, now: float) -> bytes:
+        # TTLs count down to the expiration of the answer, rewritten once per second
+        expires, _, _, records, _, ttls, last = entry
+        remaining = math.ceil(expires - now)
+        if last[0] != remaining:
+            data = bytearray(records)
+            for offset, ttl in ttls:
+                struct.pack_into("!I", data, offset, max(0, min(ttl, remaining)))
+            last[:] = remaining, bytes(data)
+        return last[1]
+
+    def _build(self, key: WireKey) -> Optional[WireEntry]:
+        qname, tail = key
+        qtype, qclass = struct.unpack("!HH", tail)
+        if qclass != CLASS_IN:
+            return None
+        labels = []
+        i = 0
+        while qname[i]:
+            labels.append(qname[i + 1:i + 1 + qname[i]].decode("ascii", errors="replace"))
+            i += qname[i] + 1
+        name = ".".join(labels)
+        type = QTYPE.get(qtype, None)
+        now = self._clock()
+        if type is None:
+            # unsupported types get an empty answer for known names
+            rcode = RCODE_NOERROR if self._index.exists(name) else RCODE_NXDOMAIN
+            records = []
+            expires = now + self._index.negative_ttl
+            chain = [normalize(name)]
+        else:
+            answer = self._index.resolve(name, type)
+            records = self._records(answer)
+            rcode = self._rcode(answer)
+            expires = answer.expires
+            chain = [normalize(name)] + [normalize(r.value) for r in answer.records
+                                         if r.type is DNSRecordType.CNAME]
+        # QR and AA are always set, RD is copied from the query, RA is not (no recursion)
+        flags = 0x84
+        # keep the records that fit and set TC, the question is as long as the key
+        size = 12 + len(qname) + len(tail)
+        ttls = []
+        offset = 0
+        for i, (data, ttl_offset, ttl) in enumerate(records):
+            size += len(data)
+            if size > self._max_size:
+                records = records[:i]
+                flags |= 0x02
+                break
+            ttls.append((offset + ttl_offset, ttl))
+            offset += len(data)
+        counts = struct.pack("!HHHH", 1, len(records), 0, 0)
+        head_rd = struct.pack("!BB", flags | 0x01, rcode) + counts
+        head = struct.pack("!BB", flags, rcode) + counts
+        return expires, head_rd, head, b"".join(data for data, _, _ in records), \
+            tuple(dict.fromkeys(chain)), tuple(ttls), [None, b""]
+
+    def _rcode(self, answer: DNSAnswer) -> int:
+        if answer.loop:
+            return RCODE_SERVFAIL
+        # NXDOMAIN refers to the last name in the chain
+        target = answer.name
+        if answer.records and answer.records[-1].type is DNSRecordType.CNAME:
+            target = answer.records[-1].value
+        if answer.negative and not self._index.exists(target):
+            return RCODE_NXDOMAIN
+        return RCODE_NOERROR
+
+    @staticmethod
+    def _records(answer: DNSAnswer) -> List[Tuple[bytes, int, int]]:
+        # (wire format, offset of the TTL in it, TTL) of each record
+        if answer.loop:
+            return []
+        records = []
+        for i, record in enumerate(answer.records):
+            # the first record points back to the name in the question
+            name = b"\xc0\x0c" if i == 0 else encode_name(record.name)
+            try:
+                if record.type is DNSRecordType.A:
+                    rdata = socket.inet_pton(socket.AF_INET, record.value)
+                elif record.type is DNSRecordType.AAAA:
+                    rdata = socket.inet_pton(socket.AF_INET6, record.value)
+                else:
+                    rdata = encode_name(record.value)
+            except (OSError, UnicodeError):
+                logger.warning(f"Skipping invalid {record.type.value} record "
+                               f"'{record.name}' -> '{record.value}'")
+                continue
+            records.append((
+                name +
+                struct.pack("!HHIH", TYPE_CODE[record.type], CLASS_IN, record.ttl, len(rdata)) +
+                rdata,
+                len(name) + 4,
+                record.ttl
+            ))
+        return records
+
+    @staticmethod
+    def _error(query: bytes, end: int, rcode: int) -> bytes:
+        return query[:2] + struct.pack("!BB", 0x80 | (query[2] & 0x79), rcode) + \
+            struct.pack("!HHHH", 1, 0, 0, 0) + query[12:end]
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, responder: DNSResponder):
+        self._responder: DNSResponder = responder
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        # noinspection PyTypeChecker
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        response = self._responder.respond(data)
+        if response is not None:
+            self._transport.sendto(response, addr)
+
+
+class DNSServer:
+
+    def __init__(self, index: DNSIndex, host: str = DEFAULT_DNS_HOST,
+                 port: int = DEFAULT_DNS_PORT):
+        self._responder: DNSResponder = DNSResponder(index)
+        self._host: str = host
+        self._port: int = port
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    @property
+    def responder(self) -> DNSResponder:
+        return self._responder
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._transport.get_extra_info("sockname")[:2]
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DNSProtocol(self._responder),
+            local_addr=(self._host, self._port)
+        )
+        logger.info(f"DNS server listening on {self._host}:{self.address[1]}/udp")
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.close()
+
+
+__all__ = [
+    "DEFAULT_DNS_HOST",
+    "DEFAULT_DNS_PORT",
+    "MAX_UDP_SIZE",
+    "MAX_WIRE_ENTRIES",
+    "DNSResponder",
+    "DNSServer",
+    "encode_name",
+]
@@ -0,0 +1,307 @@
+import ipaddress
+import logging
+import socket
+from bisect import bisect_right
+from typing import Dict, List, Optional, Union, Iterable
+
+import cbor2
+
+from cattleman.exceptions import IPPoolExhaustedException, IPAddressConflictException, \
+    IPPoolNotFoundException
+from cattleman.persistency import Persistency
+from cattleman.resources import IPAddress
+from cattleman.types import IPAddressType, ResourceID, ResourceType, PersistentResource, \
+    ResourceEvents
+from cattleman.utils.misc import assert_type, now
+from cattleman.utils.sqlite import upsert_query
+
+logger = logging.getLogger("ipam")
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+IP_POOLS_TABLE_COLUMNS = ("name", "type", "network", "date", "state")
+
+
+class IntervalSet:
+
+    def __init__(self, size: int):
+        self._size: int = size
+        # disjoint, non-adjacent intervals [start, end] sorted by start
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._used: int = 0
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def __contains__(self, offset: int) -> bool:
+        i = bisect_right(self._starts, offset) - 1
+        return i >= 0 and offset <= self._ends[i]
+
+    def reserve(self, offset: int) -> bool:
+        i = bisect_right(self._starts, offset) - 1
+        if i >= 0 and offset <= self._ends[i]:
+            return False
+        left = i >= 0 and self._ends[i] == offset - 1
+        right = i + 1 < len(self._starts) and self._starts[i + 1] == offset + 1
+        if left and right:
+            # bridge the two neighbors
+            self._ends[i] = self._ends[i + 1]
+            del self._starts[i + 1]
+            del self._ends[i + 1]
+        elif left:
+            self._ends[i] = offset
+        elif right:
+            self._starts[i + 1] = offset
+        else:
+            self._starts.insert(i + 1, offset)
+            self._ends.insert(i + 1, offset)
+        self._used += 1
+        return True
+
+    def free(self, offset: int) -> bool:
+        i = bisect_right(self._starts, offset) - 1
+        if i < 0 or offset > self._ends[i]:
+            return False
+        start, end = self._starts[i], self._ends[i]
+        if start == end:
+            del self._starts[i]
+            del self._ends[i]
+        elif offset == start:
+            self._starts[i] = offset + 1
+        elif offset == end:
+            self._ends[i] = offset - 1
+        else:
+            # split the interval in two
+            self._ends[i] = offset - 1
+            self._starts.insert(i + 1, offset + 1)
+            self._ends.insert(i + 1, end)
+        self._used -= 1
+        return True
+
+    def allocate(self) -> Optional[int]:
+        # the lowest free offset is either 0 or right after the first interval
+        if not self._starts or self._starts[0] > 0:
+            offset = 0
+        else:
+            offset = self._ends[0] + 1
+        if offset >= self._size:
+            return None
+        self.reserve(offset)
+        return offset
+
+    def allocate_many(self, count: int) -> Optional[List[int]]:
+        if self._size - self._used < count:
+            return None
+        return [self.allocate() for _ in range(count)]
+
+    def serialize(self) -> dict:
+        return {"starts": self._starts, "ends": self._ends}
+
+    @classmethod
+    def deserialize(cls, size: int, data: dict) -> 'IntervalSet':
+        intervals = cls(size)
+        intervals._starts = list(data["starts"])
+        intervals._ends = list(data["ends"])
+        intervals._used = sum(e - s + 1 for s, e in zip(intervals._starts, intervals._ends))
+        return intervals
+
+
+class IPPool:
+
+    def __init__(self, name: str, network: str, *, state: Optional[dict] = None):
+        self._name: str = name
+        self._network: IPNetwork = ipaddress.ip_network(network)
+        self._type: IPAddressType = IPAddressType(self._network.version)
+        size = self._network.num_addresses
+        # allocated addresses are kept as intervals, the lowest free one is next to the first
+        self._allocated = IntervalSet.deserialize(size, state) if state else IntervalSet(size)
+        self._dirty: bool = state is None
+        # formatting through `ipaddress` objects is slow, pack the integers directly
+        self._base: int = int(self._network.network_address)
+        self._family: int = socket.AF_INET if self._type is IPAddressType.IPv4 else \
+            socket.AF_INET6
+        self._width: int = 4 if self._type is IPAddressType.IPv4 else 16
+        # network and broadcast addresses are not assignable, and neither is the
+        # subnet-router anycast address of IPv6 networks (RFC 4291, 2.6.1)
+        if state is None and self._network.max_prefixlen - self._network.prefixlen > 1:
+            self._allocated.reserve(0)
+            if self._type is IPAddressType.IPv4:
+                self._allocated.reserve(size - 1)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def network(self) -> IPNetwork:
+        return self._network
+
+    @property
+    def type(self) -> IPAddressType:
+        return self._type
+
+    @property
+    def used(self) -> int:
+        return self._allocated.used
+
+    @property
+    def size(self) -> int:
+        return self._network.num_addresses
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def __contains__(self, address: str) -> bool:
+        return self._offset(address) in self._allocated
+
+    def allocate(self) -> str:
+        offset = self._allocated.allocate()
+        if offset is None:
+            raise IPPoolExhaustedException(self._name, str(self._network))
+        self._dirty = True
+        return socket.inet_ntop(self._family, (self._base + offset).to_bytes(self._width, "big"))
+
+    def allocate_many(self, count: int) -> List[str]:
+        # all or nothing
+        offsets = self._allocated.allocate_many(count)
+        if offsets is None:
+            raise IPPoolExhaustedException(self._name, str(self._network))
+        self._dirty = True
+        return [
+            socket.inet_ntop(self._family, (self._base + offset).to_bytes(self._width, "big"))
+            for offset in offsets
+        ]
+
+    def reserve(self, address: str):
+        if not self._allocated.reserve(self._offset(address)):
+            raise IPAddressConflictException(address, self._name)
+        self._dirty = True
+
+    def free(self, address: str):
+        if self._allocated.free(self._offset(address)):
+            self._dirty = True
+
+    def serialize(self) -> bytes:
+        return cbor2.dumps(self._allocated.serialize())
+
+    def _offset(self, address: str) -> int:
+        ip = ipaddress.ip_address(address)
+        if ip not in self._network:
+            raise ValueError(f"Address {address} does not belong to pool '{self._name}' "
+                             f"({self._network}).")
+        return int(ip) - int(self._network.network_address)
+
+
+class IPAM:
+
+    def __init__(self):
+        self._pools: Dict[str, IPPool] = {}
+        self._attached: bool = False
+
+    @property
+    def pools(self) -> List[IPPool]:
+        return list(self._pools.values())
+
+    def pool(self, name: str) -> IPPool:
+        try:
+            return self._pools[name]
+        except KeyError:
+            raise IPPoolNotFoundException(name)
+
+    def create_pool(self, name: str, network: str) -> IPPool:
+        assert_type(name, str)
+        assert_type(network, str)
+        if name in self._pools:
+            raise ValueError(f"An IP pool with name '{name}' already exists.")
+        pool = IPPool(name, network)
+        self._pools[name] = pool
+        return pool
+
+    def make_addresses(self, pool: str, names: List[str], *,
+                       descriptions: Optional[List[Optional[str]]] = None) -> List[IPAddress]:
+        descriptions = descriptions if descriptions is not None else [None] * len(names)
+        ip_pool = self.pool(pool)
+        values = ip_pool.allocate_many(len(names))
+        addresses = [
+            IPAddress(
+                id=ResourceID.make(ResourceType.IP_ADDRESS),
+                name=name,
+                description=description,
+                _type=ip_pool.type,
+                _value=value
+            )
+            for name, value, description in zip(names, values, descriptions)
+        ]
+        # resources and pool state are written in the same transaction
+        with Persistency.session("resources"):
+            PersistentResource.commit_many(addresses)
+            self.commit()
+        return addresses
+
+    def commit(self, force: bool = False):
+        rows = [
+            (pool.name, pool.type.value, str(pool.network), now(), pool.serialize())
+            for pool in self._pools.values() if pool.dirty or force
+        ]
+        if not rows:
+            return
+        with Persistency.session("resources") as cursor:
+            query = upsert_query(
+                table="ip_pools",
+                columns=IP_POOLS_TABLE_COLUMNS,
+                conflict=("name",),
+                update="state"
+            )
+            cursor.executemany(query, rows)
+        for pool in self._pools.values():
+            pool._dirty = False
+
+    def load_from_disk(self):
+        database = Persistency.database("resources")
+        for row in database.all("ip_pools"):
+            state = cbor2.loads(row["state"])
+            self._pools[row["name"]] = IPPool(row["name"], row["network"], state=state)
+        logger.debug(f"Loaded {len(self._pools)} IP pools from disk.")
+
+    def load(self, addresses: Iterable[IPAddress]):
+        # rebuild pool state from existing resources (e.g., no saved state is available)
+        for address in addresses:
+            pool = self._pool_of(address)
+            if pool is not None and address.value not in pool:
+                pool.reserve(address.value)
+
+    def attach(self):
+        if self._attached:
+            return
+        ResourceEvents.on_event(ResourceType.IP_ADDRESS, self._on_event)
+        self._attached = True
+
+    def detach(self):
+        ResourceEvents.remove(self._on_event)
+        self._attached = False
+
+    def _on_event(self, address: PersistentResource, event: str):
+        # noinspection PyTypeChecker
+        address: IPAddress = address
+        if event != "deleted":
+            return
+        # deleted addresses go back to their pool
+        pool = self._pool_of(address)
+        if pool is not None:
+            pool.free(address.value)
+            self.commit()
+
+    def _pool_of(self, address: IPAddress) -> Optional[IPPool]:
+        for pool in self._pools.values():
+            if pool.type is address.type and ipaddress.ip_address(address.value) in pool.network:
+                return pool
+        return None
+
+
+__all__ = [
+    "IPPool",
+    "IPAM",
+]
@@ -0,0 +1,263 @@
+import logging
+import re
+from array import array
+from typing import Dict, Optional, Tuple, List, Iterable
+
+import cbor2
+
+from cattleman.exceptions import PortConflictException, PortsExhaustedException
+from cattleman.persistency import Persistency
+from cattleman.types import TransportProtocol, ResourceID, ResourceEvents, ResourceType, IPort, \
+    PersistentResource
+from cattleman.utils.misc import assert_type
+
+logger = logging.getLogger("ports")
+
+NUM_PORTS = 65536
+# range used when a port is allocated without specifying one
+DYNAMIC_PORTS_RANGE = (30000, 32767)
+
+_NOT_FULL = re.compile(rb"[^\xff]")
+
+PortKey = Tuple[TransportProtocol, Optional[str], int]
+
+
+class PortBitmap:
+
+    __slots__ = ("_bits", "_count")
+
+    def __init__(self):
+        self._bits: bytearray = bytearray(NUM_PORTS // 8)
+        self._count: int = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, port: int) -> bool:
+        return bool(self._bits[port >> 3] & (1 << (port & 7)))
+
+    def set(self, port: int):
+        mask = 1 << (port & 7)
+        if not self._bits[port >> 3] & mask:
+            self._bits[port >> 3] |= mask
+            self._count += 1
+
+    def clear(self, port: int):
+        mask = 1 << (port & 7)
+        if self._bits[port >> 3] & mask:
+            self._bits[port >> 3] &= ~mask
+            self._count -= 1
+
+    def next_free(self, start: int, end: int) -> Optional[int]:
+        port = start
+        # walk the bits of the first (partial) byte
+        while port & 7 and port <= end:
+            if port not in self:
+                return port
+            port += 1
+        if port > end:
+            return None
+        # skip full bytes at C speed
+        match = _NOT_FULL.search(self._bits, port >> 3, (end >> 3) + 1)
+        if match is None:
+            return None
+        byte = self._bits[match.start()]
+        # index of the lowest zero bit
+        port = (match.start() << 3) + ((~byte & (byte + 1)).bit_length() - 1)
+        return port if port <= end else None
+
+
+class PortAllocator:
+
+    def __init__(self):
+        # bitmaps for ports reserved on all interfaces (ip=None) or on a specific IP
+        self._bitmaps: Dict[Tuple[TransportProtocol, Optional[str]], PortBitmap] = {}
+        # number of IP-specific reservations per port, used to check wildcard reservations
+        self._specific: Dict[TransportProtocol, array] = {}
+        self._owners: Dict[PortKey, Optional[ResourceID]] = {}
+        self._attached: bool = False
+
+    def is_free(self, port: int, protocol: TransportProtocol, ip: Optional[str] = None) -> bool:
+        if port in self._bitmap(protocol, None):
+            return False
+        if ip is None:
+            return self._specific_counts(protocol)[port] == 0
+        return port not in self._bitmap(protocol, ip)
+
+    def owner(self, port: int, protocol: TransportProtocol,
+              ip: Optional[str] = None) -> Optional[ResourceID]:
+        return self._owners.get((protocol, ip, port), None)
+
+    def reserve(self, port: int, protocol: TransportProtocol, ip: Optional[str] = None,
+                owner: Optional[ResourceID] = None):
+        # verify types
+        assert_type(port, int)
+        assert_type(protocol, TransportProtocol)
+        if not 0 < port < NUM_PORTS:
+            raise ValueError(f"Invalid port number {port}.")
+        # reserving a port twice for the same owner is a no-op
+        key = (protocol, ip, port)
+        if key in self._owners and owner is not None and self._owners[key] == owner:
+            return
+        if not self.is_free(port, protocol, ip):
+            owner = self._conflict(port, protocol, ip)
+            raise PortConflictException(port, protocol.value, ip, owner)
+        # ---
+        self._bitmap(protocol, ip).set(port)
+        if ip is not None:
+            self._specific_counts(protocol)[port] += 1
+        self._owners[key] = owner
+
+    def release(self, port: int, protocol: TransportProtocol, ip: Optional[str] = None):
+        key = (protocol, ip, port)
+        if key not in self._owners:
+            return
+        del self._owners[key]
+        self._bitmap(protocol, ip).clear(port)
+        if ip is not None:
+            self._specific_counts(protocol)[port] -= 1
+
+    def next_free(self, protocol: TransportProtocol, start: int = DYNAMIC_PORTS_RANGE[0],
+                  end: int = DYNAMIC_PORTS_RANGE[1], ip: Optional[str] = None) -> Optional[int]:
+        wildcard = self._bitmap(protocol, None)
+        bitmap = self._bitmap(protocol, ip) if ip is not None else None
+        counts = self._specific_counts(protocol)
+        port = start
+        while port is not None and port <= end:
+            port = wildcard.next_free(port, end)
+            if port is None:
+                return None
+            # the port also has to be free on the specific IP (or on every IP for wildcards)
+            if (bitmap is not None and port in bitmap) or (ip is None and counts[port]):
+                port += 1
+                continue
+            return port
+        return None
+
+    def allocate(self, protocol: TransportProtocol, start: int = DYNAMIC_PORTS_RANGE[0],
+                 end: int = DYNAMIC_PORTS_RANGE[1], ip: Optional[str] = None,
+                 owner: Optional[ResourceID] = None) -> int:
+        port = self.next_free(protocol, start, end, ip)
+        if port is None:
+            raise PortsExhaustedException(protocol.value, start, end)
+        self.reserve(port, protocol, ip, owner)
+        return port
+
+    def allocate_many(self, count: int, protocol: TransportProtocol,
+                      start: int = DYNAMIC_PORTS_RANGE[0], end: int = DYNAMIC_PORTS_RANGE[1],
+                      ip: Optional[str] = None,
+                      owners: Optional[List[Optional[ResourceID]]] = None) -> List[int]:
+        owners = owners if owners is not None else [None] * count
+        if len(owners) != count:
+            raise ValueError(f"Got {len(owners)} owners for {count} ports.")
+        ports = []
+        port = start
+        for owner in owners:
+            port = self.next_free(protocol, port, end, ip)
+            if port is None:
+                # all or nothing
+                for p in ports:
+                    self.release(p, protocol, ip)
+                raise PortsExhaustedException(protocol.value, start, end)
+            self.reserve(port, protocol, ip, owner)
+            ports.append(port)
+        return ports
+
+    def reserve_many(self, ports: Iterable[Tuple[int, TransportProtocol]],
+                     ip: Optional[str] = None,
+                     owners: Optional[List[Optional[ResourceID]]] = None):
+        ports = list(ports)
+        owners = owners if owners is not None else [None] * len(ports)
+        done = []
+        try:
+            for (port, protocol), owner in zip(ports, owners):
+                self.reserve(port, protocol, ip, owner)
+                done.append((port, protocol))
+        except PortConflictException:
+            # all or nothing
+            for port, protocol in done:
+                self.release(port, protocol, ip)
+            raise
+
+    def load(self, ports: Iterable[IPort]):
+        for port in ports:
+            try:
+                self.reserve(port.external, port.protocol, owner=port.id)
+            except PortConflictException as e:
+                logger.warning(str(e))
+
+    def load_from_disk(self):
+        database = Persistency.database("resources")
+        loaded = 0
+        # only the fields we need are decoded, no need to build full Port resources
+        for row in database.all("ports"):
+            data = cbor2.loads(row["value"])
+            try:
+                self.reserve(int(data["_external"]), TransportProtocol(data["_protocol"]),
+                             owner=ResourceID(row["id"]))
+                loaded += 1
+            except PortConflictException as e:
+                logger.warning(str(e))
+        logger.debug(f"Loaded {loaded} port reservations from disk.")
+
+    def attach(self):
+        if self._attached:
+            return
+        ResourceEvents.on_event(ResourceType.PORT, self._on_event)
+        ResourceEvents.on_update(ResourceType.PORT, self._on_update)
+        self._attached = True
+
+    def detach(self):
+        ResourceEvents.remove(self._on_event)
+        ResourceEvents.remove(self._on_update)
+        self._attached = False
+
+    def _on_event(self, port: PersistentResource, event: str):
+        # noinspection PyTypeChecker
+        port: IPort = port
+        if event == "created":
+            self.reserve(port.external, port.protocol, owner=port.id)
+        elif event == "deleted" and self.owner(port.external, port.protocol) == port.id:
+            self.release(port.external, port.protocol)
+
+    def _on_update(self, port: PersistentResource, field: str, current, new):
+        # noinspection PyTypeChecker
+        port: IPort = port
+        if new == current:
+            # nothing moved, the reservation stays where it is
+            return
+        if field == "external":
+            self.reserve(new, port.protocol, owner=port.id)
+            if self.owner(current, port.protocol) == port.id:
+                self.release(current, port.protocol)
+        elif field == "protocol":
+            self.reserve(port.external, new, owner=port.id)
+            if self.owner(port.external, current) == port.id:
+                self.release(port.external, current)
+
+    def _bitmap(self, protocol: TransportProtocol, ip: Optional[str]) -> PortBitmap:
+        bitmap = self._bitmaps.get((protocol, ip), None)
+        if bitmap is None:
+            bitmap = self._bitmaps[(protocol, ip)] = PortBitmap()
+        return bitmap
+
+    def _specific_counts(self, protocol: TransportProtocol) -> array:
+        counts = self._specific.get(protocol, None)
+        if counts is None:
+            counts = self._specific[protocol] = array("I", [0]) * NUM_PORTS
+        return counts
+
+    def _conflict(self, port: int, protocol: TransportProtocol,
+                  ip: Optional[str]) -> Optional[ResourceID]:
+        owner = self._owners.get((protocol, None, port), None)
+        if owner is None and ip is not None:
+            owner = self._owners.get((protocol, ip, port), None)
+        return owner
+
+
+__all__ = [
+    "NUM_PORTS",
+    "DYNAMIC_PORTS_RANGE",
+    "PortBitmap",
+    "PortAllocator",
+]
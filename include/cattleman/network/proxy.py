@@ -0,0 +1,552 @@
+import asyncio
+import dataclasses
+import logging
+import os
+import socket
+import time
+from collections import deque
+from typing import Dict, List, Tuple, Optional, Iterable, Deque
+
+import cbor2
+
+from cattleman.network.routing import HashRing
+from cattleman.persistency import Persistency
+from cattleman.types import TransportProtocol, ResourceEvents, ResourceType, PersistentResource
+
+logger = logging.getLogger("proxy")
+
+Backend = Tuple[str, int]
+RouteKey = Tuple[TransportProtocol, int]
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+# zero-copy forwarding needs os.splice (Linux, Python 3.10+), otherwise data is copied
+SPLICE_AVAILABLE = hasattr(os, "splice")
+# updates to any other field (e.g., status) do not change the routes
+ROUTING_FIELDS = {"type", "value", "internal", "external", "protocol"}
+
+
+@dataclasses.dataclass
+class ProxyRoute:
+    name: str
+    protocol: TransportProtocol
+    # external port the proxy listens on
+    port: int
+    # (address, internal port) of every backend
+    backends: List[Backend]
+    _next: int = dataclasses.field(default=0, compare=False, repr=False)
+    _ring: Optional[HashRing] = dataclasses.field(default=None, compare=False, repr=False)
+
+    @property
+    def key(self) -> RouteKey:
+        return self.protocol, self.port
+
+    def next_backend(self, client: Optional[str] = None) -> Backend:
+        return self.candidates(client)[0]
+
+    def candidates(self, client: Optional[str] = None) -> List[Backend]:
+        # backends in the order they should be tried
+        if client is not None:
+            # the same client sticks to the same backend
+            if self._ring is None:
+                self._ring = HashRing()
+                self._ring.add_many(self.backends)
+            return self._ring.lookup_n(client, len(self.backends))
+        # round-robin
+        start = self._next % len(self.backends)
+        self._next += 1
+        return self.backends[start:] + self.backends[:start]
+
+    def update(self, backends: List[Backend]):
+        if self._ring is not None:
+            # only the keys of the backends that changed move
+            for backend in set(self.backends) - set(backends):
+                self._ring.remove(backend)
+            self._ring.add_many([b for b in backends if b not in self._ring])
+        self.backends = backends
+
+
+@dataclasses.dataclass
+class ProxyStats:
+    connections: int = 0
+    active: int = 0
+    failed: int = 0
+    datagrams: int = 0
+    dropped: int = 0
+    bytes: int = 0
+    reloads: int = 0
+
+
+class PreconnectPool:
+
+    def __init__(self, size: int = 4, timeout: float = 2.0):
+        # number of connections opened ahead of time per backend; a TCP stream cannot be shared,
+        # so each one serves a single client and is replaced in the background once taken
+        self._size: int = size
+        self._timeout: float = timeout
+        self._idle: Dict[Backend, Deque[socket.socket]] = {}
+        self._refilling: Dict[Backend, asyncio.Task] = {}
+
+    async def acquire(self, backend: Backend) -> socket.socket:
+        idle = self._idle.setdefault(backend, deque())
+        sock = None
+        while idle:
+            candidate = idle.popleft()
+            if self._alive(candidate):
+                sock = candidate
+                break
+            candidate.close()
+        if sock is None:
+            sock = await self._connect(backend)
+        # replace what we took in the background
+        if self._size > 0 and backend not in self._refilling:
+            self._refilling[backend] = asyncio.create_task(self._refill(backend))
+        return sock
+
+    def discard(self, backend: Backend):
+        task = self._refilling.pop(backend, None)
+        if task is not None:
+            task.cancel()
+        for sock in self._idle.pop(backend, ()):
+            sock.close()
+
+    def close(self):
+        for backend in list(self._idle.keys()):
+            self.discard(backend)
+
+    async def _connect(self, backend: Backend) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ":" in backend[0] else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, backend), self._timeout)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    async def _refill(self, backend: Backend):
+        try:
+            idle = self._idle.setdefault(backend, deque())
+            while len(idle) < self._size:
+                idle.append(await self._connect(backend))
+        except (OSError, asyncio.TimeoutError):
+            # the backend is down, connections are made on demand until it comes back
+            pass
+        finally:
+            self._refilling.pop(backend, None)
+
+    @staticmethod
+    def _alive(sock: socket.socket) -> bool:
+        # an idle connection that is readable was either closed or reset by the backend
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b""
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+
+@dataclasses.dataclass
+class _UDPSession:
+    client: Tuple
+    sock: socket.socket
+    last_seen: float
+
+
+class _UDPListener(asyncio.DatagramProtocol):
+
+    def __init__(self, proxy: 'Proxy', key: RouteKey):
+        self._proxy: 'Proxy' = proxy
+        self._key: RouteKey = key
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        # one upstream socket per client, reused for the whole conversation
+        self._sessions: Dict[Tuple, _UDPSession] = {}
+        self._sweeper: Optional[asyncio.TimerHandle] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        # noinspection PyTypeChecker
+        self._transport = transport
+        self._schedule_sweep()
+
+    def datagram_received(self, data: bytes, addr: Tuple):
+        stats = self._proxy.stats
+        session = self._sessions.get(addr, None)
+        if session is None:
+            route = self._proxy.route(self._key)
+            if route is None or not route.backends or \
+                    len(self._sessions) >= self._proxy.max_udp_sessions:
+                stats.dropped += 1
+                return
+            session = self._open(addr, route.next_backend(self._proxy.client_key(addr)))
+            if session is None:
+                stats.dropped += 1
+                return
+        session.last_seen = time.monotonic()
+        try:
+            session.sock.send(data)
+        except OSError:
+            # UDP is lossy anyway
+            stats.dropped += 1
+            return
+        stats.datagrams += 1
+        stats.bytes += len(data)
+
+    def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        for session in list(self._sessions.values()):
+            self._close_session(session)
+        if self._transport is not None:
+            self._transport.close()
+
+    def _open(self, addr: Tuple, backend: Backend) -> Optional[_UDPSession]:
+        family = socket.AF_INET6 if ":" in backend[0] else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            sock.connect(backend)
+        except OSError as e:
+            logger.warning(f"Cannot reach UDP backend {backend[0]}:{backend[1]}: {str(e)}")
+            sock.close()
+            return None
+        session = _UDPSession(addr, sock, time.monotonic())
+        self._sessions[addr] = session
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_reply, session)
+        return session
+
+    def _on_reply(self, session: _UDPSession):
+        while True:
+            try:
+                data = session.sock.recv(DEFAULT_BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            except OSError:
+                # e.g., ICMP port unreachable
+                self._close_session(session)
+                return
+            session.last_seen = time.monotonic()
+            self._transport.sendto(data, session.client)
+            self._proxy.stats.bytes += len(data)
+
+    def _close_session(self, session: _UDPSession):
+        self._sessions.pop(session.client, None)
+        asyncio.get_running_loop().remove_reader(session.sock.fileno())
+        session.sock.close()
+
+    def _schedule_sweep(self):
+        timeout = self._proxy.udp_timeout
+        self._sweeper = asyncio.get_running_loop().call_later(timeout / 2, self._sweep)
+
+    def _sweep(self):
+        deadline = time.monotonic() - self._proxy.udp_timeout
+        for session in [s for s in self._sessions.values() if s.last_seen < deadline]:
+            self._close_session(session)
+        self._schedule_sweep()
+
+
+class Proxy:
+
+    def __init__(self, host: str = "0.0.0.0", *, pool_size: int = 4,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE, zero_copy: Optional[bool] = None,
+                 udp_timeout: float = 30.0, max_udp_sessions: int = 4096,
+                 affinity: bool = False):
+        self._host: str = host
+        # pick backends by consistent hashing of the client address instead of round-robin
+        self._affinity: bool = affinity
+        self._buffer_size: int = buffer_size
+        self._zero_copy: bool = SPLICE_AVAILABLE if zero_copy is None else \
+            (zero_copy and SPLICE_AVAILABLE)
+        self.udp_timeout: float = udp_timeout
+        self.max_udp_sessions: int = max_udp_sessions
+        self._pool: PreconnectPool = PreconnectPool(pool_size)
+        self._routes: Dict[RouteKey, ProxyRoute] = {}
+        self._tcp_listeners: Dict[RouteKey, Tuple[socket.socket, asyncio.Task]] = {}
+        self._udp_listeners: Dict[RouteKey, _UDPListener] = {}
+        self._connections: set = set()
+        self._stats: ProxyStats = ProxyStats()
+        self._dirty: bool = False
+
+    @property
+    def stats(self) -> ProxyStats:
+        return self._stats
+
+    @property
+    def zero_copy(self) -> bool:
+        return self._zero_copy
+
+    @property
+    def routes(self) -> List[ProxyRoute]:
+        return list(self._routes.values())
+
+    def route(self, key: RouteKey) -> Optional[ProxyRoute]:
+        return self._routes.get(key, None)
+
+    def client_key(self, address: Tuple) -> Optional[str]:
+        return address[0] if self._affinity else None
+
+    async def apply(self, routes: Iterable[ProxyRoute]):
+        # live reload: only listeners of routes that appeared or disappeared are touched,
+        # established connections are never interrupted
+        routes = {r.key: r for r in routes}
+        for key in set(self._routes) - set(routes):
+            self._stop_listener(key)
+            for backend in self._routes.pop(key).backends:
+                self._pool.discard(backend)
+        for key, route in routes.items():
+            current = self._routes.get(key, None)
+            if current is None:
+                self._routes[key] = route
+                try:
+                    await self._start_listener(route)
+                except OSError as e:
+                    logger.error(f"Cannot listen on {route.protocol.value}/{route.port} "
+                                 f"for '{route.name}': {str(e)}")
+                    self._routes.pop(key)
+            elif current.backends != route.backends:
+                for backend in set(current.backends) - set(route.backends):
+                    self._pool.discard(backend)
+                current.update(route.backends)
+                current.name = route.name
+        self._stats.reloads += 1
+
+    async def close(self):
+        for key in list(self._routes):
+            self._stop_listener(key)
+        self._routes.clear()
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        self._pool.close()
+
+    # --- reloading
+
+    def attach(self):
+        for type in (ResourceType.PORT, ResourceType.SERVICE, ResourceType.POD,
+                     ResourceType.IP_ADDRESS):
+            ResourceEvents.on_event(type, self._on_event)
+            ResourceEvents.on_update(type, self._on_update)
+
+    def detach(self):
+        ResourceEvents.remove(self._on_event)
+        ResourceEvents.remove(self._on_update)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    async def watch(self, interval: float = 2.0):
+        database = Persistency.database("resources")
+        version = None
+        while True:
+            # `data_version` changes when another process commits, events cover this process
+            current = database.execute("PRAGMA data_version;").fetchone()[0]
+            if current != version or self._dirty:
+                version, self._dirty = current, False
+                await self.apply(routes_from_database())
+            await asyncio.sleep(interval)
+
+    def _on_event(self, _: PersistentResource, event: str):
+        if event in ("created", "deleted"):
+            self._dirty = True
+
+    def _on_update(self, _: PersistentResource, field: str, *__):
+        if field in ROUTING_FIELDS:
+            self._dirty = True
+
+    # --- TCP
+
+    async def _start_listener(self, route: ProxyRoute):
+        if route.protocol is TransportProtocol.UDP:
+            loop = asyncio.get_running_loop()
+            _, listener = await loop.create_datagram_endpoint(
+                lambda: _UDPListener(self, route.key),
+                local_addr=(self._host, route.port)
+            )
+            self._udp_listeners[route.key] = listener
+            return
+        sock = socket.create_server((self._host, route.port), backlog=1024)
+        sock.setblocking(False)
+        task = asyncio.create_task(self._accept(sock, route.key))
+        self._tcp_listeners[route.key] = (sock, task)
+
+    def _stop_listener(self, key: RouteKey):
+        listener = self._udp_listeners.pop(key, None)
+        if listener is not None:
+            listener.close()
+        sock, task = self._tcp_listeners.pop(key, (None, None))
+        if task is not None:
+            task.cancel()
+            sock.close()
+
+    async def _accept(self, listener: socket.socket, key: RouteKey):
+        loop = asyncio.get_running_loop()
+        while True:
+            client, address = await loop.sock_accept(listener)
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            task = asyncio.create_task(self._handle(client, address, key))
+            self._connections.add(task)
+            task.add_done_callback(self._connections.discard)
+
+    async def _handle(self, client: socket.socket, address: Tuple, key: RouteKey):
+        self._stats.connections += 1
+        self._stats.active += 1
+        upstream = None
+        try:
+            route = self._routes.get(key, None)
+            candidates = route.candidates(self.client_key(address)) \
+                if route is not None and route.backends else []
+            # try every backend once
+            for backend in candidates:
+                try:
+                    upstream = await self._pool.acquire(backend)
+                    break
+                except (OSError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Cannot reach backend {backend[0]}:{backend[1]} "
+                                   f"of '{route.name}': {str(e)}")
+            if upstream is None:
+                self._stats.failed += 1
+                return
+            pump = self._splice if self._zero_copy else self._copy
+            tasks = [asyncio.create_task(pump(client, upstream)),
+                     asyncio.create_task(pump(upstream, client))]
+            try:
+                # both directions run until EOF, an error in either one tears down both
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self._stats.active -= 1
+            client.close()
+            if upstream is not None:
+                upstream.close()
+
+    async def _copy(self, src: socket.socket, dst: socket.socket):
+        loop = asyncio.get_running_loop()
+        # a single bounded buffer per direction, the next read waits for the write to complete
+        buffer = bytearray(self._buffer_size)
+        view = memoryview(buffer)
+        while True:
+            n = await loop.sock_recv_into(src, buffer)
+            if n == 0:
+                break
+            await loop.sock_sendall(dst, view[:n])
+            self._stats.bytes += n
+        self._shutdown(dst)
+
+    async def _splice(self, src: socket.socket, dst: socket.socket):
+        # socket -> pipe -> socket, the data never leaves the kernel
+        flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+        r, w = os.pipe()
+        try:
+            while True:
+                try:
+                    n = os.splice(src.fileno(), w, self._buffer_size, flags=flags)
+                except BlockingIOError:
+                    await self._wait(src, write=False)
+                    continue
+                if n == 0:
+                    break
+                while n > 0:
+                    try:
+                        m = os.splice(r, dst.fileno(), n, flags=flags)
+                    except BlockingIOError:
+                        await self._wait(dst, write=True)
+                        continue
+                    n -= m
+                    self._stats.bytes += m
+            self._shutdown(dst)
+        finally:
+            os.close(r)
+            os.close(w)
+
+    @staticmethod
+    async def _wait(sock: socket.socket, write: bool):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        fd = sock.fileno()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        if write:
+            loop.add_writer(fd, ready)
+        else:
+            loop.add_reader(fd, ready)
+        try:
+            await future
+        finally:
+            if write:
+                loop.remove_writer(fd)
+            else:
+                loop.remove_reader(fd)
+
+    @staticmethod
+    def _shutdown(sock: socket.socket):
+        # forward the EOF, the other direction keeps going
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+def routes_from_database() -> List[ProxyRoute]:
+    database = Persistency.database("resources")
+    # service -> port
+    ports = {
+        row["origin"]: row["destination"] for row in database.fetchall(
+            "SELECT origin, destination FROM relations "
+            "WHERE origin_type=? AND destination_type=? AND relation=?;",
+            ResourceType.SERVICE.value, ResourceType.PORT.value, "belongsto"
+        )
+    }
+    # service -> application <- pod -> node <- ip
+    addresses: Dict[str, List[str]] = {}
+    for row in database.fetchall(
+            "SELECT sa.origin AS service, ip.origin AS ip FROM relations sa "
+            "JOIN relations pa ON pa.destination = sa.destination AND pa.origin_type = ? "
+            "JOIN relations pn ON pn.origin = pa.origin AND pn.destination_type = ? "
+            "JOIN relations ip ON ip.destination = pn.destination AND ip.origin_type = ? "
+            "WHERE sa.origin_type = ? AND sa.destination_type = ?;",
+            ResourceType.POD.value, ResourceType.NODE.value, ResourceType.IP_ADDRESS.value,
+            ResourceType.SERVICE.value, ResourceType.APPLICATION.value):
+        addresses.setdefault(row["service"], []).append(row["ip"])
+    # only the fields we need are decoded
+    values = {}
+    for table, ids in (("ports", set(ports.values())),
+                       ("ip_addresses", {i for ips in addresses.values() for i in ips})):
+        for row in database.all(table):
+            if row["id"] in ids:
+                values[row["id"]] = cbor2.loads(row["value"])
+    routes = []
+    for service, port_id in ports.items():
+        port = values.get(port_id, None)
+        if port is None:
+            continue
+        backends = sorted({
+            (values[ip]["_value"], int(port["_internal"]))
+            for ip in addresses.get(service, []) if ip in values
+        })
+        routes.append(ProxyRoute(
+            name=service,
+            protocol=TransportProtocol(port["_protocol"]),
+            port=int(port["_external"]),
+            backends=backends
+        ))
+    return routes
+
+
+__all__ = [
+    "ROUTING_FIELDS",
+    "SPLICE_AVAILABLE",
+    "ProxyRoute",
+    "ProxyStats",
+    "PreconnectPool",
+    "Proxy",
+    "routes_from_database",
+]
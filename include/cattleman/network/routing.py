@@ -0,0 +1,210 @@
+import logging
+from bisect import bisect, bisect_left
+from hashlib import blake2b
+from typing import Dict, List, Hashable, Optional, Set, Iterable, Tuple, Union
+
+from cattleman.relations import RelationsManager
+from cattleman.types import ResourceID, ResourceType, RelationType, ResourceEvents, \
+    PersistentResource
+
+logger = logging.getLogger("routing")
+
+# virtual nodes per member with weight 1.0
+DEFAULT_VNODES = 100
+# below this many new points, points are inserted one by one instead of re-sorting the ring
+_INSERT_THRESHOLD = 256
+
+
+def _hash(key: Union[str, bytes]) -> int:
+    if isinstance(key, str):
+        key = key.encode()
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), "big")
+
+
+class HashRing:
+
+    def __init__(self, vnodes: int = DEFAULT_VNODES):
+        self._vnodes: int = vnodes
+        # sorted positions on the ring and the member owning each of them
+        self._points: List[int] = []
+        self._owners: List[Hashable] = []
+        self._weights: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def __contains__(self, member: Hashable) -> bool:
+        return member in self._weights
+
+    @property
+    def members(self) -> List[Hashable]:
+        return list(self._weights.keys())
+
+    @property
+    def size(self) -> int:
+        return len(self._points)
+
+    def weight(self, member: Hashable) -> float:
+        return self._weights[member]
+
+    def add(self, member: Hashable, weight: float = 1.0):
+        self.add_many([member], weight)
+
+    def add_many(self, members: Iterable[Hashable], weight: float = 1.0):
+        points = []
+        for member in members:
+            # the i-th virtual node of a member always lands on the same point, so changing
+            # a weight only adds or removes the difference
+            current = self._count(self._weights.get(member, 0.0))
+            wanted = self._count(weight)
+            if wanted < current:
+                self._remove_points(member, wanted, current)
+            else:
+                points.extend((self._point(member, i), member) for i in range(current, wanted))
+            self._weights[member] = weight
+        self._insert(points)
+
+    def remove(self, member: Hashable):
+        weight = self._weights.pop(member, None)
+        if weight is not None:
+            self._remove_points(member, 0, self._count(weight))
+
+    def lookup(self, key: Union[str, bytes]) -> Optional[Hashable]:
+        if not self._points:
+            return None
+        i = bisect(self._points, _hash(key))
+        return self._owners[i if i < len(self._owners) else 0]
+
+    def lookup_n(self, key: Union[str, bytes], n: int) -> List[Hashable]:
+        # first `n` distinct members clockwise from the key (e.g., for failover)
+        found = []
+        if not self._points:
+            return found
+        n = min(n, len(self._weights))
+        start = bisect(self._points, _hash(key))
+        for i in range(len(self._owners)):
+            owner = self._owners[(start + i) % len(self._owners)]
+            if owner not in found:
+                found.append(owner)
+                if len(found) == n:
+                    break
+        return found
+
+    def _count(self, weight: float) -> int:
+        return max(1, round(self._vnodes * weight)) if weight > 0 else 0
+
+    @staticmethod
+    def _point(member: Hashable, i: int) -> int:
+        return _hash(f"{member}#{i}")
+
+    def _insert(self, points: List[Tuple[int, Hashable]]):
+        if len(points) < _INSERT_THRESHOLD:
+            for point, owner in points:
+                i = bisect(self._points, point)
+                self._points.insert(i, point)
+                self._owners.insert(i, owner)
+            return
+        # merge in bulk
+        merged = sorted(zip(self._points + [p for p, _ in points],
+                            self._owners + [o for _, o in points]), key=lambda e: e[0])
+        self._points = [p for p, _ in merged]
+        self._owners = [o for _, o in merged]
+
+    def _remove_points(self, member: Hashable, start: int, end: int):
+        for i in range(start, end):
+            point = self._point(member, i)
+            j = bisect_left(self._points, point)
+            # skip (unlikely) collisions with other members
+            while j < len(self._points) and self._points[j] == point and \
+                    self._owners[j] != member:
+                j += 1
+            if j < len(self._points) and self._points[j] == point:
+                del self._points[j]
+                del self._owners[j]
+
+
+class RoutingTable:
+
+    def __init__(self, vnodes: int = DEFAULT_VNODES):
+        self._vnodes: int = vnodes
+        # one ring of pods per service
+        self._rings: Dict[ResourceID, HashRing] = {}
+        self._services: Dict[ResourceID, Set[ResourceID]] = {}
+        self._pods: Dict[ResourceID, Dict[ResourceID, float]] = {}
+        self._applications: Dict[ResourceID, ResourceID] = {}
+        self._attached: bool = False
+
+    def ring(self, service: ResourceID) -> Optional[HashRing]:
+        return self._rings.get(service, None)
+
+    def route(self, service: ResourceID, key: Union[str, bytes]) -> Optional[ResourceID]:
+        ring = self._rings.get(service, None)
+        return ring.lookup(key) if ring is not None else None
+
+    def add_service(self, service: ResourceID, application: ResourceID):
+        ring = HashRing(self._vnodes)
+        pods = self._pods.get(application, {})
+        for weight in set(pods.values()):
+            ring.add_many([p for p, w in pods.items() if w == weight], weight)
+        self._rings[service] = ring
+        self._services.setdefault(application, set()).add(service)
+
+    def remove_service(self, service: ResourceID):
+        self._rings.pop(service, None)
+        for services in self._services.values():
+            services.discard(service)
+
+    def add_pod(self, pod: ResourceID, application: ResourceID, weight: float = 1.0):
+        self._pods.setdefault(application, {})[pod] = weight
+        self._applications[pod] = application
+        for service in self._services.get(application, ()):
+            self._rings[service].add(pod, weight)
+
+    def retire_pod(self, pod: ResourceID):
+        application = self._applications.pop(pod, None)
+        if application is None:
+            return
+        self._pods[application].pop(pod, None)
+        for service in self._services.get(application, ()):
+            self._rings[service].remove(pod)
+
+    def load_from_disk(self):
+        for row in RelationsManager.get(origin_type=ResourceType.POD,
+                                        destination_type=ResourceType.APPLICATION,
+                                        relation=RelationType.BELONGS_TO):
+            self._pods.setdefault(row["destination"], {})[row["origin"]] = 1.0
+            self._applications[row["origin"]] = row["destination"]
+        for row in RelationsManager.get(origin_type=ResourceType.SERVICE,
+                                        destination_type=ResourceType.APPLICATION,
+                                        relation=RelationType.BELONGS_TO):
+            self.add_service(row["origin"], row["destination"])
+        logger.debug(f"Loaded {len(self._rings)} service routing rings from disk.")
+
+    def attach(self):
+        if self._attached:
+            return
+        ResourceEvents.on_event(ResourceType.POD, self._on_event)
+        self._attached = True
+
+    def detach(self):
+        ResourceEvents.remove(self._on_event)
+        self._attached = False
+
+    def _on_event(self, pod: PersistentResource, event: str):
+        if event == "deleted":
+            # e.g., retired, evicted or failed to start
+            self.retire_pod(pod.id)
+            return
+        if event != "created":
+            return
+        for row in RelationsManager.get(origin=pod.id,
+                                        destination_type=ResourceType.APPLICATION,
+                                        relation=RelationType.BELONGS_TO):
+            self.add_pod(pod.id, row["destination"])
+
+
+__all__ = [
+    "DEFAULT_VNODES",
+    "HashRing",
+    "RoutingTable",
+]
@@ -0,0 +1,198 @@
+import dataclasses
+import logging
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple, Callable, Iterable
+
+from cattleman.orchestrator.probes import StatusWriter
+from cattleman.types import ResourceID, Status, INode
+
+logger = logging.getLogger("heartbeat")
+
+HEARTBEAT_STATUS_KEY = "heartbeat"
+DEFAULT_PHI_THRESHOLD = 8.0
+
+
+def phi(delta: float, mean: float, std: float) -> float:
+    # logistic approximation of the normal CDF, as in the phi-accrual detector paper (Hayashibara
+    # et al.), returns -log10 of the probability that a heartbeat is still coming
+    y = (delta - mean) / std
+    z = -y * (1.5976 + 0.070566 * y * y)
+    # far from the mean the probability under- or overflows
+    if z < -700.0:
+        return math.inf
+    if z > 700.0:
+        return 0.0
+    e = math.exp(z)
+    if delta > mean:
+        return -math.log10(e / (1.0 + e))
+    return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+
+def _phi_to_y(threshold: float) -> float:
+    # phi only depends on y = (delta - mean) / std, invert it once so that every node gets a
+    # deadline instead of having its phi recomputed at every check
+    low, high = 0.0, 64.0
+    for _ in range(100):
+        y = (low + high) / 2
+        if phi(y, 0.0, 1.0) < threshold:
+            low = y
+        else:
+            high = y
+    return high
+
+
+@dataclasses.dataclass
+class HeartbeatStats:
+    heartbeats: int = 0
+    unknown: int = 0
+    suspected: int = 0
+    recovered: int = 0
+    checks: int = 0
+
+
+class HeartbeatMonitor:
+
+    def __init__(self, threshold: float = DEFAULT_PHI_THRESHOLD, alpha: float = 0.1,
+                 min_std: float = 0.1, acceptable_pause: float = 0.0,
+                 writer: Optional[StatusWriter] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self._threshold: float = threshold
+        self._y: float = _phi_to_y(threshold)
+        # weight of the newest interval in the (exponentially weighted) mean and variance
+        self._alpha: float = alpha
+        self._min_std: float = min_std
+        self._pause: float = acceptable_pause
+        self._writer: StatusWriter = writer or StatusWriter()
+        self._clock: Callable[[], float] = clock
+        # one slot per node, parallel arrays
+        self._slots: Dict[ResourceID, int] = {}
+        self._nodes: List[INode] = []
+        self._last: array = array("d")
+        self._mean: array = array("d")
+        self._var: array = array("d")
+        # time at which phi crosses the threshold if no heartbeat arrives
+        self._deadline: array = array("d")
+        self._suspected: bytearray = bytearray()
+        self._recovered: List[ResourceID] = []
+        self._stats: HeartbeatStats = HeartbeatStats()
+
+    @property
+    def stats(self) -> HeartbeatStats:
+        return dataclasses.replace(self._stats)
+
+    @property
+    def writer(self) -> StatusWriter:
+        return self._writer
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: ResourceID) -> bool:
+        return node in self._slots
+
+    def add_node(self, node: INode, expected_interval: float = 1.0):
+        if node.id in self._slots:
+            return
+        now = self._clock()
+        self._slots[node.id] = len(self._nodes)
+        self._nodes.append(node)
+        # bootstrap the statistics with the expected interval
+        std = max(expected_interval / 4, self._min_std)
+        self._last.append(now)
+        self._mean.append(expected_interval)
+        self._var.append(std * std)
+        self._deadline.append(now + expected_interval + self._pause + self._y * std)
+        self._suspected.append(0)
+
+    def remove_node(self, node: ResourceID):
+        i = self._slots.pop(node, None)
+        if i is None:
+            return
+        # a pending recovery would be reported for a node that is gone
+        if node in self._recovered:
+            self._recovered = [n for n in self._recovered if n != node]
+        # move the last slot into the hole
+        last = len(self._nodes) - 1
+        if i != last:
+            moved = self._nodes[last]
+            self._slots[moved.id] = i
+            self._nodes[i] = moved
+            for column in (self._last, self._mean, self._var, self._deadline, self._suspected):
+                column[i] = column[last]
+        self._nodes.pop()
+        for column in (self._last, self._mean, self._var, self._deadline, self._suspected):
+            column.pop()
+
+    def heartbeat(self, node: ResourceID, now: Optional[float] = None) -> bool:
+        i = self._slots.get(node, None)
+        if i is None:
+            self._stats.unknown += 1
+            return False
+        if now is None:
+            now = self._clock()
+        self._stats.heartbeats += 1
+        interval = now - self._last[i]
+        if interval < 0:
+            return True
+        self._last[i] = now
+        # exponentially weighted mean and variance of the arrival intervals
+        mean = self._mean[i]
+        diff = interval - mean
+        increment = self._alpha * diff
+        mean += increment
+        var = (1.0 - self._alpha) * (self._var[i] + diff * increment)
+        self._mean[i] = mean
+        self._var[i] = var
+        std = math.sqrt(var)
+        self._deadline[i] = now + mean + self._pause + \
+            self._y * (std if std > self._min_std else self._min_std)
+        if self._suspected[i]:
+            self._suspected[i] = 0
+            self._stats.recovered += 1
+            self._recovered.append(node)
+            self._writer.report(self._nodes[i], HEARTBEAT_STATUS_KEY, Status.SUCCESS)
+        return True
+
+    def heartbeat_many(self, nodes: Iterable[ResourceID], now: Optional[float] = None):
+        now = now if now is not None else self._clock()
+        heartbeat = self.heartbeat
+        for node in nodes:
+            heartbeat(node, now)
+
+    def phi(self, node: ResourceID, now: Optional[float] = None) -> float:
+        i = self._slots[node]
+        now = now if now is not None else self._clock()
+        std = max(math.sqrt(self._var[i]), self._min_std)
+        return phi(now - self._last[i], self._mean[i] + self._pause, std)
+
+    def is_suspected(self, node: ResourceID) -> bool:
+        return bool(self._suspected[self._slots[node]])
+
+    def check(self, now: Optional[float] = None) -> List[Tuple[ResourceID, bool]]:
+        now = now if now is not None else self._clock()
+        self._stats.checks += 1
+        # recoveries were found by `heartbeat`
+        transitions = [(node, False) for node in self._recovered]
+        self._recovered.clear()
+        deadline, suspected = self._deadline, self._suspected
+        for i in [i for i, d in enumerate(deadline) if d < now and not suspected[i]]:
+            suspected[i] = 1
+            node = self._nodes[i]
+            self._stats.suspected += 1
+            transitions.append((node.id, True))
+            self._writer.report(node, HEARTBEAT_STATUS_KEY, Status.FAILURE,
+                                f"phi > {self._threshold:g}")
+        # only transitions reach the database
+        self._writer.flush()
+        return transitions
+
+
+__all__ = [
+    "HEARTBEAT_STATUS_KEY",
+    "DEFAULT_PHI_THRESHOLD",
+    "HeartbeatStats",
+    "HeartbeatMonitor",
+    "phi",
+]
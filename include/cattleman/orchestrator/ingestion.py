@@ -0,0 +1,281 @@
+import dataclasses
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+from threading import Condition, Thread
+from typing import Optional, Dict, Deque, List, Callable
+
+from cattleman.constants import FRAGMENT_SCHEMA_VERSION
+from cattleman.exceptions import QueueFullException, RateLimitedException, \
+    SchemaValidationException
+from cattleman.resources import Request
+from cattleman.types import Fragment
+from cattleman.utils.misc import assert_type
+from cattleman.utils.schemas import SchemaRegistry
+
+logger = logging.getLogger("ingestion")
+
+# number of per-source buckets above which the idle ones are dropped
+MIN_BUCKETS_SWEEP = 1024
+
+
+class RequestPriority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+@dataclasses.dataclass
+class IngestionStats:
+    submitted: int = 0
+    accepted: int = 0
+    rejected_full: int = 0
+    rejected_rate: int = 0
+    rejected_invalid: int = 0
+    evicted: int = 0
+    persisted: int = 0
+    failed: int = 0
+    batches: int = 0
+    depth: int = 0
+    max_depth: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    @property
+    def rejected(self) -> int:
+        return self.rejected_full + self.rejected_rate + self.rejected_invalid + self.evicted
+
+    @property
+    def wait_time_mean(self) -> float:
+        done = self.persisted + self.failed
+        return self.wait_time_total / done if done else 0.0
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self._rate: float = rate
+        self._burst: float = burst
+        self._tokens: float = burst
+        self._clock: Callable[[], float] = clock
+        self._last: float = clock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def full(self) -> bool:
+        # a full bucket behaves like a new one
+        return self._tokens + (self._clock() - self._last) * self._rate >= self._burst
+
+    def try_acquire(self, n: float = 1.0) -> bool:
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+        if self._tokens < n:
+            return False
+        self._tokens -= n
+        return True
+
+
+@dataclasses.dataclass
+class _Entry:
+    name: str
+    fragment: Fragment
+    description: Optional[str]
+    source: str
+    priority: RequestPriority
+    enqueued: float
+    future: Future
+
+
+class RequestIngestion:
+
+    def __init__(self, capacity: int = 1024, batch_size: int = 64, max_delay: float = 0.05,
+                 rate: Optional[float] = None, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        assert_type(capacity, int)
+        assert_type(batch_size, int)
+        self._capacity: int = capacity
+        self._batch_size: int = batch_size
+        self._max_delay: float = max_delay
+        # per-source rate limit (disabled when `rate` is None)
+        self._rate: Optional[float] = rate
+        # a bucket must hold at least one token, or it rejects everything
+        self._burst: float = burst if burst is not None else max(1.0, rate or 0.0)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._sweep_at: int = MIN_BUCKETS_SWEEP
+        self._clock: Callable[[], float] = clock
+        # one FIFO per priority class
+        self._queues: Dict[RequestPriority, Deque[_Entry]] = {p: deque() for p in RequestPriority}
+        self._depth: int = 0
+        self._stats: IngestionStats = IngestionStats()
+        self._cond: Condition = Condition()
+        self._worker: Optional[Thread] = None
+        self._is_shutdown: bool = False
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def stats(self) -> IngestionStats:
+        with self._cond:
+            return dataclasses.replace(self._stats, depth=self._depth)
+
+    def submit(self, name: str, fragment: Fragment, *, source: str = "default",
+               priority: RequestPriority = RequestPriority.NORMAL,
+               description: Optional[str] = None) -> Future:
+        # verify types
+        assert_type(name, str)
+        assert_type(fragment, Fragment)
+        assert_type(source, str)
+        assert_type(priority, RequestPriority)
+        assert_type(description, str, nullable=True)
+        # invalid fragments are rejected before they take up space in the queue
+        error = SchemaRegistry.validator("fragment", FRAGMENT_SCHEMA_VERSION)(fragment)
+        with self._cond:
+            self._stats.submitted += 1
+            if error is not None:
+                self._stats.rejected_invalid += 1
+                raise SchemaValidationException("fragment", FRAGMENT_SCHEMA_VERSION, error)
+            # per-source rate limit
+            if self._rate is not None:
+                bucket = self._buckets.get(source, None)
+                if bucket is None:
+                    if len(self._buckets) >= self._sweep_at:
+                        self._sweep()
+                    bucket = TokenBucket(self._rate, self._burst, self._clock)
+                    self._buckets[source] = bucket
+                if not bucket.try_acquire():
+                    self._stats.rejected_rate += 1
+                    raise RateLimitedException(source, self._rate)
+            # admission control: when full, make room by evicting the newest lower priority entry
+            if self._depth >= self._capacity and not self._evict(priority):
+                self._stats.rejected_full += 1
+                raise QueueFullException("requests", self._capacity)
+            # ---
+            entry = _Entry(name, fragment, description, source, priority, self._clock(), Future())
+            self._queues[priority].append(entry)
+            self._depth += 1
+            self._stats.accepted += 1
+            self._stats.max_depth = max(self._stats.max_depth, self._depth)
+            if self._depth >= self._batch_size:
+                self._cond.notify()
+        return entry.future
+
+    def _sweep(self):
+        # sources that have been idle long enough to refill their bucket start over
+        self._buckets = {s: b for s, b in self._buckets.items() if not b.full}
+        self._sweep_at = max(MIN_BUCKETS_SWEEP, 2 * len(self._buckets))
+
+    def flush(self, max_items: Optional[int] = None) -> int:
+        batch = self._take(max_items if max_items is not None else self._batch_size)
+        if not batch:
+            return 0
+        try:
+            requests = Request.make_many(
+                [e.name for e in batch],
+                [e.fragment for e in batch],
+                descriptions=[e.description for e in batch],
+                validate=False
+            )
+        except Exception as e:
+            logger.error(f"Failed to persist a batch of {len(batch)} requests: {str(e)}")
+            self._account(batch, failed=True)
+            for entry in batch:
+                entry.future.set_exception(e)
+            return 0
+        self._account(batch, failed=False)
+        for entry, request in zip(batch, requests):
+            entry.future.set_result(request)
+        return len(batch)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._is_shutdown = False
+        self._worker = Thread(target=self._work, name="request-ingestion", daemon=True)
+        self._worker.start()
+
+    def shutdown(self, drain: bool = True):
+        with self._cond:
+            self._is_shutdown = True
+            self._cond.notify()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        # persist whatever is left
+        while drain and self._depth > 0:
+            self.flush()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                # wait for a full batch or for the oldest entry to be `max_delay` old
+                while not self._is_shutdown:
+                    oldest = self._oldest()
+                    if self._depth >= self._batch_size:
+                        break
+                    if oldest is None:
+                        self._cond.wait()
+                        continue
+                    remaining = oldest + self._max_delay - self._clock()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._is_shutdown:
+                    return
+            self.flush()
+
+    def _oldest(self) -> Optional[float]:
+        enqueued = [q[0].enqueued for q in self._queues.values() if q]
+        return min(enqueued) if enqueued else None
+
+    def _take(self, n: int) -> List[_Entry]:
+        batch = []
+        with self._cond:
+            for priority in RequestPriority:
+                queue = self._queues[priority]
+                while queue and len(batch) < n:
+                    batch.append(queue.popleft())
+            self._depth -= len(batch)
+        return batch
+
+    def _evict(self, priority: RequestPriority) -> bool:
+        for lower in reversed(RequestPriority):
+            if lower <= priority:
+                return False
+            queue = self._queues[lower]
+            if queue:
+                entry = queue.pop()
+                self._depth -= 1
+                self._stats.evicted += 1
+                entry.future.set_exception(QueueFullException("requests", self._capacity))
+                return True
+        return False
+
+    def _account(self, batch: List[_Entry], failed: bool):
+        now = self._clock()
+        with self._cond:
+            self._stats.batches += 1
+            if failed:
+                self._stats.failed += len(batch)
+            else:
+                self._stats.persisted += len(batch)
+            for entry in batch:
+                wait = now - entry.enqueued
+                self._stats.wait_time_total += wait
+                self._stats.wait_time_max = max(self._stats.wait_time_max, wait)
+
+
+__all__ = [
+    "MIN_BUCKETS_SWEEP",
+    "RequestPriority",
+    "IngestionStats",
+    "TokenBucket",
+    "RequestIngestion",
+]
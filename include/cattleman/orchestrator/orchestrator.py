@@ -1,29 +1,300 @@
+import asyncio
+import dataclasses
+import logging
 import signal
 import time
+from collections import deque
+from typing import Dict, Deque, Iterable, List, Optional, Callable
 
-from cattleman.types import KnowledgeBase
+from cattleman.orchestrator.scheduler import Scheduler, PodSpec, Placement
+from cattleman.runtime.driver import RuntimeDriver, PodHandle
+from cattleman.types import KnowledgeBase, ResourceID
+from cattleman.utils.metrics import MetricsRegistry
+from cattleman.utils.timing_wheel import TimingWheel
+
+logger = logging.getLogger("orchestrator")
+
+
+@dataclasses.dataclass
+class OrchestratorStats:
+    ticks: int = 0
+    submitted: int = 0
+    scheduled: int = 0
+    # pods that did not fit anywhere when their turn came, they are retried at the next tick
+    unschedulable: int = 0
+    started: int = 0
+    failed_starts: int = 0
+    # pods given up on after too many failed starts
+    dropped: int = 0
+    evicted: int = 0
+    retired: int = 0
+    # queue depth seen by each tick, after its timers fired
+    queue_depth_total: int = 0
+    queue_depth_max: int = 0
+    # time from the queue going non-empty until it is drained again
+    convergences: int = 0
+    convergence_total: float = 0.0
+    convergence_max: float = 0.0
+
+    @property
+    def queue_depth_mean(self) -> float:
+        return self.queue_depth_total / self.ticks if self.ticks else 0.0
+
+    @property
+    def convergence_mean(self) -> float:
+        return self.convergence_total / self.convergences if self.convergences else 0.0
 
 
 class Orchestrator:
 
-    def __init__(self, min_frequency: float = 10.0):
+    def __init__(self, min_frequency: float = 10.0, scheduler: Optional[Scheduler] = None,
+                 runtime: Optional[RuntimeDriver] = None, batch_size: int = 256,
+                 clock: Callable[[], float] = time.monotonic, handle_signals: bool = True,
+                 metrics: Optional[MetricsRegistry] = None, max_retries: Optional[int] = None):
         self._min_frequency: float = min_frequency
         self._current_frequency: float = min_frequency
         self._is_shutdown: bool = False
+        self._scheduler: Scheduler = scheduler or Scheduler()
+        # without a runtime, bound pods are considered running
+        self._runtime: Optional[RuntimeDriver] = runtime
+        self._batch_size: int = batch_size
+        self._clock: Callable[[], float] = clock
+        # TTLs, expiries and delayed work share one wheel, driven by the main loop
+        self._timers: TimingWheel = TimingWheel(tick=1.0 / min_frequency, clock=clock)
+        # pods waiting to be placed and started
+        self._pending: Deque[PodSpec] = deque()
+        # node -> pod -> placement
+        self._running: Dict[ResourceID, Dict[ResourceID, Placement]] = {}
+        self._nodes: Dict[ResourceID, ResourceID] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._unsettled_since: Optional[float] = None
+        self._stats: OrchestratorStats = OrchestratorStats()
+        # a pod that failed to start more than `max_retries` times is dropped, None retries forever
+        self._max_retries: Optional[int] = max_retries
+        # id(pod spec) -> [time it was requested (or evicted), failed starts]
+        self._requested: Dict[int, List] = {}
+        self._metrics: MetricsRegistry = metrics if metrics is not None else MetricsRegistry()
+        self._register_metrics()
         # register CTRL-C handler
-        signal.signal(signal.SIGINT, self.shutdown)
+        if handle_signals:
+            signal.signal(signal.SIGINT, self.shutdown)
 
     @property
     def is_shutdown(self) -> bool:
         return self._is_shutdown
 
-    def shutdown(self, _, __):
+    @property
+    def timers(self) -> TimingWheel:
+        return self._timers
+
+    @property
+    def scheduler(self) -> Scheduler:
+        return self._scheduler
+
+    @property
+    def stats(self) -> OrchestratorStats:
+        return dataclasses.replace(self._stats)
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self._metrics
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        return len(self._nodes)
+
+    def pods(self, node: Optional[ResourceID] = None) -> List[ResourceID]:
+        if node is not None:
+            return list(self._running.get(node, ()))
+        return list(self._nodes)
+
+    def submit(self, pods: Iterable[PodSpec]):
+        pods = list(pods)
+        self._pending.extend(pods)
+        self._stats.submitted += len(pods)
+        self._requested_now(pods)
+        self._unsettle()
+
+    def retire(self, pods: Iterable[ResourceID]) -> List[PodSpec]:
+        placements = []
+        for pod in pods:
+            node = self._nodes.pop(pod, None)
+            if node is None:
+                continue
+            placement = self._running[node].pop(pod)
+            self._scheduler.release(node, placement.pod.application, placement.pod.demand)
+            placements.append((pod, placement))
+        if self._runtime is not None and placements:
+            self._await(self._runtime.stop_many(
+                [PodHandle(pod, p.node, p.pod.application) for pod, p in placements]
+            ))
+        Scheduler.unbind([pod for pod, _ in placements])
+        self._stats.retired += len(placements)
+        return [p.pod for _, p in placements]
+
+    def evict_node(self, node: ResourceID) -> int:
+        # the node is gone, its pods go back in the queue (ahead of new requests)
+        pods = self._running.pop(node, {})
+        for pod in pods:
+            self._nodes.pop(pod, None)
+        # they get new pods (and IDs) when they are placed again
+        Scheduler.unbind(pods)
+        specs = [p.pod for p in pods.values()]
+        self._pending.extendleft(reversed(specs))
+        self._requested_now(specs)
+        self._unsettle()
+        try:
+            self._scheduler.remove_node(node)
+        except KeyError:
+            pass
+        self._stats.evicted += len(pods)
+        logger.debug(f"Node '{node}' evicted, {len(pods)} pods queued again.")
+        return len(pods)
+
+    def shutdown(self, _=None, __=None):
         self._is_shutdown = True
 
+    def tick(self) -> int:
+        # one reconciliation step, returns the number of pods that were started
+        stime = time.perf_counter()
+        self._stats.ticks += 1
+        self._timers.advance()
+        depth = len(self._pending)
+        self._stats.queue_depth_total += depth
+        self._stats.queue_depth_max = max(self._stats.queue_depth_max, depth)
+        if not depth:
+            self._tick_duration.observe(time.perf_counter() - stime)
+            return 0
+        try:
+            return self._reconcile()
+        finally:
+            if not self._pending:
+                self._settle()
+            self._tick_duration.observe(time.perf_counter() - stime)
+
+    def _reconcile(self) -> int:
+        batch = [self._pending.popleft() for _ in range(min(self._batch_size, len(self._pending)))]
+        self._processed.inc(len(batch))
+        placements = self._scheduler.place_many(batch, strict=False)
+        self._stats.scheduled += len(placements)
+        # what did not fit stays at the head of the queue
+        if len(placements) < len(batch):
+            placed = {id(p.pod) for p in placements}
+            unplaced = [pod for pod in batch if id(pod) not in placed]
+            self._stats.unschedulable += len(unplaced)
+            self._retried.inc(len(unplaced))
+            self._pending.extendleft(reversed(unplaced))
+        if not placements:
+            return 0
+        pods = Scheduler.bind(placements)
+        if self._runtime is not None:
+            results = self._await(self._runtime.start_many(
+                [PodHandle(pod.id, p.node, p.pod.application) for pod, p in zip(pods, placements)]
+            ))
+            oks = [result.ok for result in results]
+        else:
+            oks = [True] * len(pods)
+        started = 0
+        now = self._clock()
+        # pods that failed to start are bound again (with a new ID) when they are retried
+        Scheduler.unbind([pod.id for pod, ok in zip(pods, oks) if not ok])
+        for pod, placement, ok in zip(pods, placements, oks):
+            if ok:
+                self._running.setdefault(placement.node, {})[pod.id] = placement
+                self._nodes[pod.id] = placement.node
+                requested = self._requested.pop(id(placement.pod), None)
+                if requested is not None:
+                    self._latency.observe(now - requested[0])
+                started += 1
+                continue
+            # give the capacity back and try again later, possibly somewhere else
+            self._scheduler.release(placement.node, placement.pod.application,
+                                    placement.pod.demand)
+            self._stats.failed_starts += 1
+            requested = self._requested.setdefault(id(placement.pod), [now, 0])
+            requested[1] += 1
+            if self._max_retries is not None and requested[1] > self._max_retries:
+                del self._requested[id(placement.pod)]
+                self._stats.dropped += 1
+                self._dropped.inc()
+                logger.warning(f"Pod '{placement.pod.name}' failed to start {requested[1]} "
+                               f"times, dropped.")
+                continue
+            self._pending.append(placement.pod)
+            self._retried.inc()
+        self._stats.started += started
+        return started
+
     def run(self):
         while not self._is_shutdown:
-            pass
+            self.tick()
             # ---
             time.sleep(1.0 / self._current_frequency)
         # gracefully terminate resources
+        self.close()
         KnowledgeBase.shutdown()
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._runtime is not None:
+            self._await(self._runtime.close())
+        self._loop.close()
+        self._loop = None
+
+    def _register_metrics(self):
+        metrics = self._metrics
+        self._tick_duration = metrics.histogram(
+            "orchestrator_tick_seconds", "Duration of the reconciliation ticks")
+        self._latency = metrics.histogram(
+            "orchestrator_reconciliation_latency_seconds",
+            "Time from a pod being requested (or evicted) to it running")
+        self._processed = metrics.counter(
+            "orchestrator_work_items_processed_total", "Pods taken off the queue")
+        self._retried = metrics.counter(
+            "orchestrator_work_items_retried_total",
+            "Pods queued again because they did not fit or failed to start")
+        self._dropped = metrics.counter(
+            "orchestrator_work_items_dropped_total",
+            "Pods given up on after too many failed starts")
+        metrics.gauge("orchestrator_queue_depth", "Pods waiting to be placed and started",
+                      lambda: len(self._pending))
+        metrics.gauge("orchestrator_timers", "Timers waiting to fire",
+                      lambda: len(self._timers))
+        metrics.gauge("orchestrator_running_pods", "Pods running", lambda: len(self._nodes))
+        metrics.gauge("knowledge_base_resources", "Resources in the KnowledgeBase",
+                      KnowledgeBase.size)
+
+    def _requested_now(self, pods: List[PodSpec]):
+        now = self._clock()
+        for pod in pods:
+            self._requested.setdefault(id(pod), [now, 0])
+
+    def _unsettle(self):
+        if self._pending and self._unsettled_since is None:
+            self._unsettled_since = self._clock()
+
+    def _settle(self):
+        if self._unsettled_since is None:
+            return
+        elapsed = self._clock() - self._unsettled_since
+        self._unsettled_since = None
+        self._stats.convergences += 1
+        self._stats.convergence_total += elapsed
+        self._stats.convergence_max = max(self._stats.convergence_max, elapsed)
+
+    def _await(self, coroutine):
+        # the runtime is asynchronous, the orchestrator loop is not
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+
+
+__all__ = [
+    "OrchestratorStats",
+    "Orchestrator",
+]
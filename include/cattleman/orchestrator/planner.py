@@ -0,0 +1,225 @@
+import dataclasses
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Callable, Iterable, Mapping
+
+from cattleman.exceptions import DependencyCycleException
+from cattleman.persistency import Persistency
+from cattleman.types import ResourceID, RelationType
+
+logger = logging.getLogger("planner")
+
+# an action brings a single resource up (or down), it raises to signal failure
+ResourceAction = Callable[[ResourceID], None]
+
+
+@dataclasses.dataclass
+class WaveReport:
+    index: int
+    resources: List[ResourceID]
+    duration: float = 0.0
+    failed: Dict[ResourceID, str] = dataclasses.field(default_factory=dict)
+    # resources that were not acted upon because something they depend on failed
+    skipped: List[ResourceID] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class PlanReport:
+    waves: List[WaveReport] = dataclasses.field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not any(wave.failed or wave.skipped for wave in self.waves)
+
+    @property
+    def failed(self) -> Dict[ResourceID, str]:
+        return {r: e for wave in self.waves for r, e in wave.failed.items()}
+
+    @property
+    def skipped(self) -> List[ResourceID]:
+        return [r for wave in self.waves for r in wave.skipped]
+
+
+class DependencyGraph:
+
+    def __init__(self):
+        # resource -> resources that must be up before it
+        self._dependencies: Dict[ResourceID, Set[ResourceID]] = {}
+        # resource -> resources that must be down before it
+        self._dependents: Dict[ResourceID, Set[ResourceID]] = {}
+
+    def __len__(self) -> int:
+        return len(self._dependencies)
+
+    def __contains__(self, resource: ResourceID) -> bool:
+        return resource in self._dependencies
+
+    @property
+    def resources(self) -> List[ResourceID]:
+        return list(self._dependencies)
+
+    def dependencies(self, resource: ResourceID) -> Set[ResourceID]:
+        return set(self._dependencies.get(resource, ()))
+
+    def dependents(self, resource: ResourceID) -> Set[ResourceID]:
+        return set(self._dependents.get(resource, ()))
+
+    def add(self, resource: ResourceID):
+        self._dependencies.setdefault(resource, set())
+        self._dependents.setdefault(resource, set())
+
+    def add_dependency(self, resource: ResourceID, dependency: ResourceID):
+        self.add(resource)
+        self.add(dependency)
+        self._dependencies[resource].add(dependency)
+        self._dependents[dependency].add(resource)
+
+    def subgraph(self, root: ResourceID) -> 'DependencyGraph':
+        # everything that (transitively) belongs to the root, plus what those depend on
+        members: Set[ResourceID] = set()
+        stack = [root]
+        while stack:
+            resource = stack.pop()
+            if resource in members or resource not in self:
+                continue
+            members.add(resource)
+            stack.extend(self._dependents[resource])
+        stack = list(members)
+        while stack:
+            resource = stack.pop()
+            for dependency in self._dependencies[resource]:
+                if dependency not in members:
+                    members.add(dependency)
+                    stack.append(dependency)
+        graph = DependencyGraph()
+        for resource in members:
+            graph.add(resource)
+            for dependency in self._dependencies[resource]:
+                graph.add_dependency(resource, dependency)
+        return graph
+
+    def waves(self) -> List[List[ResourceID]]:
+        # Kahn's algorithm, one wave per round: a wave only depends on earlier waves
+        pending = {r: len(deps) for r, deps in self._dependencies.items()}
+        wave = sorted(r for r, n in pending.items() if n == 0)
+        waves = []
+        while wave:
+            waves.append(wave)
+            following = []
+            for resource in wave:
+                del pending[resource]
+                for dependent in self._dependents[resource]:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        following.append(dependent)
+            wave = sorted(following)
+        if pending:
+            raise DependencyCycleException(self._find_cycle(pending))
+        return waves
+
+    def _find_cycle(self, pending: Mapping[ResourceID, int]) -> List[ResourceID]:
+        # every resource left over has a dependency that is left over too, walk them until
+        # one repeats
+        resource = min(pending)
+        path: List[ResourceID] = []
+        seen: Dict[ResourceID, int] = {}
+        while resource not in seen:
+            seen[resource] = len(path)
+            path.append(resource)
+            resource = min(d for d in self._dependencies[resource] if d in pending)
+        return path[seen[resource]:] + [resource]
+
+    @staticmethod
+    def from_relations(relations: Iterable[Mapping]) -> 'DependencyGraph':
+        # the destination of a BELONGS_TO relation comes up before its origin
+        graph = DependencyGraph()
+        for row in relations:
+            if RelationType(row["relation"]) is RelationType.BELONGS_TO:
+                graph.add_dependency(ResourceID(row["origin"]), ResourceID(row["destination"]))
+        return graph
+
+    @staticmethod
+    def from_database(root: Optional[ResourceID] = None) -> 'DependencyGraph':
+        database = Persistency.database("resources")
+        rows = database.fetchall(
+            "SELECT origin, relation, destination FROM relations WHERE relation=?;",
+            RelationType.BELONGS_TO
+        )
+        graph = DependencyGraph.from_relations(rows)
+        return graph.subgraph(root) if root is not None else graph
+
+
+class Planner:
+
+    def __init__(self, graph: DependencyGraph, workers: int = 8,
+                 clock: Callable[[], float] = time.perf_counter):
+        self._graph: DependencyGraph = graph
+        self._workers: int = workers
+        self._clock: Callable[[], float] = clock
+        # raises on cycles before anything is touched
+        self._waves: List[List[ResourceID]] = graph.waves()
+
+    @property
+    def graph(self) -> DependencyGraph:
+        return self._graph
+
+    @property
+    def waves(self) -> List[List[ResourceID]]:
+        return [list(wave) for wave in self._waves]
+
+    def bring_up(self, action: ResourceAction) -> PlanReport:
+        return self._execute(self._waves, action, self._graph.dependencies)
+
+    def tear_down(self, action: ResourceAction) -> PlanReport:
+        # dependents go down first, a node is not stopped while its pods are still running
+        return self._execute(self._waves[::-1], action, self._graph.dependents)
+
+    def _execute(self, waves: List[List[ResourceID]], action: ResourceAction,
+                 blockers: Callable[[ResourceID], Set[ResourceID]]) -> PlanReport:
+        report = PlanReport()
+        stime = self._clock()
+        # failed or skipped resources, anything waiting on them is skipped too
+        broken: Set[ResourceID] = set()
+
+        def run(resource: ResourceID) -> Optional[str]:
+            try:
+                action(resource)
+                return None
+            except Exception as e:
+                logger.warning(f"Action on resource '{resource}' failed: {e}")
+                return str(e) or type(e).__name__
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for index, resources in enumerate(waves):
+                wave = WaveReport(index, list(resources))
+                wtime = self._clock()
+                runnable = []
+                for resource in resources:
+                    if blockers(resource) & broken:
+                        wave.skipped.append(resource)
+                    else:
+                        runnable.append(resource)
+                # the wave is over when all its resources are
+                for resource, error in zip(runnable, executor.map(run, runnable)):
+                    if error is not None:
+                        wave.failed[resource] = error
+                broken.update(wave.failed)
+                broken.update(wave.skipped)
+                wave.duration = self._clock() - wtime
+                report.waves.append(wave)
+                logger.debug(f"Wave {index}: {len(runnable)} resources in "
+                             f"{wave.duration * 1000:.1f}ms, {len(wave.failed)} failed, "
+                             f"{len(wave.skipped)} skipped.")
+        report.duration = self._clock() - stime
+        return report
+
+
+__all__ = [
+    "ResourceAction",
+    "WaveReport",
+    "PlanReport",
+    "DependencyGraph",
+    "Planner",
+]
@@ -0,0 +1,299 @@
+import asyncio
+import dataclasses
+import heapq
+import logging
+import random
+import socket
+import time
+from typing import Dict, List, Optional, Tuple, Callable, Iterable
+
+from cattleman.types import PersistentResource, TransportProtocol, Status, ResourceID, IPort, \
+    IIPAddress
+
+logger = logging.getLogger("probes")
+
+DEFAULT_STATUS_KEY = "reachable"
+
+ProbeKey = Tuple[ResourceID, str]
+
+
+@dataclasses.dataclass
+class ProbeTarget:
+    resource: PersistentResource
+    protocol: TransportProtocol
+    host: str
+    port: int
+    interval: float = 10.0
+    timeout: float = 2.0
+    # status entry of the resource this probe writes to
+    key: str = DEFAULT_STATUS_KEY
+
+    @property
+    def id(self) -> ProbeKey:
+        return self.resource.id, self.key
+
+    @staticmethod
+    def for_port(port: IPort, host: str, **kwargs) -> 'ProbeTarget':
+        return ProbeTarget(port, port.protocol, host, port.external, **kwargs)
+
+    @staticmethod
+    def for_address(address: IIPAddress, port: int,
+                    protocol: TransportProtocol = TransportProtocol.TCP,
+                    **kwargs) -> 'ProbeTarget':
+        return ProbeTarget(address, protocol, address.value, port, **kwargs)
+
+
+@dataclasses.dataclass
+class ProbeResult:
+    target: ProbeTarget
+    ok: bool
+    latency: float
+    error: Optional[str] = None
+
+
+@dataclasses.dataclass
+class ProbeStats:
+    probes: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+@dataclasses.dataclass
+class StatusWriterStats:
+    reported: int = 0
+    # reports that were superseded by a newer one before being written
+    coalesced: int = 0
+    # reports that did not change the status
+    unchanged: int = 0
+    written: int = 0
+    batches: int = 0
+
+
+class StatusWriter:
+
+    def __init__(self, batch_size: int = 500):
+        self._batch_size: int = batch_size
+        self._pending: Dict[ProbeKey, Tuple[PersistentResource, str, Status, Optional[str]]] = {}
+        self._stats: StatusWriterStats = StatusWriterStats()
+
+    @property
+    def stats(self) -> StatusWriterStats:
+        return dataclasses.replace(self._stats)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def report(self, resource: PersistentResource, key: str, value: Status,
+               description: Optional[str] = None):
+        self._stats.reported += 1
+        if (resource.id, key) in self._pending:
+            self._stats.coalesced += 1
+        self._pending[(resource.id, key)] = (resource, key, value, description)
+
+    def flush(self) -> int:
+        if not self._pending:
+            return 0
+        changed: Dict[ResourceID, PersistentResource] = {}
+        for resource, key, value, description in self._pending.values():
+            if resource.update_status(key, value, description):
+                changed[resource.id] = resource
+            else:
+                self._stats.unchanged += 1
+        self._pending.clear()
+        # only resources whose status changed are committed, in batches
+        resources = list(changed.values())
+        for i in range(0, len(resources), self._batch_size):
+            PersistentResource.commit_many(resources[i:i + self._batch_size])
+            self._stats.batches += 1
+        self._stats.written += len(resources)
+        return len(resources)
+
+
+class ProbeEngine:
+
+    def __init__(self, writer: Optional[StatusWriter] = None, concurrency: int = 512,
+                 jitter: float = 0.1, flush_interval: float = 1.0, seed: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self._writer: StatusWriter = writer or StatusWriter()
+        self._concurrency: int = concurrency
+        self._jitter: float = jitter
+        self._flush_interval: float = flush_interval
+        self._random: random.Random = random.Random(seed)
+        self._clock: Callable[[], float] = clock
+        self._targets: Dict[ProbeKey, ProbeTarget] = {}
+        # (due time, sequence, target), entries of removed targets are skipped lazily
+        self._schedule: List[Tuple[float, int, ProbeTarget]] = []
+        self._sequence: int = 0
+        # semaphores are bound to the event loop they first wait on
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: set = set()
+        self._stats: ProbeStats = ProbeStats()
+        self._is_shutdown: bool = False
+
+    @property
+    def writer(self) -> StatusWriter:
+        return self._writer
+
+    @property
+    def stats(self) -> ProbeStats:
+        return dataclasses.replace(self._stats)
+
+    @property
+    def targets(self) -> List[ProbeTarget]:
+        return list(self._targets.values())
+
+    def add(self, target: ProbeTarget):
+        self.add_many([target])
+
+    def add_many(self, targets: Iterable[ProbeTarget]):
+        now = self._clock()
+        for target in targets:
+            self._targets[target.id] = target
+            # spread the first round over one interval to avoid bursts
+            self._push(target, now + self._random.uniform(0, target.interval))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def remove(self, resource: ResourceID, key: str = DEFAULT_STATUS_KEY):
+        self._targets.pop((resource, key), None)
+
+    async def probe(self, target: ProbeTarget) -> ProbeResult:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop, None)
+        if semaphore is None:
+            # forget the loops that are gone
+            self._semaphores = {other: s for other, s in self._semaphores.items()
+                                if not other.is_closed()}
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self._concurrency)
+        async with semaphore:
+            self._stats.in_flight += 1
+            self._stats.max_in_flight = max(self._stats.max_in_flight, self._stats.in_flight)
+            stime = time.perf_counter()
+            try:
+                if target.protocol is TransportProtocol.UDP:
+                    error = await self._probe_udp(target)
+                else:
+                    error = await self._probe_tcp(target)
+            finally:
+                self._stats.in_flight -= 1
+        result = ProbeResult(target, error is None, time.perf_counter() - stime, error)
+        self._stats.probes += 1
+        self._stats.failures += 0 if result.ok else 1
+        self._writer.report(target.resource, target.key,
+                            Status.SUCCESS if result.ok else Status.FAILURE, error)
+        return result
+
+    async def run_once(self, targets: Optional[Iterable[ProbeTarget]] = None) \
+            -> List[ProbeResult]:
+        targets = list(targets) if targets is not None else self.targets
+        results = await asyncio.gather(*[self.probe(t) for t in targets])
+        self._writer.flush()
+        return results
+
+    async def run(self):
+        self._is_shutdown = False
+        self._wakeup = asyncio.Event()
+        last_flush = self._clock()
+        try:
+            while not self._is_shutdown:
+                now = self._clock()
+                # launch the probes that are due, one at a time per target
+                while self._schedule and self._schedule[0][0] <= now:
+                    _, _, target = heapq.heappop(self._schedule)
+                    if self._targets.get(target.id, None) is not target:
+                        continue
+                    task = asyncio.create_task(self._probe_and_reschedule(target))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                # coalesced status changes are written periodically
+                if now - last_flush >= self._flush_interval:
+                    self._writer.flush()
+                    last_flush = now
+                delay = self._flush_interval - (now - last_flush)
+                if self._schedule:
+                    delay = min(delay, self._schedule[0][0] - now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, delay))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._writer.flush()
+
+    def shutdown(self):
+        self._is_shutdown = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _probe_and_reschedule(self, target: ProbeTarget):
+        try:
+            await self.probe(target)
+        finally:
+            if self._targets.get(target.id, None) is target:
+                self._push(target, self._clock() + self._next_interval(target))
+                self._wakeup.set()
+
+    def _next_interval(self, target: ProbeTarget) -> float:
+        return target.interval * (1.0 + self._random.uniform(-self._jitter, self._jitter))
+
+    def _push(self, target: ProbeTarget, due: float):
+        self._sequence += 1
+        heapq.heappush(self._schedule, (due, self._sequence, target))
+
+    @staticmethod
+    async def _probe_tcp(target: ProbeTarget) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ":" in target.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (target.host, target.port)),
+                                   target.timeout)
+            return None
+        except asyncio.TimeoutError:
+            return "timeout"
+        except ConnectionRefusedError:
+            return "connection refused"
+        except OSError as e:
+            return e.strerror or str(e)
+        finally:
+            sock.close()
+
+    @staticmethod
+    async def _probe_udp(target: ProbeTarget) -> Optional[str]:
+        # UDP has no handshake: a closed port answers with ICMP port unreachable (reported
+        # as ECONNREFUSED on a connected socket), silence means open (or filtered)
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ":" in target.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            sock.connect((target.host, target.port))
+            sock.send(b"")
+            await asyncio.wait_for(loop.sock_recv(sock, 1), target.timeout)
+            return None
+        except asyncio.TimeoutError:
+            return None
+        except ConnectionRefusedError:
+            return "port unreachable"
+        except OSError as e:
+            return e.strerror or str(e)
+        finally:
+            sock.close()
+
+
+__all__ = [
+    "DEFAULT_STATUS_KEY",
+    "ProbeTarget",
+    "ProbeResult",
+    "ProbeStats",
+    "StatusWriter",
+    "StatusWriterStats",
+    "ProbeEngine",
+]
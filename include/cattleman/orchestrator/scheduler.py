@@ -0,0 +1,260 @@
+import dataclasses
+import heapq
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Hashable, Set, Iterable
+
+from cattleman.exceptions import SchedulingException, ResourceNotFoundException
+from cattleman.relations import RelationsManager
+from cattleman.resources import Pod
+from cattleman.types import ResourceID, ResourceType, RelationType, PersistentResource, \
+    KnowledgeBase
+from cattleman.utils.misc import assert_type
+
+# heaps are compacted when stale entries outnumber live nodes by this factor
+_COMPACTION_FACTOR = 4
+
+
+@dataclasses.dataclass
+class NodeState:
+    id: ResourceID
+    cluster: ResourceID
+    capacity: int
+    used: int = 0
+    applications: Dict[ResourceID, int] = dataclasses.field(default_factory=dict)
+    version: int = 0
+    enabled: bool = True
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.used
+
+
+@dataclasses.dataclass
+class PodSpec:
+    name: str
+    application: ResourceID
+    cluster: ResourceID
+    demand: int = 1
+    description: Optional[str] = None
+
+
+@dataclasses.dataclass
+class Placement:
+    pod: PodSpec
+    node: ResourceID
+
+
+class ScoringPolicy(ABC):
+
+    # policies that depend on the application of the pod get one heap per application
+    per_application: bool = False
+
+    @abstractmethod
+    def score(self, node: NodeState, application: Optional[ResourceID]) -> Tuple:
+        # lower is better
+        pass
+
+    def significant(self, score: Tuple) -> Tuple:
+        # part of the score that must be up-to-date for a (stale) heap entry to be trusted
+        return score
+
+
+class BinPackPolicy(ScoringPolicy):
+
+    def score(self, node: NodeState, application: Optional[ResourceID]) -> Tuple:
+        # fill up the fullest node first
+        return node.free, node.id
+
+
+class SpreadPolicy(ScoringPolicy):
+
+    def score(self, node: NodeState, application: Optional[ResourceID]) -> Tuple:
+        # least loaded node first
+        return -node.free, node.id
+
+
+class ApplicationSpreadPolicy(ScoringPolicy):
+
+    per_application = True
+
+    def score(self, node: NodeState, application: Optional[ResourceID]) -> Tuple:
+        # node running the fewest pods of the same application first, least loaded as tie-break
+        return node.applications.get(application, 0), -node.free, node.id
+
+    def significant(self, score: Tuple) -> Tuple:
+        # the load changes with every placement of other applications, using a slightly stale
+        # tie-break saves re-scoring the whole heap
+        return score[:1]
+
+
+class Scheduler:
+
+    def __init__(self, policy: Optional[ScoringPolicy] = None):
+        self._policy: ScoringPolicy = policy or SpreadPolicy()
+        self._nodes: Dict[ResourceID, NodeState] = {}
+        self._clusters: Dict[ResourceID, Set[ResourceID]] = {}
+        # nodes with no free capacity are kept out of the heaps until something is released
+        self._full: Dict[ResourceID, Set[ResourceID]] = {}
+        # (cluster, scope) -> heap of (score, node, version), entries are invalidated lazily
+        self._heaps: Dict[Tuple[ResourceID, Hashable], List[Tuple]] = {}
+
+    @property
+    def policy(self) -> ScoringPolicy:
+        return self._policy
+
+    def node(self, node: ResourceID) -> NodeState:
+        return self._nodes[node]
+
+    def add_node(self, node: ResourceID, cluster: ResourceID, capacity: int, used: int = 0):
+        assert_type(capacity, int)
+        state = NodeState(node, cluster, capacity, used)
+        self._nodes[node] = state
+        self._clusters.setdefault(cluster, set()).add(node)
+        self._full.setdefault(cluster, set())
+        if state.free <= 0:
+            self._full[cluster].add(node)
+            return
+        for (c, scope), heap in self._heaps.items():
+            if c == cluster:
+                self._push(heap, state, scope)
+
+    def remove_node(self, node: ResourceID):
+        state = self._nodes.pop(node)
+        state.enabled = False
+        self._clusters[state.cluster].discard(node)
+        self._full[state.cluster].discard(node)
+
+    def place(self, pod: PodSpec) -> Optional[ResourceID]:
+        scope = pod.application if self._policy.per_application else None
+        heap = self._heap(pod.cluster, scope)
+        skipped = []
+        chosen = None
+        while heap:
+            score, node_id, version = heapq.heappop(heap)
+            state = self._nodes.get(node_id, None)
+            # node was removed or filled up
+            if state is None or not state.enabled or node_id in self._full[pod.cluster]:
+                continue
+            # stale entry, re-score
+            if version != state.version:
+                fresh = self._policy.score(state, scope)
+                if self._policy.significant(fresh) != self._policy.significant(score):
+                    heapq.heappush(heap, (fresh, node_id, state.version))
+                    continue
+            # the best node might not fit pods that need more than one unit
+            if state.free < pod.demand:
+                skipped.append((score, node_id, state.version))
+                continue
+            chosen = state
+            break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if chosen is None:
+            return None
+        # account for the new pod
+        chosen.used += pod.demand
+        chosen.applications[pod.application] = chosen.applications.get(pod.application, 0) + 1
+        chosen.version += 1
+        if chosen.free <= 0:
+            self._full[pod.cluster].add(chosen.id)
+        else:
+            self._push(heap, chosen, scope)
+        return chosen.id
+
+    def place_many(self, pods: Iterable[PodSpec], strict: bool = True) -> List[Placement]:
+        placements = []
+        for pod in pods:
+            node = self.place(pod)
+            if node is None:
+                if strict:
+                    # undo what was placed so far
+                    for placement in placements:
+                        self.release(placement.node, placement.pod.application,
+                                     placement.pod.demand)
+                    raise SchedulingException(pod.name, pod.cluster)
+                continue
+            placements.append(Placement(pod, node))
+        return placements
+
+    def release(self, node: ResourceID, application: ResourceID, demand: int = 1):
+        state = self._nodes.get(node, None)
+        if state is None:
+            return
+        state.used = max(0, state.used - demand)
+        count = state.applications.get(application, 0) - 1
+        if count > 0:
+            state.applications[application] = count
+        else:
+            state.applications.pop(application, None)
+        state.version += 1
+        self._full[state.cluster].discard(node)
+        # scores can improve when capacity is released, so every heap must see the node again
+        for (cluster, scope), heap in self._heaps.items():
+            if cluster == state.cluster:
+                self._push(heap, state, scope)
+
+    @staticmethod
+    def bind(placements: List[Placement]) -> List[Pod]:
+        pods = [
+            Pod(
+                id=ResourceID.make(ResourceType.POD),
+                name=p.pod.name,
+                description=p.pod.description
+            )
+            for p in placements
+        ]
+        PersistentResource.commit_many(pods)
+        # pod -> node, pod -> application
+        relations = []
+        for pod, placement in zip(pods, placements):
+            relations.append((ResourceType.POD, pod.id, RelationType.BELONGS_TO,
+                              ResourceType.NODE, placement.node))
+            relations.append((ResourceType.POD, pod.id, RelationType.BELONGS_TO,
+                              ResourceType.APPLICATION, placement.pod.application))
+        RelationsManager.create_many_full(relations)
+        for pod in pods:
+            pod._log_event("created")
+        return pods
+
+    @staticmethod
+    def unbind(pods: Iterable[ResourceID]) -> int:
+        # pods that stopped (or never started) are deleted with their relations, returns how
+        # many were found
+        resources = []
+        for pod in pods:
+            try:
+                resources.append(KnowledgeBase.get(pod))
+            except ResourceNotFoundException:
+                continue
+        PersistentResource.delete_many(resources)
+        return len(resources)
+
+    def _heap(self, cluster: ResourceID, scope: Hashable) -> List[Tuple]:
+        key = (cluster, scope)
+        heap = self._heaps.get(key, None)
+        # clusters without nodes have no entry
+        size = len(self._clusters.get(cluster, ()))
+        if heap is None or len(heap) > _COMPACTION_FACTOR * (size + 1):
+            full = self._full.get(cluster, set())
+            heap = [
+                (self._policy.score(self._nodes[n], scope), n, self._nodes[n].version)
+                for n in self._clusters.get(cluster, set()) if n not in full
+            ]
+            heapq.heapify(heap)
+            self._heaps[key] = heap
+        return heap
+
+    def _push(self, heap: List[Tuple], state: NodeState, scope: Hashable):
+        heapq.heappush(heap, (self._policy.score(state, scope), state.id, state.version))
+
+
+__all__ = [
+    "NodeState",
+    "PodSpec",
+    "Placement",
+    "ScoringPolicy",
+    "BinPackPolicy",
+    "SpreadPolicy",
+    "ApplicationSpreadPolicy",
+    "Scheduler",
+]
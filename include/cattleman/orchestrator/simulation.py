@@ -0,0 +1,261 @@
+import dataclasses
+import logging
+import random
+import time
+from typing import List, Optional, Union, Dict, Any
+
+from cattleman.orchestrator.orchestrator import Orchestrator, OrchestratorStats
+from cattleman.orchestrator.scheduler import Scheduler, PodSpec, ScoringPolicy
+from cattleman.persistency import Persistency
+from cattleman.relations import RelationsManager
+from cattleman.resources import Cluster, Node, Application
+from cattleman.runtime.fake import FakeRuntime
+from cattleman.types import ResourceID, ResourceType, RelationType, PersistentResource
+from cattleman.utils.timing_wheel import VirtualClock
+
+logger = logging.getLogger("simulation")
+
+HOUR = 3600.0
+
+
+@dataclasses.dataclass
+class RequestBurst:
+    time: float
+    pods: int
+    # pods are spread round-robin over the applications of the scenario
+    demand: int = 1
+
+
+@dataclasses.dataclass
+class NodeFailure:
+    time: float
+    nodes: int = 1
+    # time it takes to notice that the nodes are gone
+    detection: float = 5.0
+    # nodes come back (empty) after this long, never if None
+    recovery: Optional[float] = 300.0
+
+
+@dataclasses.dataclass
+class PodChurn:
+    start: float
+    end: float
+    interval: float = 60.0
+    # fraction of the running pods replaced at every interval
+    fraction: float = 0.05
+
+
+ScenarioEvent = Union[RequestBurst, NodeFailure, PodChurn]
+
+
+@dataclasses.dataclass
+class Scenario:
+    duration: float
+    nodes: int = 100
+    capacity: int = 16
+    applications: int = 10
+    events: List[ScenarioEvent] = dataclasses.field(default_factory=list)
+    # failure rate of pods starting on the (fake) runtime
+    failure_rate: float = 0.0
+    seed: int = 0
+
+    @staticmethod
+    def generate(hours: float = 1.0, nodes: int = 100, capacity: int = 16,
+                 applications: int = 10, bursts_per_hour: int = 4, failures_per_hour: int = 2,
+                 churn: float = 0.05, failure_rate: float = 0.01, seed: int = 0) -> 'Scenario':
+        rng = random.Random(seed)
+        duration = hours * HOUR
+        # fill half the cluster right away, the bursts take it up to ~80%
+        events: List[ScenarioEvent] = [RequestBurst(0.0, nodes * capacity // 2)]
+        burst = max(1, int(nodes * capacity * 0.3 / max(1, bursts_per_hour * hours)))
+        for _ in range(int(bursts_per_hour * hours)):
+            events.append(RequestBurst(rng.uniform(0, duration), rng.randint(1, burst)))
+        for _ in range(int(failures_per_hour * hours)):
+            events.append(NodeFailure(rng.uniform(0, duration), rng.randint(1, 3)))
+        if churn > 0:
+            events.append(PodChurn(0.0, duration, fraction=churn))
+        events.sort(key=lambda e: e.time if not isinstance(e, PodChurn) else e.start)
+        return Scenario(duration, nodes, capacity, applications, events, failure_rate, seed)
+
+
+@dataclasses.dataclass
+class SimulationReport:
+    duration: float
+    wall_time: float
+    ticks: int
+    db_writes: int
+    orchestrator: OrchestratorStats
+
+    @property
+    def hours(self) -> float:
+        return self.duration / HOUR
+
+    @property
+    def db_writes_per_hour(self) -> float:
+        return self.db_writes / self.hours if self.duration else 0.0
+
+    @property
+    def speedup(self) -> float:
+        return self.duration / self.wall_time if self.wall_time else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        stats = self.orchestrator
+        return {
+            "simulated_hours": round(self.hours, 3),
+            "wall_time_s": round(self.wall_time, 3),
+            "speedup": round(self.speedup, 1),
+            "convergence_mean_s": round(stats.convergence_mean, 3),
+            "queue_depth_mean": round(stats.queue_depth_mean, 3),
+            "db_writes": self.db_writes,
+            "db_writes_per_hour": round(self.db_writes_per_hour, 1),
+            **dataclasses.asdict(stats),
+        }
+
+
+class Simulation:
+
+    def __init__(self, scenario: Scenario, tick: float = 0.1,
+                 policy: Optional[ScoringPolicy] = None):
+        self._scenario: Scenario = scenario
+        self._tick: float = tick
+        self._random: random.Random = random.Random(scenario.seed)
+        self._clock: VirtualClock = VirtualClock()
+        self._runtime: FakeRuntime = FakeRuntime(failure_rate=scenario.failure_rate,
+                                                 seed=scenario.seed)
+        self._orchestrator: Orchestrator = Orchestrator(
+            min_frequency=1.0 / tick, scheduler=Scheduler(policy), runtime=self._runtime,
+            clock=self._clock, handle_signals=False
+        )
+        self._cluster: Optional[Cluster] = None
+        self._nodes: List[ResourceID] = []
+        self._down: set = set()
+        self._applications: List[ResourceID] = []
+        self._sequence: int = 0
+
+    @property
+    def clock(self) -> VirtualClock:
+        return self._clock
+
+    @property
+    def orchestrator(self) -> Orchestrator:
+        return self._orchestrator
+
+    @property
+    def runtime(self) -> FakeRuntime:
+        return self._runtime
+
+    def run(self) -> SimulationReport:
+        database = Persistency.database("resources")
+        if database.path != ":memory:":
+            logger.warning(f"Simulating against the database at '{database.path}', "
+                           f"set CATTLEMAN_RESOURCES_DB=:memory: to keep it in memory.")
+        self._populate()
+        self._script()
+        writes = database.changes
+        orchestrator, clock = self._orchestrator, self._clock
+        ticks = int(round(self._scenario.duration / self._tick))
+        stime = time.perf_counter()
+        try:
+            for _ in range(ticks):
+                clock.advance(self._tick)
+                orchestrator.tick()
+        finally:
+            orchestrator.close()
+        return SimulationReport(
+            duration=self._scenario.duration,
+            wall_time=time.perf_counter() - stime,
+            ticks=ticks,
+            db_writes=database.changes - writes,
+            orchestrator=orchestrator.stats
+        )
+
+    def _populate(self):
+        scenario = self._scenario
+        self._cluster = Cluster.make("simulation")
+        # predictable IDs make the placements (which tie-break on IDs) repeatable
+        nodes = [
+            Node(id=ResourceID(f"{ResourceType.NODE.value}:{i:08x}"), name=f"node{i}",
+                 description=None)
+            for i in range(scenario.nodes)
+        ]
+        applications = [
+            Application(id=ResourceID(f"{ResourceType.APPLICATION.value}:{i:08x}"),
+                        name=f"app{i}", description=None)
+            for i in range(scenario.applications)
+        ]
+        PersistentResource.commit_many(nodes + applications)
+        RelationsManager.create_many_full(
+            (ResourceType.NODE, node.id, RelationType.BELONGS_TO, ResourceType.CLUSTER,
+             self._cluster.id)
+            for node in nodes
+        )
+        self._nodes = [node.id for node in nodes]
+        self._applications = [application.id for application in applications]
+        for node in self._nodes:
+            self._orchestrator.scheduler.add_node(node, self._cluster.id, scenario.capacity)
+
+    def _script(self):
+        timers = self._orchestrator.timers
+        for event in self._scenario.events:
+            if isinstance(event, RequestBurst):
+                timers.schedule_at(event.time, self._on_bursts, event)
+            elif isinstance(event, NodeFailure):
+                timers.schedule_at(event.time, self._on_failures, event)
+            elif isinstance(event, PodChurn):
+                timers.schedule_at(event.start, self._on_churn, event)
+
+    def _specs(self, n: int, demand: int) -> List[PodSpec]:
+        specs = []
+        for _ in range(n):
+            application = self._applications[self._sequence % len(self._applications)]
+            specs.append(PodSpec(f"pod{self._sequence}", application, self._cluster.id, demand))
+            self._sequence += 1
+        return specs
+
+    def _on_bursts(self, bursts: List[RequestBurst]):
+        for burst in bursts:
+            self._orchestrator.submit(self._specs(burst.pods, burst.demand))
+
+    def _on_failures(self, failures: List[NodeFailure]):
+        for failure in failures:
+            alive = [node for node in self._nodes if node not in self._down]
+            for node in self._random.sample(alive, min(failure.nodes, len(alive))):
+                self._down.add(node)
+                self._runtime.set_unreachable(node)
+                # the orchestrator finds out after a while
+                self._orchestrator.timers.schedule(failure.detection, self._on_detected, node)
+                if failure.recovery is not None:
+                    self._orchestrator.timers.schedule(failure.recovery, self._on_recovered,
+                                                       node)
+
+    def _on_detected(self, nodes: List[ResourceID]):
+        for node in nodes:
+            if node in self._down:
+                self._orchestrator.evict_node(node)
+
+    def _on_recovered(self, nodes: List[ResourceID]):
+        for node in nodes:
+            self._down.discard(node)
+            self._runtime.set_unreachable(node, False)
+            self._orchestrator.evict_node(node)
+            self._orchestrator.scheduler.add_node(node, self._cluster.id,
+                                                  self._scenario.capacity)
+
+    def _on_churn(self, churns: List[PodChurn]):
+        for churn in churns:
+            pods = self._orchestrator.pods()
+            retired = self._random.sample(pods, int(len(pods) * churn.fraction))
+            # every retired pod is replaced by a new one
+            self._orchestrator.submit(self._orchestrator.retire(retired))
+            if self._clock() + churn.interval < churn.end:
+                self._orchestrator.timers.schedule(churn.interval, self._on_churn, churn)
+
+
+__all__ = [
+    "RequestBurst",
+    "NodeFailure",
+    "PodChurn",
+    "Scenario",
+    "SimulationReport",
+    "Simulation",
+]
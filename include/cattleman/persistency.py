@@ -1,26 +1,92 @@
+import dataclasses
+import json
 import os
 import logging
+import random
 import sqlite3
+import time
 from sqlite3 import Row, Connection
-from threading import Semaphore
-from typing import Dict, Iterable, Any, List, Type, Optional
+from threading import Semaphore, Lock
+from typing import Dict, Iterable, Any, List, Type, Optional, Set
 
 from cattleman.logger import cmlogger
-from cattleman.constants import DATABASES_DIR, DATABASE_SCHEMA_VERSION
+from cattleman.constants import DATABASES_DIR, DATABASE_SCHEMA_VERSION, STATS_DIR
 from cattleman.exceptions import DatabaseNotFoundException
 from cattleman.utils.atomic import AtomicSession
+from cattleman.utils.misc import percentile
+from cattleman.utils.sqlite import normalize_query
 from cattleman import cmlogger
 
 ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)))
 
 logging.basicConfig()
 
+# latencies kept per statement to estimate its percentiles
+QUERY_SAMPLES = 1024
+# databases are created on first use
+DATABASES = ("resources", "events")
+
+
+@dataclasses.dataclass
+class QueryStats:
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    # rows returned by SELECTs, rows changed by everything else
+    rows: int = 0
+    slow: int = 0
+    # uniform sample (reservoir) of the latencies
+    samples: List[float] = dataclasses.field(default_factory=list)
+
+    def add(self, elapsed: float, rows: int, rng: random.Random):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.rows += rows
+        if len(self.samples) < QUERY_SAMPLES:
+            self.samples.append(elapsed)
+        else:
+            i = rng.randrange(self.calls)
+            if i < QUERY_SAMPLES:
+                self.samples[i] = elapsed
+
+    def percentile(self, q: float) -> float:
+        return percentile(sorted(self.samples), q)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+            "slow": self.slow,
+        }
+
+
+@dataclasses.dataclass
+class DatabaseSummary:
+    path: str
+    # bytes in use, pages on the free list excluded
+    size: int
+    # table -> rows
+    resources: Dict[str, int]
+    # relation type -> rows
+    relations: Dict[str, int]
+    # resource type -> status key -> failing resources
+    failures: Dict[str, Dict[str, int]]
+    # most recent failing statuses
+    recent_failures: List[Dict[str, Any]]
+
+    @property
+    def failing(self) -> int:
+        return sum(sum(keys.values()) for keys in self.failures.values())
+
 
 class Database:
 
     def __init__(self, name: str):
-        os.makedirs(DATABASES_DIR, exist_ok=True)
-        os.chmod(DATABASES_DIR, mode=0o700)
         # prepare logger
         self._logger = logging.getLogger(f"DB:{name}")
         self._logger.setLevel(logging.INFO)
@@ -29,36 +95,104 @@ class Database:
         self._db_fpath = os.environ.get(f"CATTLEMAN_{name.upper()}_DB", self._db_fpath)
         self._db: Optional[Connection] = None
         self._lock = Semaphore()
+        # per-statement statistics, None when disabled (the default)
+        self._stats: Optional[Dict[str, QueryStats]] = None
+        self._slow_threshold: Optional[float] = None
+        self._slow_logger = logging.getLogger(f"DB:{name}:slow")
+        self._plans: Dict[str, str] = {}
+        self._random = random.Random(0)
+        # tables the schema added to an existing database when it was opened
+        self._created: Set[str] = set()
+        stats = os.environ.get("CATTLEMAN_QUERY_STATS", "0").lower() not in ("", "0", "false")
+        slow = os.environ.get("CATTLEMAN_SLOW_QUERY_MS")
+        if stats or slow:
+            self.profile(slow_threshold=float(slow) / 1000.0 if slow else None)
 
     @property
     def opened(self) -> bool:
         return self._db is not None
 
+    @property
+    def path(self) -> str:
+        return self._db_fpath
+
+    @property
+    def created_tables(self) -> Set[str]:
+        return set(self._created)
+
+    @property
+    def changes(self) -> int:
+        # rows inserted, updated or deleted since the database was opened
+        return self._db.total_changes if self._db is not None else 0
+
     def open(self):
+        if os.path.dirname(self._db_fpath) == DATABASES_DIR:
+            os.makedirs(DATABASES_DIR, exist_ok=True)
+            os.chmod(DATABASES_DIR, mode=0o700)
         self._logger.info(f"Opened on {self._db_fpath}")
-        self._db = sqlite3.connect(self._db_fpath)
+        # access is serialized by `self._lock`, so the connection can be shared across threads
+        self._db = sqlite3.connect(self._db_fpath, check_same_thread=False)
         self._db.row_factory = sqlite3.Row
         self._ensure_structure()
 
+    def close(self):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    @property
+    def profiling(self) -> bool:
+        return self._stats is not None
+
+    def profile(self, enabled: bool = True, slow_threshold: Optional[float] = None):
+        # statements slower than `slow_threshold` seconds go to the slow-query log
+        self._stats = ({} if self._stats is None else self._stats) if enabled else None
+        self._slow_threshold = slow_threshold if enabled else None
+
+    def query_stats(self) -> Dict[str, QueryStats]:
+        with self._lock:
+            return {sql: dataclasses.replace(stats, samples=list(stats.samples))
+                    for sql, stats in (self._stats or {}).items()}
+
+    def reset_query_stats(self):
+        with self._lock:
+            if self._stats is not None:
+                self._stats = {}
+
+    def relocate(self, path: str):
+        # the database is opened again (on first use) at the new location
+        self.close()
+        self._db_fpath = path
+
     def get(self, table: str, id: str) -> Row:
         return self.execute(f"SELECT * FROM {table} WHERE id=?;", id).fetchone()
 
     def all(self, table: str) -> List[Row]:
-        return self.execute(f"SELECT * FROM {table};").fetchall()
+        return self.fetchall(f"SELECT * FROM {table};")
 
     def set(self, table: str, id: Any, data: bytes):
         # TODO: implement this
         pass
 
     def fetchall(self, sql: str, *args) -> List[Row]:
+        if self._stats is not None:
+            # SQLite does most of the work of a SELECT while the rows are fetched
+            return self._profiled(sql, args, fetch=True)
         return self.execute(sql, *args).fetchall()
 
     def execute(self, sql: str, *args):
+        if self._stats is not None:
+            return self._profiled(sql, args)
         with AtomicSession():
             with self._lock:
                 return self._db.execute(sql, args)
 
     def executemany(self, sql: str, seq_of_parameters: Iterable[Iterable]):
+        if self._stats is not None:
+            return self._profiled(sql, seq_of_parameters, many=True)
         with AtomicSession():
             with self._lock:
                 return self._db.executemany(sql, seq_of_parameters)
@@ -73,11 +207,49 @@ class Database:
             with self._lock:
                 return self._db.commit()
 
+    def _profiled(self, sql: str, args, fetch: bool = False, many: bool = False):
+        with AtomicSession():
+            with self._lock:
+                stime = time.perf_counter()
+                cursor = (self._db.executemany if many else self._db.execute)(sql, args)
+                rows = cursor.fetchall() if fetch else None
+                elapsed = time.perf_counter() - stime
+                if self._stats is not None:
+                    key = normalize_query(sql)
+                    stats = self._stats.get(key)
+                    if stats is None:
+                        stats = self._stats[key] = QueryStats()
+                    stats.add(elapsed, len(rows) if fetch else max(cursor.rowcount, 0),
+                              self._random)
+                    slow = self._slow_threshold is not None and elapsed >= self._slow_threshold
+                    if slow:
+                        stats.slow += 1
+                        # executemany() has no single set of arguments to explain
+                        plan = self._plan(key, sql, args) if not many else ""
+                        self._slow_logger.warning(
+                            f"Slow query ({elapsed * 1000:.3f}ms): {key}{plan}")
+        return rows if fetch else cursor
+
+    def _plan(self, key: str, sql: str, args) -> str:
+        # plans are computed once per statement, with the arguments of its first slow call
+        if key not in self._plans:
+            try:
+                rows = self._db.execute(f"EXPLAIN QUERY PLAN {sql}", args).fetchall()
+                self._plans[key] = "".join(f"\n    {row[-1]}" for row in rows)
+            except sqlite3.Error as e:
+                self._plans[key] = f"\n    (no plan: {e})"
+        return self._plans[key]
+
     def _ensure_structure(self):
         schema = os.path.join(ROOT, "schemas", "database", DATABASE_SCHEMA_VERSION, "schema.sql")
+        tables = "SELECT name FROM sqlite_master WHERE type='table';"
+        existing = {row[0] for row in self._db.execute(tables)}
         # create structure
         with open(schema, "rt") as fin:
             self.executescript(fin.read())
+        # new databases have nothing to migrate
+        self._created = {row[0] for row in self._db.execute(tables)} - existing if existing \
+            else set()
 
 
 class DatabaseSession:
@@ -105,30 +277,88 @@ class DatabaseSession:
 
 class Persistency:
 
-    __databases: Dict[str, Database] = {
-        "resources": Database("resources"),
-        "events": Database("events"),
-    }
-    __sessions: Dict[str, DatabaseSession] = {
-        name: DatabaseSession(db) for name, db in __databases.items()
-    }
+    __databases: Dict[str, Database] = {}
+    __sessions: Dict[str, DatabaseSession] = {}
+    __lock: Lock = Lock()
+
+    @staticmethod
+    def _get(name: str) -> Database:
+        database = Persistency.__databases.get(name)
+        if database is None:
+            if name not in DATABASES:
+                raise DatabaseNotFoundException(name)
+            with Persistency.__lock:
+                if name not in Persistency.__databases:
+                    database = Database(name)
+                    Persistency.__sessions[name] = DatabaseSession(database)
+                    Persistency.__databases[name] = database
+                database = Persistency.__databases[name]
+        return database
 
     @staticmethod
     def database(name: str) -> Database:
-        try:
-            database = Persistency.__databases[name]
-            if not database.opened:
-                database.open()
-            return database
-        except KeyError:
-            raise DatabaseNotFoundException(name)
+        database = Persistency._get(name)
+        if not database.opened:
+            database.open()
+        return database
+
+    @staticmethod
+    def relocate(name: str, path: str):
+        # e.g., benchmarks and simulations running against a scratch database
+        Persistency._get(name).relocate(path)
 
     @staticmethod
     def session(database: str) -> DatabaseSession:
-        try:
-            return Persistency.__sessions[database]
-        except KeyError:
-            raise DatabaseNotFoundException(database)
+        Persistency._get(database)
+        return Persistency.__sessions[database]
+
+    @staticmethod
+    def databases() -> Dict[str, Database]:
+        return {name: Persistency._get(name) for name in DATABASES}
+
+    @staticmethod
+    def save_query_stats(path: Optional[str] = None) -> Optional[str]:
+        # the statistics of a running manager, shown by 'cattle info --queries'
+        stats = {
+            name: {sql: s.summary() for sql, s in database.query_stats().items()}
+            for name, database in Persistency.databases().items() if database.profiling
+        }
+        stats = {name: statements for name, statements in stats.items() if statements}
+        if not stats:
+            return None
+        path = path or os.path.join(STATS_DIR, "queries.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wt") as fout:
+            json.dump({"date": time.time(), "databases": stats}, fout, indent=4)
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    @staticmethod
+    def summary(recent: int = 10) -> DatabaseSummary:
+        # only reads tables maintained as resources are written (see schema.sql), the cost does
+        # not depend on the number of resources
+        database = Persistency.database("resources")
+        resources, relations = {}, {}
+        for row in database.fetchall("SELECT name, count FROM resource_counts;"):
+            name = row["name"]
+            if name.startswith("relations:"):
+                relations[name[len("relations:"):]] = row["count"]
+            else:
+                resources[name] = row["count"]
+        failures: Dict[str, Dict[str, int]] = {}
+        for row in database.fetchall("SELECT resource_type, key, count(*) AS n FROM failures "
+                                     "GROUP BY resource_type, key;"):
+            failures.setdefault(row["resource_type"], {})[row["key"]] = row["n"]
+        recent_failures = [
+            dict(row) for row in database.fetchall(
+                "SELECT id, resource_type, key, description, date FROM failures "
+                "ORDER BY date DESC LIMIT ?;", recent)
+        ]
+        pages = database.execute("PRAGMA page_count;").fetchone()[0] - \
+            database.execute("PRAGMA freelist_count;").fetchone()[0]
+        size = pages * database.execute("PRAGMA page_size;").fetchone()[0]
+        return DatabaseSummary(database.path, size, resources, relations, failures,
+                               recent_failures)
 
     @staticmethod
     def load_from_disk():
@@ -137,15 +367,15 @@ class Persistency:
     @staticmethod
     def _load_resources_from_disk():
         from cattleman.types import KnowledgeBase, PersistentResource
-        from cattleman.types import Cluster
-        from cattleman.types import Node
-        from cattleman.types import IPAddress
-        from cattleman.types import DNSRecord
-        from cattleman.types import Application
-        from cattleman.types import Pod
-        from cattleman.types import Port
-        from cattleman.types import Service
-        from cattleman.types import Request
+        from cattleman.resources import Cluster
+        from cattleman.resources import Node
+        from cattleman.resources import IPAddress
+        from cattleman.resources import DNSRecord
+        from cattleman.resources import Application
+        from cattleman.resources import Pod
+        from cattleman.resources import Port
+        from cattleman.resources import Service
+        from cattleman.resources import Request
         # ---
         resources: Dict[str, Type[PersistentResource]] = {
             "clusters": Cluster,
@@ -161,16 +391,26 @@ class Persistency:
         database = Persistency.database("resources")
         # load resources
         total = 0
+        loaded: List[PersistentResource] = []
         cmlogger.info("Loading resources from disk...")
         for table, klass in resources.items():
             per_table = 0
             for res in database.all(table):
                 id = res["id"]
                 value = res["value"]
-                resource = klass.deserialize(value)
+                resource = klass.deserialize(value, dict(res))
                 KnowledgeBase.set(id, resource)
+                loaded.append(resource)
                 # collect stats
                 per_table += 1
                 total += 1
             cmlogger.debug(f" > Loaded {per_table} resources of type {table} from disk.")
         cmlogger.info(f"< Loaded {total} resources in total from disk.")
+        # fill the failing statuses of databases written before the table existed, once
+        if "failures" in database._created:
+            database._created.discard("failures")
+            rows = list(PersistentResource.failure_rows(loaded))
+            if rows:
+                with Persistency.session("resources") as cursor:
+                    cursor.executemany("INSERT OR REPLACE INTO failures(id, key, resource_type, "
+                                       "description, date) VALUES (?, ?, ?, ?, ?);", rows)
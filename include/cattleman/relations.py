@@ -1,4 +1,4 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Tuple
 
 import cbor2
 
@@ -43,7 +43,7 @@ class RelationsManager:
             conditions += ["relation=?"]
             parameters += [relation]
         # compile condition
-        condition = " AND ".join(conditions)
+        condition = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         # compile query
         query = f"SELECT * FROM relations {condition};"
         # get database
@@ -77,3 +77,32 @@ class RelationsManager:
             # execute query
             cursor.execute(query, id, origin_type, origin, relation, destination_type, destination,
                            now(), value)
+
+    @staticmethod
+    def create_many(relations: Iterable[Tuple[Resource, RelationType, Resource]],
+                    value: Optional[Dict] = None):
+        return RelationsManager.create_many_full((
+            (origin.get_type(), origin.id, relation, destination.get_type(), destination.id)
+            for origin, relation, destination in relations
+        ), value)
+
+    @staticmethod
+    def create_many_full(relations: Iterable[Tuple[ResourceType, ResourceID, RelationType,
+                                                   ResourceType, ResourceID]],
+                         value: Optional[Dict] = None):
+        value = cbor2.dumps(value or {})
+        date = now()
+        rows = [
+            (ResourceID.make(ResourceType.RELATION), origin_type, origin, relation,
+             destination_type, destination, date, value)
+            for origin_type, origin, relation, destination_type, destination in relations
+        ]
+        with Persistency.session("resources") as cursor:
+            query = upsert_query(
+                table="relations",
+                columns=RELATIONS_TABLE_COLUMNS,
+                conflict=("origin", "relation", "destination"),
+                update="value"
+            )
+            # execute query
+            cursor.executemany(query, rows)
@@ -26,6 +26,8 @@ class DNSRecord(IDNSRecord):
             _value=value,
             _ttl=ttl
         )
+        # listeners (e.g., DNS index) get to see the new record
+        dns_record._log_event("created")
         dns_record.commit()
         return dns_record
 
@@ -36,6 +36,8 @@ class Pod(IPod):
         RelationsManager.create(pod, RelationType.BELONGS_TO, node)
         # pod -> application
         RelationsManager.create(pod, RelationType.BELONGS_TO, application)
+        # listeners (e.g., routing table) can look up the relations of the new pod
+        pod._log_event("created")
         # ---
         return pod
 
@@ -26,6 +26,8 @@ class Port(IPort):
             _external=external,
             _protocol=protocol
         )
+        # listeners (e.g., port allocator) can reject the new port
+        port._log_event("created")
         port.commit()
         return port
 
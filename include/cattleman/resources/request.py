@@ -1,9 +1,12 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 import cbor2
 
+from ..constants import FRAGMENT_SCHEMA_VERSION
+from ..exceptions import SchemaValidationException
 from ..types import ResourceID, IRequest, Resource, Fragment, ResourceType
 from ..utils.misc import assert_type
+from ..utils.schemas import SchemaRegistry
 
 
 class Request(IRequest):
@@ -14,6 +17,8 @@ class Request(IRequest):
         assert_type(name, str)
         assert_type(fragment, Fragment)
         assert_type(description, str, nullable=True)
+        # validate fragment
+        SchemaRegistry.validate("fragment", FRAGMENT_SCHEMA_VERSION, fragment)
         # ---
         request = Request(
             id=ResourceID.make(ResourceType.REQUEST),
@@ -24,6 +29,38 @@ class Request(IRequest):
         request.commit()
         return request
 
+    @staticmethod
+    def make_many(names: List[str], fragments: List[Fragment], *,
+                  descriptions: Optional[List[Optional[str]]] = None,
+                  validate: bool = True) -> List['Request']:
+        descriptions = descriptions if descriptions is not None else [None] * len(names)
+        # verify types
+        assert_type(names, list, content_klass=str)
+        assert_type(fragments, list, content_klass=Fragment)
+        assert_type(descriptions, list)
+        if not len(names) == len(fragments) == len(descriptions):
+            raise ValueError("Arguments 'names', 'fragments' and 'descriptions' must have the "
+                             "same length.")
+        # validate all fragments before anything is persisted
+        if validate:
+            errors = SchemaRegistry.validate_many("fragment", FRAGMENT_SCHEMA_VERSION, fragments)
+            for i, error in enumerate(errors):
+                if error is not None:
+                    raise SchemaValidationException("fragment", FRAGMENT_SCHEMA_VERSION,
+                                                    f"[request #{i}, '{names[i]}'] {error}")
+        # ---
+        requests = [
+            Request(
+                id=ResourceID.make(ResourceType.REQUEST),
+                name=name,
+                description=description,
+                _fragment=fragment,
+            )
+            for name, fragment, description in zip(names, fragments, descriptions)
+        ]
+        Request.commit_many(requests)
+        return requests
+
     @classmethod
     def deserialize(cls, value: bytes, metadata: Optional[Dict] = None) -> 'Request':
         data = cbor2.loads(value)
@@ -0,0 +1,200 @@
+import asyncio
+import dataclasses
+import logging
+import time
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Dict, List, Optional, Iterable, AsyncIterator, Set, Any, Callable, \
+    Awaitable
+
+from cattleman.runtime.pool import ConnectionPool
+from cattleman.types import ResourceID
+
+logger = logging.getLogger("runtime")
+
+
+class PodState(Enum):
+    PENDING = "pending"
+    STARTING = "starting"
+    RUNNING = "running"
+    STOPPING = "stopping"
+    STOPPED = "stopped"
+    FAILED = "failed"
+
+
+@dataclasses.dataclass(frozen=True)
+class PodHandle:
+    pod: ResourceID
+    node: ResourceID
+    application: Optional[ResourceID] = None
+
+
+@dataclasses.dataclass
+class PodInfo:
+    pod: ResourceID
+    node: ResourceID
+    state: PodState
+    error: Optional[str] = None
+
+
+@dataclasses.dataclass
+class OperationResult:
+    pod: PodHandle
+    ok: bool
+    error: Optional[str] = None
+
+
+@dataclasses.dataclass
+class RuntimeEvent:
+    pod: ResourceID
+    node: ResourceID
+    state: PodState
+    time: float
+    error: Optional[str] = None
+
+
+@dataclasses.dataclass
+class RuntimeStats:
+    calls: int = 0
+    started: int = 0
+    stopped: int = 0
+    failures: int = 0
+    # events that did not fit in the queue of a slow watcher
+    dropped: int = 0
+
+
+class RuntimeDriver(ABC):
+
+    def __init__(self, pool_size: int = 4, batch_size: int = 256, watch_queue: int = 10000,
+                 clock: Callable[[], float] = time.time):
+        # operations are grouped per node, each call to a node carries up to `batch_size` pods
+        self._batch_size: int = batch_size
+        self._watch_queue: int = watch_queue
+        self._clock: Callable[[], float] = clock
+        self._pool: ConnectionPool[ResourceID, Any] = \
+            ConnectionPool(self._connect, self._disconnect, size=pool_size)
+        self._watchers: Set[asyncio.Queue] = set()
+        self._stats: RuntimeStats = RuntimeStats()
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return self._pool
+
+    @property
+    def stats(self) -> RuntimeStats:
+        return dataclasses.replace(self._stats)
+
+    async def list(self, nodes: Iterable[ResourceID]) -> List[PodInfo]:
+        async def list_node(node: ResourceID) -> List[PodInfo]:
+            async with self._pool.connection(node) as connection:
+                self._stats.calls += 1
+                return await self._list(connection, node)
+
+        listings = await asyncio.gather(*[list_node(node) for node in set(nodes)])
+        return [info for listing in listings for info in listing]
+
+    async def start(self, pod: PodHandle) -> OperationResult:
+        return (await self.start_many([pod]))[0]
+
+    async def stop(self, pod: PodHandle) -> OperationResult:
+        return (await self.stop_many([pod]))[0]
+
+    async def start_many(self, pods: Iterable[PodHandle]) -> List[OperationResult]:
+        results = await self._dispatch(list(pods), self._start)
+        ok = sum(1 for r in results if r.ok)
+        self._stats.started += ok
+        self._stats.failures += len(results) - ok
+        return results
+
+    async def stop_many(self, pods: Iterable[PodHandle]) -> List[OperationResult]:
+        results = await self._dispatch(list(pods), self._stop)
+        ok = sum(1 for r in results if r.ok)
+        self._stats.stopped += ok
+        self._stats.failures += len(results) - ok
+        return results
+
+    async def watch(self) -> AsyncIterator[RuntimeEvent]:
+        queue = asyncio.Queue(self._watch_queue)
+        self._watchers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._watchers.discard(queue)
+
+    async def close(self):
+        await self._pool.close()
+
+    def _emit(self, pod: ResourceID, node: ResourceID, state: PodState,
+              error: Optional[str] = None):
+        if not self._watchers:
+            return
+        event = RuntimeEvent(pod, node, state, self._clock(), error)
+        for queue in self._watchers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._stats.dropped += 1
+
+    async def _dispatch(self, pods: List[PodHandle],
+                        operation: Callable[[Any, ResourceID, List[PodHandle]],
+                                            Awaitable[List[Optional[str]]]]) \
+            -> List[OperationResult]:
+        # one batch per node (split at `batch_size`), all nodes in parallel
+        batches: Dict[ResourceID, List[int]] = {}
+        for i, pod in enumerate(pods):
+            batches.setdefault(pod.node, []).append(i)
+        results: List[Optional[OperationResult]] = [None] * len(pods)
+
+        async def run(node: ResourceID, indices: List[int]):
+            batch = [pods[i] for i in indices]
+            try:
+                async with self._pool.connection(node) as connection:
+                    self._stats.calls += 1
+                    errors = await operation(connection, node, batch)
+            except Exception as e:
+                logger.warning(f"Runtime call to node '{node}' failed: {e}")
+                errors = [str(e) or type(e).__name__] * len(batch)
+            for i, error in zip(indices, errors):
+                results[i] = OperationResult(pods[i], error is None, error)
+
+        await asyncio.gather(*[
+            run(node, indices[j:j + self._batch_size])
+            for node, indices in batches.items()
+            for j in range(0, len(indices), self._batch_size)
+        ])
+        return results
+
+    @abstractmethod
+    async def _connect(self, node: ResourceID) -> Any:
+        pass
+
+    @abstractmethod
+    async def _disconnect(self, connection: Any):
+        pass
+
+    @abstractmethod
+    async def _list(self, connection: Any, node: ResourceID) -> List[PodInfo]:
+        pass
+
+    @abstractmethod
+    async def _start(self, connection: Any, node: ResourceID,
+                     pods: List[PodHandle]) -> List[Optional[str]]:
+        # one error (or None) per pod, in order
+        pass
+
+    @abstractmethod
+    async def _stop(self, connection: Any, node: ResourceID,
+                    pods: List[PodHandle]) -> List[Optional[str]]:
+        pass
+
+
+__all__ = [
+    "PodState",
+    "PodHandle",
+    "PodInfo",
+    "OperationResult",
+    "RuntimeEvent",
+    "RuntimeStats",
+    "RuntimeDriver",
+]
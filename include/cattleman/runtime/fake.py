@@ -0,0 +1,115 @@
+import asyncio
+import random
+from typing import Dict, List, Optional, Set
+
+from cattleman.runtime.driver import RuntimeDriver, PodHandle, PodInfo, PodState
+from cattleman.types import ResourceID
+
+
+class FakeConnection:
+
+    def __init__(self, node: ResourceID):
+        self.node: ResourceID = node
+        self.closed: bool = False
+
+
+class FakeRuntime(RuntimeDriver):
+
+    def __init__(self, latency: float = 0.0, pod_latency: float = 0.0,
+                 connect_latency: float = 0.0, failure_rate: float = 0.0,
+                 call_failure_rate: float = 0.0, unreachable: Optional[Set[ResourceID]] = None,
+                 seed: Optional[int] = None, **kwargs):
+        super(FakeRuntime, self).__init__(**kwargs)
+        # every call costs `latency` plus `pod_latency` for each pod it carries
+        self._latency: float = latency
+        self._pod_latency: float = pod_latency
+        self._connect_latency: float = connect_latency
+        # probability of a single pod failing and of a whole call failing
+        self._failure_rate: float = failure_rate
+        self._call_failure_rate: float = call_failure_rate
+        self._unreachable: Set[ResourceID] = set(unreachable or ())
+        self._random: random.Random = random.Random(seed)
+        self._pods: Dict[ResourceID, Dict[ResourceID, PodInfo]] = {}
+        self.connections: int = 0
+
+    def pods(self, node: Optional[ResourceID] = None) -> List[PodInfo]:
+        nodes = [self._pods.get(node, {})] if node is not None else self._pods.values()
+        return [info for pods in nodes for info in pods.values()]
+
+    def crash(self, pod: ResourceID, error: str = "crashed"):
+        for node, pods in self._pods.items():
+            info = pods.get(pod, None)
+            if info is not None:
+                info.state, info.error = PodState.FAILED, error
+                self._emit(pod, node, PodState.FAILED, error)
+
+    def set_unreachable(self, node: ResourceID, unreachable: bool = True):
+        if unreachable:
+            self._unreachable.add(node)
+        else:
+            self._unreachable.discard(node)
+
+    async def _connect(self, node: ResourceID) -> FakeConnection:
+        if self._connect_latency > 0:
+            await asyncio.sleep(self._connect_latency)
+        if node in self._unreachable:
+            raise ConnectionRefusedError(f"Node '{node}' is unreachable")
+        self.connections += 1
+        return FakeConnection(node)
+
+    async def _disconnect(self, connection: FakeConnection):
+        connection.closed = True
+        self.connections -= 1
+
+    async def _call(self, node: ResourceID, pods: int):
+        delay = self._latency + self._pod_latency * pods
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if node in self._unreachable:
+            raise ConnectionResetError(f"Node '{node}' is unreachable")
+        if self._call_failure_rate and self._random.random() < self._call_failure_rate:
+            raise TimeoutError(f"Call to node '{node}' timed out")
+
+    async def _list(self, connection: FakeConnection, node: ResourceID) -> List[PodInfo]:
+        await self._call(node, 0)
+        return [PodInfo(i.pod, i.node, i.state, i.error) for i in self.pods(node)]
+
+    async def _start(self, connection: FakeConnection, node: ResourceID,
+                     pods: List[PodHandle]) -> List[Optional[str]]:
+        await self._call(node, len(pods))
+        running = self._pods.setdefault(node, {})
+        errors = []
+        for handle in pods:
+            info = running.get(handle.pod, None)
+            if info is not None and info.state is PodState.RUNNING:
+                errors.append(None)
+                continue
+            self._emit(handle.pod, node, PodState.STARTING)
+            if self._failure_rate and self._random.random() < self._failure_rate:
+                error = "failed to start"
+                running[handle.pod] = PodInfo(handle.pod, node, PodState.FAILED, error)
+                self._emit(handle.pod, node, PodState.FAILED, error)
+                errors.append(error)
+                continue
+            running[handle.pod] = PodInfo(handle.pod, node, PodState.RUNNING)
+            self._emit(handle.pod, node, PodState.RUNNING)
+            errors.append(None)
+        return errors
+
+    async def _stop(self, connection: FakeConnection, node: ResourceID,
+                    pods: List[PodHandle]) -> List[Optional[str]]:
+        await self._call(node, len(pods))
+        running = self._pods.get(node, {})
+        errors = []
+        for handle in pods:
+            # stopping a pod that is not there is not an error
+            if running.pop(handle.pod, None) is not None:
+                self._emit(handle.pod, node, PodState.STOPPED)
+            errors.append(None)
+        return errors
+
+
+__all__ = [
+    "FakeConnection",
+    "FakeRuntime",
+]
@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import dataclasses
+import logging
+from collections import deque
+from typing import Dict, Deque, Callable, Awaitable, Generic, TypeVar, Hashable, AsyncIterator
+
+logger = logging.getLogger("runtime")
+
+K = TypeVar("K", bound=Hashable)
+C = TypeVar("C")
+
+
+@dataclasses.dataclass
+class PoolStats:
+    created: int = 0
+    reused: int = 0
+    discarded: int = 0
+
+
+class ConnectionPool(Generic[K, C]):
+
+    def __init__(self, connect: Callable[[K], Awaitable[C]],
+                 disconnect: Callable[[C], Awaitable[None]], size: int = 4):
+        self._connect: Callable[[K], Awaitable[C]] = connect
+        self._disconnect: Callable[[C], Awaitable[None]] = disconnect
+        # maximum number of connections (in use or idle) per key
+        self._size: int = size
+        self._idle: Dict[K, Deque[C]] = {}
+        # semaphores are bound to the event loop they first wait on, one set per loop
+        self._slots: Dict[asyncio.AbstractEventLoop, Dict[K, asyncio.Semaphore]] = {}
+        self._stats: PoolStats = PoolStats()
+
+    @property
+    def stats(self) -> PoolStats:
+        return dataclasses.replace(self._stats)
+
+    def idle(self, key: K) -> int:
+        return len(self._idle.get(key, ()))
+
+    @contextlib.asynccontextmanager
+    async def connection(self, key: K) -> AsyncIterator[C]:
+        loop = asyncio.get_running_loop()
+        per_loop = self._slots.get(loop, None)
+        if per_loop is None:
+            # forget the loops that are gone
+            self._slots = {other: s for other, s in self._slots.items() if not other.is_closed()}
+            per_loop = self._slots[loop] = {}
+        slots = per_loop.get(key, None)
+        if slots is None:
+            slots = per_loop[key] = asyncio.Semaphore(self._size)
+        async with slots:
+            idle = self._idle.setdefault(key, deque())
+            if idle:
+                connection = idle.pop()
+                self._stats.reused += 1
+            else:
+                connection = await self._connect(key)
+                self._stats.created += 1
+            try:
+                yield connection
+            except BaseException:
+                # the state of a connection that saw an error is unknown, do not reuse it
+                self._stats.discarded += 1
+                await self._close(connection)
+                raise
+            idle.append(connection)
+
+    async def close(self):
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                await self._close(connection)
+
+    async def _close(self, connection: C):
+        try:
+            await self._disconnect(connection)
+        except Exception as e:
+            logger.debug(f"Error while closing connection: {e}")
+
+
+__all__ = [
+    "PoolStats",
+    "ConnectionPool",
+]
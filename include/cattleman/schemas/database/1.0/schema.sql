@@ -141,4 +141,221 @@ create table if not exists relations
 );
 
 create unique index if not exists relations_id_uindex
-    on relations (origin, relation, destination);
\ No newline at end of file
+    on relations (origin, relation, destination);
+
+create index if not exists relations_destination_index
+    on relations (destination);
+
+-- IP address pools
+
+create table if not exists ip_pools
+(
+    name TEXT not null
+        constraint ip_pools_pk
+            primary key,
+    type INTEGER not null,
+    network TEXT not null,
+    date TEXT not null,
+    state BLOB not null
+);
+
+
+-- Failing statuses (maintained on commit, read by 'cattle info')
+
+create table if not exists failures
+(
+    id TEXT not null,
+    key TEXT not null,
+    resource_type TEXT not null,
+    description TEXT,
+    date TEXT not null,
+    constraint failures_pk
+        primary key (id, key)
+);
+
+create index if not exists failures_date_index
+    on failures (date);
+
+
+-- Summary (maintained by triggers, read by 'cattle info')
+
+create table if not exists resource_counts
+(
+    name TEXT not null
+        constraint resource_counts_pk
+            primary key,
+    count INTEGER not null
+);
+
+-- databases created before the summary existed are counted once, when the table is created
+insert into resource_counts (name, count)
+select 'relations:' || relation, count(*)
+from (select 1 where not exists (select 1 from resource_counts where name = 'clusters')) as seed
+    cross join relations
+group by relation;
+
+insert into resource_counts (name, count)
+select 'clusters', (select count(*) from clusters)
+where not exists (select 1 from resource_counts where name = 'clusters');
+
+insert into resource_counts (name, count)
+select 'nodes', (select count(*) from nodes)
+where not exists (select 1 from resource_counts where name = 'nodes');
+
+insert into resource_counts (name, count)
+select 'applications', (select count(*) from applications)
+where not exists (select 1 from resource_counts where name = 'applications');
+
+insert into resource_counts (name, count)
+select 'services', (select count(*) from services)
+where not exists (select 1 from resource_counts where name = 'services');
+
+insert into resource_counts (name, count)
+select 'pods', (select count(*) from pods)
+where not exists (select 1 from resource_counts where name = 'pods');
+
+insert into resource_counts (name, count)
+select 'dns_records', (select count(*) from dns_records)
+where not exists (select 1 from resource_counts where name = 'dns_records');
+
+insert into resource_counts (name, count)
+select 'ip_addresses', (select count(*) from ip_addresses)
+where not exists (select 1 from resource_counts where name = 'ip_addresses');
+
+insert into resource_counts (name, count)
+select 'ports', (select count(*) from ports)
+where not exists (select 1 from resource_counts where name = 'ports');
+
+insert into resource_counts (name, count)
+select 'requests', (select count(*) from requests)
+where not exists (select 1 from resource_counts where name = 'requests');
+
+create trigger if not exists clusters_count_insert
+    after insert on clusters
+begin
+    update resource_counts set count = count + 1 where name = 'clusters';
+end;
+
+create trigger if not exists clusters_count_delete
+    after delete on clusters
+begin
+    update resource_counts set count = count - 1 where name = 'clusters';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists nodes_count_insert
+    after insert on nodes
+begin
+    update resource_counts set count = count + 1 where name = 'nodes';
+end;
+
+create trigger if not exists nodes_count_delete
+    after delete on nodes
+begin
+    update resource_counts set count = count - 1 where name = 'nodes';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists applications_count_insert
+    after insert on applications
+begin
+    update resource_counts set count = count + 1 where name = 'applications';
+end;
+
+create trigger if not exists applications_count_delete
+    after delete on applications
+begin
+    update resource_counts set count = count - 1 where name = 'applications';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists services_count_insert
+    after insert on services
+begin
+    update resource_counts set count = count + 1 where name = 'services';
+end;
+
+create trigger if not exists services_count_delete
+    after delete on services
+begin
+    update resource_counts set count = count - 1 where name = 'services';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists pods_count_insert
+    after insert on pods
+begin
+    update resource_counts set count = count + 1 where name = 'pods';
+end;
+
+create trigger if not exists pods_count_delete
+    after delete on pods
+begin
+    update resource_counts set count = count - 1 where name = 'pods';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists dns_records_count_insert
+    after insert on dns_records
+begin
+    update resource_counts set count = count + 1 where name = 'dns_records';
+end;
+
+create trigger if not exists dns_records_count_delete
+    after delete on dns_records
+begin
+    update resource_counts set count = count - 1 where name = 'dns_records';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists ip_addresses_count_insert
+    after insert on ip_addresses
+begin
+    update resource_counts set count = count + 1 where name = 'ip_addresses';
+end;
+
+create trigger if not exists ip_addresses_count_delete
+    after delete on ip_addresses
+begin
+    update resource_counts set count = count - 1 where name = 'ip_addresses';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists ports_count_insert
+    after insert on ports
+begin
+    update resource_counts set count = count + 1 where name = 'ports';
+end;
+
+create trigger if not exists ports_count_delete
+    after delete on ports
+begin
+    update resource_counts set count = count - 1 where name = 'ports';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists requests_count_insert
+    after insert on requests
+begin
+    update resource_counts set count = count + 1 where name = 'requests';
+end;
+
+create trigger if not exists requests_count_delete
+    after delete on requests
+begin
+    update resource_counts set count = count - 1 where name = 'requests';
+    delete from failures where id = old.id;
+end;
+
+create trigger if not exists relations_count_insert
+    after insert on relations
+begin
+    insert into resource_counts (name, count) values ('relations:' || new.relation, 1)
+    on conflict (name) do update set count = count + 1;
+end;
+
+create trigger if not exists relations_count_delete
+    after delete on relations
+begin
+    update resource_counts set count = count - 1 where name = 'relations:' || old.relation;
+end;
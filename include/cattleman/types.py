@@ -6,7 +6,8 @@ from abc import abstractmethod, ABC
 from datetime import datetime
 from enum import Enum, IntEnum
 from threading import Semaphore
-from typing import List, Dict, Any, Optional
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Iterable, Callable, Mapping
 
 import cbor2
 
@@ -39,7 +40,7 @@ class KnowledgeBase:
     def get(id: 'ResourceID'):
         id = id if isinstance(id, str) else str(id)
         try:
-            KnowledgeBase.__resources[id]
+            return KnowledgeBase.__resources[id]
         except KeyError:
             raise ResourceNotFoundException(id)
 
@@ -47,6 +48,19 @@ class KnowledgeBase:
     def set(id: 'ResourceID', resource: 'Resource'):
         KnowledgeBase.__resources[id] = resource
 
+    @staticmethod
+    def remove(id: 'ResourceID'):
+        KnowledgeBase.__resources.pop(id, None)
+
+    @staticmethod
+    def size() -> int:
+        return len(KnowledgeBase.__resources)
+
+    @staticmethod
+    def resources() -> Mapping[str, 'Resource']:
+        # read-only view, nothing is copied
+        return MappingProxyType(KnowledgeBase.__resources)
+
     @staticmethod
     def shutdown():
         for resource in KnowledgeBase.__resources.values():
@@ -57,6 +71,42 @@ class KnowledgeBase:
         KnowledgeBase.__resources.clear()
 
 
+EventListener = Callable[['PersistentResource', str], None]
+UpdateListener = Callable[['PersistentResource', str, Any, Any], None]
+
+
+class ResourceEvents:
+
+    __event_listeners: Dict['ResourceType', List[EventListener]] = {}
+    __update_listeners: Dict['ResourceType', List[UpdateListener]] = {}
+
+    @staticmethod
+    def on_event(type: 'ResourceType', listener: EventListener):
+        ResourceEvents.__event_listeners.setdefault(type, []).append(listener)
+
+    @staticmethod
+    def on_update(type: 'ResourceType', listener: UpdateListener):
+        ResourceEvents.__update_listeners.setdefault(type, []).append(listener)
+
+    @staticmethod
+    def remove(listener: Callable):
+        for listeners in [*ResourceEvents.__event_listeners.values(),
+                          *ResourceEvents.__update_listeners.values()]:
+            if listener in listeners:
+                listeners.remove(listener)
+
+    @staticmethod
+    def notify_event(resource: 'PersistentResource', event: str):
+        for listener in ResourceEvents.__event_listeners.get(resource.get_type(), []):
+            listener(resource, event)
+
+    @staticmethod
+    def notify_update(resource: 'PersistentResource', field: str, current: Any, new: Any):
+        # listeners are called before the new value is set and can veto it by raising
+        for listener in ResourceEvents.__update_listeners.get(resource.get_type(), []):
+            listener(resource, field, current, new)
+
+
 # Volatile objects
 
 
@@ -113,7 +163,8 @@ class ResourceID(str, Serializable):
     @staticmethod
     def make(type: ResourceType) -> 'ResourceID':
         assert_type(type, ResourceType)
-        s = str(uuid.uuid4())[:8]
+        # 64 bits, 32 (the first 8 digits of a UUID) collide after ~100k resources
+        s = uuid.uuid4().hex[:16]
         return ResourceID(f"{type.value}:{s}")
 
     def __conform__(self, protocol):
@@ -145,7 +196,7 @@ class ResourceStatus(Serializable):
 
     @classmethod
     def deserialize(cls, value: dict, metadata: Optional[Dict] = None) -> 'ResourceStatus':
-        return ResourceStatus(**value)
+        return ResourceStatus(**{**value, "value": Status(value["value"])})
 
     @staticmethod
     def created() -> 'ResourceStatus':
@@ -221,6 +272,8 @@ class PersistentResource(Resource, ABC):
 
     def __post_init__(self):
         self._lock = Semaphore()
+        # whether the failing statuses changed since the last commit
+        self._failures_changed: bool = False
 
     def shutdown(self):
         self._lock.acquire()
@@ -241,10 +294,71 @@ class PersistentResource(Resource, ABC):
                     f"VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET value = excluded.value;"
             # query = f"INSERT INTO {table}(id, date, enabled, value) VALUES (?, ?, ?, ?)"
             cursor.execute(query, self.id, now(), True, data)
+            PersistentResource._sync_failures(cursor, [self])
         # ---
         if lock:
             self._lock.release()
 
+    @staticmethod
+    def commit_many(resources: Iterable['PersistentResource']):
+        # group rows by table so that each table is written with a single statement
+        resources = list(resources)
+        rows: Dict[str, List[tuple]] = {}
+        date = now()
+        for resource in resources:
+            with resource._lock:
+                KnowledgeBase.set(resource.id, resource)
+                row = (resource.id, date, True, resource.serialize())
+                rows.setdefault(resource._sql_table(), []).append(row)
+        with Persistency.session("resources") as cursor:
+            for table, values in rows.items():
+                # TODO: this is only supported by SQLite 3.24+, ubuntu 18.04 runs SQLite 3.22
+                query = f"INSERT INTO {table}(id, date, enabled, value) VALUES (?, ?, ?, ?) " \
+                        f"ON CONFLICT (id) DO UPDATE SET value = excluded.value;"
+                cursor.executemany(query, values)
+            PersistentResource._sync_failures(cursor, resources)
+
+    @staticmethod
+    def delete_many(resources: Iterable['PersistentResource']):
+        # the resources go away together with every relation from or to them
+        resources = list(resources)
+        if not resources:
+            return
+        rows: Dict[str, List[tuple]] = {}
+        for resource in resources:
+            rows.setdefault(resource._sql_table(), []).append((resource.id,))
+        ids = [(resource.id,) for resource in resources]
+        with Persistency.session("resources") as cursor:
+            for table, values in rows.items():
+                cursor.executemany(f"DELETE FROM {table} WHERE id=?;", values)
+            cursor.executemany("DELETE FROM relations WHERE origin=?;", ids)
+            cursor.executemany("DELETE FROM relations WHERE destination=?;", ids)
+        for resource in resources:
+            KnowledgeBase.remove(resource.id)
+            resource._log_event("deleted")
+
+    @staticmethod
+    def failure_rows(resources: Iterable['PersistentResource']) -> Iterable[tuple]:
+        # rows of the 'failures' table, one per failing status
+        for resource in resources:
+            for status in resource.status:
+                if status.value is Status.FAILURE:
+                    yield resource.id, status.key, resource.get_type(), status.description, \
+                        status.date
+
+    @staticmethod
+    def _sync_failures(cursor, resources: Iterable['PersistentResource']):
+        # the 'failures' table mirrors the failing statuses, it lets 'cattle info' report them
+        # without decoding every resource; only resources whose failures changed are rewritten
+        changed = [resource for resource in resources if resource._failures_changed]
+        if not changed:
+            return
+        cursor.executemany("DELETE FROM failures WHERE id=?;", [(r.id,) for r in changed])
+        cursor.executemany("INSERT INTO failures(id, key, resource_type, description, date) "
+                           "VALUES (?, ?, ?, ?, ?);", PersistentResource.failure_rows(changed))
+        for resource in changed:
+            resource._failures_changed = False
+
     @staticmethod
     def _serialize_value(value):
         # unpack enums
@@ -270,20 +384,40 @@ class PersistentResource(Resource, ABC):
                 continue
             field_value = getattr(self, field.name)
             data[field.name] = self._serialize_value(field_value)
-        print(cbor2.dumps(data))
         return cbor2.dumps(data)
 
     @abstractmethod
     def _sql_table(self) -> str:
         pass
 
+    def get_status(self, key: str) -> Optional[ResourceStatus]:
+        for status in self.status:
+            if status.key == key:
+                return status
+        return None
+
+    def update_status(self, key: str, value: Status, description: Optional[str] = None) -> bool:
+        # the resource is not committed, returns whether the status actually changed
+        current = self.get_status(key)
+        if current is not None and current.value is value and current.description == description:
+            return False
+        new = ResourceStatus(key=key, value=value, description=description)
+        if value is Status.FAILURE or (current is not None and current.value is Status.FAILURE):
+            self._failures_changed = True
+        self._log_update("status", current, new)
+        if current is None:
+            self.status.append(new)
+        else:
+            self.status[self.status.index(current)] = new
+        return True
+
     def _log_event(self, event: str):
-        # TODO: implement this
-        pass
+        # TODO: persist events
+        ResourceEvents.notify_event(self, event)
 
     def _log_update(self, field: str, current: Any, new: Any, reason: Optional[str] = None):
-        # TODO: implement this
-        pass
+        # TODO: persist updates
+        ResourceEvents.notify_update(self, field, current, new)
 
 
 # Persistent resources
@@ -305,12 +439,14 @@ class IIPAddress(PersistentResource, ABC):
     @type.setter
     def type(self, value: IPAddressType):
         assert_type(value, IPAddressType)
+        self._log_update("type", self._type, value)
         self._type = value
         self.commit()
 
     @value.setter
     def value(self, value: str):
         assert_type(value, str)
+        self._log_update("value", self._value, value)
         self._value = value
         self.commit()
 
@@ -342,18 +478,21 @@ class IPort(PersistentResource, ABC):
     @internal.setter
     def internal(self, value: int):
         assert_type(value, int)
+        self._log_update("internal", self._internal, value)
         self._internal = value
         self.commit()
 
     @external.setter
     def external(self, value: int):
         assert_type(value, int)
+        self._log_update("external", self._external, value)
         self._external = value
         self.commit()
 
     @protocol.setter
     def protocol(self, value: TransportProtocol):
         assert_type(value, TransportProtocol)
+        self._log_update("protocol", self._protocol, value)
         self._protocol = value
         self.commit()
 
@@ -385,18 +524,21 @@ class IDNSRecord(PersistentResource, ABC):
     @type.setter
     def type(self, value: DNSRecordType):
         assert_type(value, DNSRecordType)
+        self._log_update("type", self._type, value)
         self._type = value
         self.commit()
 
     @value.setter
     def value(self, value: str):
         assert_type(value, str)
+        self._log_update("value", self._value, value)
         self._value = value
         self.commit()
 
     @ttl.setter
     def ttl(self, value: int):
         assert_type(value, int)
+        self._log_update("ttl", self._ttl, value)
         self._ttl = value
         self.commit()
 
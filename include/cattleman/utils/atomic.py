@@ -1,5 +1,6 @@
 import signal
 import logging
+import threading
 
 
 class AtomicSession:
@@ -9,13 +10,18 @@ class AtomicSession:
 
     def __enter__(self):
         self.signal_received = None
-        self.old_handler = signal.signal(signal.SIGINT, self.handler)
+        self.old_handler = None
+        # signal handlers can only be installed from (and are only delivered to) the main thread
+        if threading.current_thread() is threading.main_thread():
+            self.old_handler = signal.signal(signal.SIGINT, self.handler)
 
     def handler(self, sig, frame):
         self.signal_received = (sig, frame)
         logging.debug('SIGINT received. Delaying KeyboardInterrupt.')
 
     def __exit__(self, *_, **__):
+        if self.old_handler is None:
+            return
         signal.signal(signal.SIGINT, self.old_handler)
         if self.signal_received:
             self.old_handler(*self.signal_received)
@@ -0,0 +1,181 @@
+import dataclasses
+import gc
+import heapq
+import sys
+import tracemalloc
+from collections import deque
+from enum import Enum
+from types import ModuleType, FunctionType, BuiltinFunctionType, MethodType, CodeType
+from typing import Dict, Any, List, Optional, Set, Tuple, Mapping
+
+from cattleman.types import KnowledgeBase
+
+# shared by everybody, they do not belong to any single object
+_SHARED = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, CodeType, Enum,
+           bool, type(None))
+
+
+# how to walk instances of a given type: (shared, container, slots), computed once per type
+_WALKS: Dict[type, Tuple[bool, int, Tuple[str, ...]]] = {}
+_ATOMIC, _DICT, _SEQUENCE, _OBJECT = range(4)
+
+
+def _walk(klass: type) -> Tuple[bool, int, Tuple[str, ...]]:
+    walk = _WALKS.get(klass)
+    if walk is None:
+        if issubclass(klass, dict):
+            container = _DICT
+        elif issubclass(klass, (list, tuple, set, frozenset, deque)):
+            container = _SEQUENCE
+        elif issubclass(klass, (str, bytes, int, float)):
+            container = _ATOMIC
+        else:
+            container = _OBJECT
+        slots = tuple(slot for k in klass.__mro__ for slot in getattr(k, "__slots__", ())
+                      if slot != "__dict__")
+        walk = _WALKS[klass] = (issubclass(klass, _SHARED), container, slots)
+    return walk
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    # bytes held by `obj` and everything it references, objects already in `seen` (i.e.,
+    # accounted for elsewhere) are skipped
+    seen = seen if seen is not None else set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        shared, container, slots = _walk(type(o))
+        if shared or id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if container == _ATOMIC:
+            continue
+        if container == _DICT:
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif container == _SEQUENCE:
+            stack.extend(o)
+        attributes = getattr(o, "__dict__", None)
+        if attributes is not None:
+            stack.append(attributes)
+        for slot in slots:
+            if hasattr(o, slot):
+                stack.append(getattr(o, slot))
+    return total
+
+
+@dataclasses.dataclass
+class TypeUsage:
+    count: int = 0
+    bytes: int = 0
+    # part of `bytes` held by the status lists
+    status: int = 0
+
+    @property
+    def mean(self) -> float:
+        return self.bytes / self.count if self.count else 0.0
+
+
+@dataclasses.dataclass
+class MemoryReport:
+    # everything allocated (and still alive) while tracemalloc was tracing
+    traced: int
+    traced_peak: int
+    # the KnowledgeBase itself (the dictionary and its keys)
+    index: int
+    types: Dict[str, TypeUsage]
+    caches: Dict[str, int]
+    # (bytes, id, type) of the largest resources
+    largest: List[Tuple[int, str, str]]
+    # (bytes, allocations, "file:line") of the largest allocation sites
+    sites: List[Tuple[int, int, str]]
+
+    @property
+    def resources(self) -> int:
+        return sum(usage.bytes for usage in self.types.values())
+
+    @property
+    def status(self) -> int:
+        return sum(usage.status for usage in self.types.values())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "traced": self.traced,
+            "traced_peak": self.traced_peak,
+            "knowledge_base": {
+                "index": self.index,
+                "resources": self.resources,
+                "status": self.status,
+                "types": {t: dataclasses.asdict(u) for t, u in sorted(self.types.items())},
+            },
+            "caches": self.caches,
+            "largest": [{"id": id, "type": type, "bytes": size}
+                        for size, id, type in self.largest],
+            "sites": [{"site": site, "bytes": size, "allocations": count}
+                      for size, count, site in self.sites],
+        }
+
+
+class MemoryAccountant:
+
+    def __init__(self, top: int = 10):
+        self._top: int = top
+        self._started: bool = False
+
+    def start(self):
+        # everything allocated from here on is traced, e.g., call before loading resources
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    def report(self, caches: Optional[Mapping[str, Any]] = None) -> MemoryReport:
+        seen: Set[int] = set()
+        resources = KnowledgeBase.resources()
+        # the index first (the dictionary behind the read-only view), the keys are the IDs of the
+        # resources
+        index = sum(sys.getsizeof(d) for d in gc.get_referents(resources)) + \
+            sum(deep_sizeof(k, seen) for k in resources)
+        types: Dict[str, TypeUsage] = {}
+        largest: List[Tuple[int, str, str]] = []
+        for id, resource in resources.items():
+            type = resource.get_type().value
+            usage = types.setdefault(type, TypeUsage())
+            status = deep_sizeof(getattr(resource, "status", None), seen)
+            size = status + deep_sizeof(resource, seen)
+            usage.count += 1
+            usage.bytes += size
+            usage.status += status
+            if len(largest) < self._top:
+                heapq.heappush(largest, (size, id, type))
+            elif size > largest[0][0]:
+                heapq.heapreplace(largest, (size, id, type))
+        # caches are accounted for last, what they share with the resources is not counted twice
+        caches = {name: deep_sizeof(cache, seen) for name, cache in (caches or {}).items()}
+        traced = peak = 0
+        sites: List[Tuple[int, int, str]] = []
+        if tracemalloc.is_tracing():
+            traced, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for stat in snapshot.statistics("lineno")[:self._top]:
+                frame = stat.traceback[0]
+                sites.append((stat.size, stat.count, f"{frame.filename}:{frame.lineno}"))
+        return MemoryReport(traced, peak, index, types, caches,
+                            sorted(largest, reverse=True), sites)
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+
+__all__ = [
+    "deep_sizeof",
+    "TypeUsage",
+    "MemoryReport",
+    "MemoryAccountant",
+]
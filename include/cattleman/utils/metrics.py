@@ -0,0 +1,266 @@
+import http.server
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Callable, Tuple, Union
+
+logger = logging.getLogger("metrics")
+
+# bounds (in seconds) of the buckets exported to Prometheus
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# metrics are updated without locks: each one is expected to be written by a single thread
+# (e.g., the orchestrator loop), readers (e.g., the exporter) get a snapshot that can be one
+# update behind
+
+
+class Metric:
+
+    TYPE = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name: str = name
+        self.help: str = help
+
+    def expose(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+
+
+class Counter(Metric):
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str):
+        super(Counter, self).__init__(name, help)
+        self.value: float = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def expose(self) -> List[str]:
+        return super(Counter, self).expose() + [f"{self.name} {_number(self.value)}"]
+
+
+class Gauge(Metric):
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        super(Gauge, self).__init__(name, help)
+        # gauges with a function are sampled when they are read
+        self._function: Optional[Callable[[], float]] = function
+        self._value: float = 0
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1):
+        self._value += amount
+
+    def expose(self) -> List[str]:
+        return super(Gauge, self).expose() + [f"{self.name} {_number(self.value)}"]
+
+
+class Histogram(Metric):
+    # HDR-style: buckets are exponential, each one split in `2^k` linear sub-buckets, so that the
+    # relative error is bounded (by 10^-digits) across the whole range at a fixed memory cost
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, lowest: float = 1e-6, highest: float = 3600.0,
+                 digits: int = 2, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help)
+        self._lowest: float = lowest
+        self._highest: float = highest
+        self._sub_bits: int = int(math.ceil(math.log2(2 * 10 ** digits)))
+        self._half: int = 1 << (self._sub_bits - 1)
+        self._limit: int = int(highest / lowest)
+        self._counts: List[int] = [0] * (self._index(self._limit) + 1)
+        self._buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def _index(self, units: int) -> int:
+        shift = units.bit_length() - self._sub_bits
+        if shift <= 0:
+            return units
+        return (shift + 1) * self._half + (units >> shift) - self._half
+
+    def _upper(self, index: int) -> float:
+        # highest value that falls in the bucket at `index`
+        if index < 2 * self._half:
+            return (index + 1) * self._lowest
+        shift = index // self._half - 1
+        return (((index - shift * self._half) + 1) << shift) * self._lowest
+
+    def observe(self, value: float):
+        units = min(int(value / self._lowest), self._limit) if value > 0 else 0
+        self._counts[self._index(units)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q / 100.0 * self.count))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        # (bound, observations <= bound) for the exported buckets, a bound that falls inside a
+        # bucket is rounded down to the start of that bucket
+        counts = list(self._counts)
+        out, seen, index = [], 0, 0
+        for bound in self._buckets:
+            while index < len(counts) and self._upper(index) <= bound + 1e-12:
+                seen += counts[index]
+                index += 1
+            out.append((bound, seen))
+        return out
+
+    def expose(self) -> List[str]:
+        count = self.count
+        lines = super(Histogram, self).expose()
+        for bound, seen in self.cumulative():
+            lines.append(f'{self.name}_bucket{{le="{_number(bound)}"}} {min(seen, count)}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {_number(self.sum)}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self, prefix: str = "cattleman_"):
+        self._prefix: str = prefix
+        self._metrics: Dict[str, Metric] = {}
+        # only registration is locked, updates are not
+        self._lock: threading.Lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Metric:
+        return self._metrics[f"{self._prefix}{name}"]
+
+    def __contains__(self, name: str) -> bool:
+        return f"{self._prefix}{name}" in self._metrics
+
+    def __len__(self) -> int:
+        return len(self._metrics)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter, name, help)
+
+    def gauge(self, name: str, help: str,
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge, name, help, function=function)
+
+    def histogram(self, name: str, help: str, **kwargs) -> Histogram:
+        return self._register(Histogram, name, help, **kwargs)
+
+    def _register(self, klass, name: str, help: str, **kwargs):
+        name = f"{self._prefix}{name}"
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = klass(name, help, **kwargs)
+            elif type(metric) is not klass:
+                raise ValueError(f"Metric '{name}' is already registered as a "
+                                 f"{metric.TYPE}, not a {klass.TYPE}.")
+            return metric
+
+    def expose(self) -> str:
+        # Prometheus text exposition format (version 0.0.4)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter:
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: MetricsRegistry):
+        self._registry: MetricsRegistry = registry
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Optional[Tuple[str, int]]:
+        return self._server.server_address[:2] if self._server is not None else None
+
+    def write(self, path: str):
+        # written next to the target and moved in place, scrapers never see half a file
+        tmp = f"{path}.tmp"
+        with open(tmp, "wt") as fout:
+            fout.write(self._registry.expose())
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        registry = self._registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PrometheusExporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics",
+                                        daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{host}:{self.address[1]}/metrics")
+
+    def close(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread = None
+
+
+def _number(value: Union[int, float]) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "Metric",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "PrometheusExporter",
+]
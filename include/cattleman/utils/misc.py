@@ -1,18 +1,18 @@
+import math
 import subprocess
 from datetime import datetime
 from inspect import isclass
-from typing import Union, Any, Type, Iterable, Optional
+from typing import Union, Any, Type, Iterable, Optional, List
 
 import typing
-from dateutil import tz
 
-from cattleman.constants import UNDEFINED
+from cattleman.constants import UNDEFINED, CANONICAL_ARCH
 from cattleman.exceptions import TypeMismatchException
-from cpk.constants import CANONICAL_ARCH
 
 
 def now() -> datetime:
-    return datetime.now(tz=tz.tzlocal())
+    # aware, in the local timezone
+    return datetime.now().astimezone()
 
 
 def is_undefined(value: Any) -> bool:
@@ -69,6 +69,13 @@ def human_time(time_secs: Union[int, float], compact: bool = False):
     return ", ".join(parts)
 
 
+def percentile(values: List[float], q: float) -> float:
+    # nearest-rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(q / 100.0 * len(values)))) - 1]
+
+
 def ask_confirmation(logger, message, default="y", question="Do you confirm?", choices=None):
     binary_question = False
     if choices is None:
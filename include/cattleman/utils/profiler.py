@@ -0,0 +1,134 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger("profiler")
+
+
+class SamplingProfiler:
+    # samples the stacks of all the threads from a background thread, nothing is traced so the
+    # profiled code runs at full speed (bar the GIL taken by the sampler a few hundred times
+    # per second); the output is in the "collapsed" format of flamegraph.pl, speedscope, etc.
+
+    def __init__(self, output: str, interval: float = 0.01, flush_interval: float = 10.0):
+        self._output: str = output
+        self._interval: float = interval
+        self._flush_interval: float = flush_interval
+        self._stacks: Counter = Counter()
+        # code object -> frame label, labels are built once per function
+        self._labels: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop: threading.Event = threading.Event()
+        self._lock: threading.Lock = threading.Lock()
+        self.samples: int = 0
+
+    @property
+    def output(self) -> str:
+        return self._output
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            if not self._stop.is_set():
+                return
+            # still on its way out
+            self._thread.join()
+        # every session starts from scratch, the output file is rewritten with its samples only
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Profiling, samples go to '{self._output}'")
+
+    def stop(self, wait: bool = True):
+        # the sampler writes the output one last time on its way out
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        if wait and thread is not threading.current_thread():
+            thread.join()
+
+    def toggle(self):
+        if self.running and not self._stop.is_set():
+            # called from signal handlers, do not wait for the sampler
+            self.stop(wait=False)
+        else:
+            self.start()
+
+    def stacks(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stacks)
+
+    def write(self):
+        with self._lock:
+            lines = [f"{stack} {count}\n" for stack, count in self._stacks.most_common()]
+        directory = os.path.dirname(os.path.abspath(self._output))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self._output}.tmp"
+        with open(tmp, "wt") as fout:
+            fout.writelines(lines)
+        os.replace(tmp, self._output)
+
+    def _run(self):
+        me = threading.get_ident()
+        flush = time.monotonic() + self._flush_interval
+        try:
+            while not self._stop.wait(self._interval):
+                self._sample(me)
+                if time.monotonic() >= flush:
+                    self.write()
+                    flush = time.monotonic() + self._flush_interval
+        finally:
+            self.write()
+            logger.info(f"Profiler stopped, {self.samples} samples written to '{self._output}'")
+
+    def _sample(self, me: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            stacks.append(f"{names.get(ident, ident)};{self._collapse(frame)}")
+        del frames
+        with self._lock:
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def _collapse(self, frame: Optional[FrameType]) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = \
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+def install_toggle(profiler: SamplingProfiler, signum: Optional[int] = None) -> Any:
+    # e.g., `kill -USR1 <pid>` starts (or stops) profiling a running manager
+    def handler(_, __):
+        profiler.toggle()
+
+    return signal.signal(signum if signum is not None else signal.SIGUSR1, handler)
+
+
+__all__ = [
+    "SamplingProfiler",
+    "install_toggle",
+]
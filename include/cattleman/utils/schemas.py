@@ -1,9 +1,37 @@
 import os
 import json
+import re
+from threading import Lock
+from typing import Dict, Tuple, Callable, Any, Optional, List, Iterable, Set
 
-import cpk
+from cattleman.exceptions import SchemaValidationException
 
-_SCHEMAS_DIR = os.path.join(os.path.dirname(cpk.__file__), 'schemas')
+_SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                            "schemas", "json")
+
+# a compiled validator returns None if the instance is valid, an error message otherwise
+Validator = Callable[[Any], Optional[str]]
+
+_JSON_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool)) or
+                         (isinstance(v, float) and v.is_integer()),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+# keywords that do not affect validation
+_ANNOTATIONS = {"$schema", "$id", "$comment", "title", "description", "default", "examples"}
+
+# keywords the compiler knows about, schemas using anything else are handed to `jsonschema`
+_COMPILABLE = _ANNOTATIONS | {
+    "type", "enum", "const", "pattern", "minLength", "maxLength", "minimum", "maximum",
+    "exclusiveMinimum", "exclusiveMaximum", "properties", "required", "additionalProperties",
+    "items", "minItems", "maxItems"
+}
 
 
 def _get_schema(schema_fpath: str) -> dict:
@@ -13,11 +41,251 @@ def _get_schema(schema_fpath: str) -> dict:
         return json.load(fin)
 
 
+class SchemaRegistry:
+
+    __raw: Dict[Tuple[str, str], dict] = {}
+    __resolved: Dict[Tuple[str, str], dict] = {}
+    __validators: Dict[Tuple[str, str], Validator] = {}
+    __versions: Set[str] = set()
+    __lock: Lock = Lock()
+
+    @staticmethod
+    def load_schema(name: str, version: str) -> dict:
+        key = SchemaRegistry._key(name, version)
+        SchemaRegistry._load_version(key[1])
+        try:
+            return SchemaRegistry.__raw[key]
+        except KeyError:
+            raise FileNotFoundError(os.path.join(_SCHEMAS_DIR, key[1], f"{name}.json"))
+
+    @staticmethod
+    def resolved(name: str, version: str) -> dict:
+        key = SchemaRegistry._key(name, version)
+        schema = SchemaRegistry.__resolved.get(key, None)
+        if schema is None:
+            schema = SchemaRegistry._resolve(SchemaRegistry.load_schema(*key), key, [(key, "")])
+            SchemaRegistry.__resolved[key] = schema
+        return schema
+
+    @staticmethod
+    def validator(name: str, version: str) -> Validator:
+        key = SchemaRegistry._key(name, version)
+        validator = SchemaRegistry.__validators.get(key, None)
+        if validator is None:
+            validator = _compile(SchemaRegistry.resolved(*key))
+            SchemaRegistry.__validators[key] = validator
+        return validator
+
+    @staticmethod
+    def validate(name: str, version: str, instance: Any):
+        error = SchemaRegistry.validator(name, version)(instance)
+        if error is not None:
+            raise SchemaValidationException(name, version, error)
+
+    @staticmethod
+    def validate_many(name: str, version: str, instances: Iterable[Any]) \
+            -> List[Optional[str]]:
+        validator = SchemaRegistry.validator(name, version)
+        return [validator(instance) for instance in instances]
+
+    @staticmethod
+    def _key(name: str, version: str) -> Tuple[str, str]:
+        return name, version.lstrip('v')
+
+    @staticmethod
+    def _load_version(version: str):
+        if version in SchemaRegistry.__versions:
+            return
+        with SchemaRegistry.__lock:
+            if version in SchemaRegistry.__versions:
+                return
+            version_dir = os.path.join(_SCHEMAS_DIR, version)
+            if os.path.isdir(version_dir):
+                for fname in sorted(os.listdir(version_dir)):
+                    name, ext = os.path.splitext(fname)
+                    if ext != ".json":
+                        continue
+                    schema = _get_schema(os.path.join(version_dir, fname))
+                    SchemaRegistry.__raw[(name, version)] = schema
+            SchemaRegistry.__versions.add(version)
+
+    @staticmethod
+    def _resolve(node: Any, key: Tuple[str, str],
+                 stack: List[Tuple[Tuple[str, str], str]]) -> Any:
+        # the stack holds the (document, pointer) targets being inlined
+        if isinstance(node, list):
+            return [SchemaRegistry._resolve(v, key, stack) for v in node]
+        if not isinstance(node, dict):
+            return node
+        ref = node.get("$ref", None)
+        if not isinstance(ref, str):
+            return {k: SchemaRegistry._resolve(v, key, stack) for k, v in node.items()}
+        # references look like `file.json`, `file.json#/pointer` or `#/pointer`
+        document, _, pointer = ref.partition("#")
+        target_key = (os.path.splitext(document)[0], key[1]) if document else key
+        tokens = [t.replace("~1", "/").replace("~0", "~") for t in pointer.split("/") if t]
+        # recursive schemas cannot be inlined
+        target_id = (target_key, "/".join(tokens))
+        if target_id in stack:
+            chain = " -> ".join(f"{n}.json#/{p}" if p else f"{n}.json"
+                                for (n, _), p in stack + [target_id])
+            raise SchemaValidationException(key[0], key[1], f"circular $ref: {chain}")
+        target = SchemaRegistry.load_schema(*target_key)
+        for token in tokens:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        resolved = SchemaRegistry._resolve(target, target_key, stack + [target_id])
+        # keywords next to a $ref are ignored by draft-07
+        return resolved
+
+
+def _compile(schema: Any) -> Validator:
+    if schema is True or schema == {}:
+        return lambda _: None
+    if schema is False:
+        return lambda _: "no value is allowed here"
+    if not set(schema.keys()).issubset(_COMPILABLE):
+        return _fallback(schema)
+    checks: List[Validator] = []
+    # type
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        type_checks = [_JSON_TYPES[t] for t in types]
+        expected = "|".join(types)
+
+        def check_type(v: Any) -> Optional[str]:
+            for type_check in type_checks:
+                if type_check(v):
+                    return None
+            return f"expected type '{expected}', got '{type(v).__name__}'"
+
+        checks.append(check_type)
+    # enum / const
+    if "enum" in schema:
+        choices = schema["enum"]
+        checks.append(lambda v: None if v in choices else f"{v!r} is not one of {choices}")
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda v: None if v == const else f"{v!r} is not {const!r}")
+    # strings
+    if "pattern" in schema:
+        regex = re.compile(schema["pattern"])
+        checks.append(lambda v: None if not isinstance(v, str) or regex.search(v) else
+                      f"{v!r} does not match '{regex.pattern}'")
+    if "minLength" in schema or "maxLength" in schema:
+        lo, hi = schema.get("minLength", 0), schema.get("maxLength", float("inf"))
+        checks.append(lambda v: None if not isinstance(v, str) or lo <= len(v) <= hi else
+                      f"length of {v!r} is not in [{lo}, {hi}]")
+    # numbers
+    bounds = [(k, schema[k]) for k in
+              ("minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum") if k in schema]
+    if bounds:
+        _compare = {
+            "minimum": lambda v, b: v >= b,
+            "maximum": lambda v, b: v <= b,
+            "exclusiveMinimum": lambda v, b: v > b,
+            "exclusiveMaximum": lambda v, b: v < b,
+        }
+        bounds = [(k, b, _compare[k]) for k, b in bounds]
+
+        def check_bounds(v: Any) -> Optional[str]:
+            if not _JSON_TYPES["number"](v):
+                return None
+            for keyword, bound, compare in bounds:
+                if not compare(v, bound):
+                    return f"{v!r} violates {keyword}={bound}"
+            return None
+
+        checks.append(check_bounds)
+    # objects
+    if {"properties", "required", "additionalProperties"} & set(schema.keys()):
+        checks.append(_compile_object(schema))
+    # arrays
+    if {"items", "minItems", "maxItems"} & set(schema.keys()):
+        checks.append(_compile_array(schema))
+    # ---
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(v: Any) -> Optional[str]:
+        for check in checks:
+            error = check(v)
+            if error is not None:
+                return error
+        return None
+
+    return check_all
+
+
+def _compile_object(schema: dict) -> Validator:
+    properties = {k: _compile(s) for k, s in schema.get("properties", {}).items()}
+    required = list(schema.get("required", []))
+    additional = schema.get("additionalProperties", True)
+    additional = None if additional is True else _compile(additional)
+
+    def check_object(v: Any) -> Optional[str]:
+        if not isinstance(v, dict):
+            return None
+        for k in required:
+            if k not in v:
+                return f"missing required property '{k}'"
+        for k, value in v.items():
+            check = properties.get(k, additional)
+            if check is None:
+                continue
+            error = check(value)
+            if error is not None:
+                return f"/{k}: {error}" if not error.startswith("/") else f"/{k}{error}"
+        return None
+
+    return check_object
+
+
+def _compile_array(schema: dict) -> Validator:
+    items = schema.get("items", True)
+    # a list of schemas validates items by position (draft-07 allows any additional ones)
+    positional = [_compile(s) for s in items] if isinstance(items, list) else []
+    items = None if items is True or isinstance(items, list) else _compile(items)
+    lo, hi = schema.get("minItems", 0), schema.get("maxItems", float("inf"))
+
+    def check_array(v: Any) -> Optional[str]:
+        if not isinstance(v, list):
+            return None
+        if not lo <= len(v) <= hi:
+            return f"number of items ({len(v)}) is not in [{lo}, {hi}]"
+        for i, value in enumerate(v):
+            if i < len(positional):
+                check = positional[i]
+            elif items is not None:
+                check = items
+            else:
+                break
+            error = check(value)
+            if error is not None:
+                return f"/{i}: {error}" if not error.startswith("/") else f"/{i}{error}"
+        return None
+
+    return check_array
+
+
+def _fallback(schema: dict) -> Validator:
+    import jsonschema
+    validator = jsonschema.validators.validator_for(schema)(schema)
+
+    def check(v: Any) -> Optional[str]:
+        error = jsonschema.exceptions.best_match(validator.iter_errors(v))
+        if error is None:
+            return None
+        path = "".join(f"/{p}" for p in error.absolute_path)
+        return f"{path}: {error.message}" if path else error.message
+
+    return check
+
+
 def load_schema(name: str, version: str) -> dict:
-    schema_fpath = os.path.join(_SCHEMAS_DIR, name, f"v{version.lstrip('v')}.json")
-    return _get_schema(schema_fpath)
+    return SchemaRegistry.load_schema(name, version)
 
 
 __all__ = [
+    "SchemaRegistry",
     "load_schema"
 ]
@@ -1,9 +1,14 @@
+import functools
+import re
 import sqlite3
 from typing import Iterable
 
-import semantic_version
+UPSERT_SUPPORTED_SINCE = (3, 24, 0)
 
-UPSERT_SUPPORTED_SINCE = semantic_version.Version("3.24.0")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
 
 
 def upsert_query(table: str, columns: Iterable[str], conflict: Iterable[str], update: str) -> str:
@@ -11,8 +16,7 @@ def upsert_query(table: str, columns: Iterable[str], conflict: Iterable[str], up
     columns = ", ".join(columns)
     conflict = ", ".join(conflict or [])
     # ---
-    sqlite_version = semantic_version.Version(sqlite3.sqlite_version)
-    if sqlite_version >= UPSERT_SUPPORTED_SINCE:
+    if sqlite3.sqlite_version_info >= UPSERT_SUPPORTED_SINCE:
         query = f"INSERT INTO {table}({columns}) VALUES ({placeholders}) " \
                 f"ON CONFLICT ({conflict}) " \
                 f"DO UPDATE SET {update} = excluded.{update};"
@@ -21,3 +25,13 @@ def upsert_query(table: str, columns: Iterable[str], conflict: Iterable[str], up
         # query = f"INSERT INTO relations({RELATIONS_ROW_K}) VALUES ({RELATIONS_ROW_V})"
         query = None
     return query
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_query(sql: str) -> str:
+    # statements that only differ in their literals (or in the length of a list of
+    # placeholders) are the same statement
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(?, ...)", sql)
+    return _SPACES.sub(" ", sql).strip()
@@ -0,0 +1,153 @@
+import logging
+import math
+import time
+from typing import Callable, Any, List, Optional, Dict
+
+logger = logging.getLogger("timers")
+
+TimerCallback = Callable[[List[Any]], None]
+# timers of a slot, insertion-ordered so that same-tick timers fire in the order they were set
+Bucket = Dict['Timer', None]
+
+
+class VirtualClock:
+
+    def __init__(self, start: float = 0.0):
+        self.time: float = start
+
+    def __call__(self) -> float:
+        return self.time
+
+    def advance(self, seconds: float) -> float:
+        self.time += seconds
+        return self.time
+
+
+class Timer:
+
+    __slots__ = ("deadline", "callback", "payload", "_bucket")
+
+    def __init__(self, deadline: int, callback: TimerCallback, payload: Any):
+        # deadline in ticks
+        self.deadline: int = deadline
+        self.callback: TimerCallback = callback
+        self.payload: Any = payload
+        self._bucket: Optional[Bucket] = None
+
+    @property
+    def active(self) -> bool:
+        return self._bucket is not None
+
+    def cancel(self) -> bool:
+        if self._bucket is None:
+            return False
+        self._bucket.pop(self, None)
+        self._bucket = None
+        return True
+
+
+class TimingWheel:
+
+    def __init__(self, tick: float = 0.01, clock: Callable[[], float] = time.monotonic,
+                 bits: int = 8, levels: int = 4):
+        self._tick: float = tick
+        self._clock: Callable[[], float] = clock
+        self._origin: float = clock()
+        self._bits: int = bits
+        self._mask: int = (1 << bits) - 1
+        self._levels: int = levels
+        # farthest deadline that fits in the wheel, later timers wait in the top level
+        self._span: int = (1 << (bits * levels)) - 1
+        self._wheels: List[List[Bucket]] = [
+            [{} for _ in range(1 << bits)] for _ in range(levels)
+        ]
+        # next tick to process
+        self._current: int = 0
+
+    def __len__(self) -> int:
+        # cancelled timers are removed from their bucket right away
+        return sum(len(bucket) for wheel in self._wheels for bucket in wheel)
+
+    @property
+    def tick(self) -> float:
+        return self._tick
+
+    @property
+    def now(self) -> float:
+        return self._clock()
+
+    def schedule(self, delay: float, callback: TimerCallback, payload: Any = None) -> Timer:
+        return self.schedule_at(self._clock() + delay, callback, payload)
+
+    def schedule_at(self, when: float, callback: TimerCallback, payload: Any = None) -> Timer:
+        # timers never fire early, round up to the next tick
+        deadline = max(math.ceil((when - self._origin) / self._tick), self._current)
+        timer = Timer(deadline, callback, payload)
+        self._add(timer)
+        return timer
+
+    def advance(self, now: Optional[float] = None) -> int:
+        now = now if now is not None else self._clock()
+        target = math.floor((now - self._origin) / self._tick)
+        expired = 0
+        level0 = self._wheels[0]
+        while self._current <= target:
+            index = self._current & self._mask
+            if index == 0:
+                self._cascade()
+            bucket = level0[index]
+            # the tick is over before the callbacks run, timers they schedule land in the future
+            self._current += 1
+            if bucket:
+                level0[index] = {}
+                expired += self._expire(bucket)
+            # jump over empty slots up to the next cascade
+            if self._current <= target and self._current & self._mask and \
+                    not any(level0[self._current & self._mask:]):
+                self._current = min(target + 1, (self._current | self._mask) + 1)
+        return expired
+
+    def _add(self, timer: Timer):
+        delta = timer.deadline - self._current
+        # timers beyond the span park at its end and are placed again when they cascade
+        slot = timer.deadline if delta <= self._span else self._current + self._span
+        delta = min(delta, self._span)
+        level = 0
+        while level < self._levels - 1 and delta >> (self._bits * (level + 1)):
+            level += 1
+        bucket = self._wheels[level][(slot >> (self._bits * level)) & self._mask]
+        bucket[timer] = None
+        timer._bucket = bucket
+
+    def _cascade(self):
+        # move the timers of the next slot of each upper level one level down
+        for level in range(1, self._levels):
+            index = (self._current >> (self._bits * level)) & self._mask
+            bucket = self._wheels[level][index]
+            if bucket:
+                self._wheels[level][index] = {}
+                for timer in bucket:
+                    self._add(timer)
+            if index != 0:
+                break
+
+    @staticmethod
+    def _expire(bucket: Bucket) -> int:
+        # one call per callback per tick with all the payloads that expired
+        batches: Dict[TimerCallback, List[Any]] = {}
+        for timer in bucket:
+            timer._bucket = None
+            batches.setdefault(timer.callback, []).append(timer.payload)
+        for callback, payloads in batches.items():
+            try:
+                callback(payloads)
+            except Exception:
+                logger.exception(f"Timer callback {callback} failed")
+        return len(bucket)
+
+
+__all__ = [
+    "VirtualClock",
+    "Timer",
+    "TimingWheel",
+]
@@ -0,0 +1,342 @@
+import dataclasses
+import logging
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterator, BinaryIO, Tuple, Type, Callable
+
+import cbor2
+
+from cattleman.exceptions import ResourceNotFoundException
+from cattleman.persistency import Persistency
+from cattleman.relations import RelationsManager
+from cattleman.types import PersistentResource, ResourceType, ResourceID, RelationType, \
+    KnowledgeBase
+from cattleman.utils.misc import percentile
+
+logger = logging.getLogger("trace")
+
+TRACE_FORMAT = "cattleman-trace"
+TRACE_VERSION = 1
+
+# operations in a trace
+OP_MAKE = "make"
+OP_SET = "set"
+OP_RELATE = "relate"
+OP_REQUEST = "request"
+OP_DELETE = "delete"
+
+# (time since the start of the recording, operation, items)
+TraceRecord = Tuple[float, str, List[Any]]
+
+
+def _resource_classes() -> Dict[ResourceType, Type[PersistentResource]]:
+    from cattleman.resources import Cluster, Node, IPAddress, DNSRecord, Application, Pod, \
+        Port, Service, Request
+    return {
+        ResourceType.CLUSTER: Cluster,
+        ResourceType.NODE: Node,
+        ResourceType.IP_ADDRESS: IPAddress,
+        ResourceType.DNS_RECORD: DNSRecord,
+        ResourceType.APPLICATION: Application,
+        ResourceType.POD: Pod,
+        ResourceType.PORT: Port,
+        ResourceType.SERVICE: Service,
+        ResourceType.REQUEST: Request,
+    }
+
+
+class TraceRecorder:
+
+    def __init__(self, path: str):
+        self._path: str = path
+        self._file: Optional[BinaryIO] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._start: float = 0.0
+        # resources committed at least once while recording, later commits are property sets
+        self._seen: set = set()
+        self._originals: Dict[Tuple[Any, str], Any] = {}
+        self.records: int = 0
+
+    @property
+    def recording(self) -> bool:
+        return self._file is not None
+
+    def start(self):
+        if self._file is not None:
+            return
+        self._file = open(self._path, "wb")
+        self._start = time.perf_counter()
+        cbor2.dump({"format": TRACE_FORMAT, "version": TRACE_VERSION, "date": time.time()},
+                   self._file)
+        self._wrap()
+        logger.info(f"Recording operations to '{self._path}'")
+
+    def stop(self):
+        if self._file is None:
+            return
+        self._unwrap()
+        with self._lock:
+            self._file.close()
+            self._file = None
+        logger.info(f"Recorded {self.records} operations to '{self._path}'")
+
+    def __enter__(self) -> 'TraceRecorder':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _write(self, op: str, items: List[Any]):
+        with self._lock:
+            if self._file is None:
+                return
+            cbor2.dump([time.perf_counter() - self._start, op, items], self._file)
+            self.records += 1
+
+    def _on_commit(self, resources: List[PersistentResource]):
+        # requests, new resources and updates are recorded separately, batches stay batches
+        batches: Dict[str, List[Any]] = {}
+        for resource in resources:
+            type = resource.get_type()
+            if type is ResourceType.REQUEST:
+                op = OP_REQUEST
+            elif resource.id in self._seen:
+                op = OP_SET
+            else:
+                op = OP_MAKE
+            self._seen.add(resource.id)
+            batches.setdefault(op, []).append([type.value, str(resource.id), resource.serialize()])
+        for op, items in batches.items():
+            self._write(op, items)
+
+    def _on_delete(self, resources: List[PersistentResource]):
+        for resource in resources:
+            self._seen.discard(resource.id)
+        self._write(OP_DELETE, [[r.get_type().value, str(r.id)] for r in resources])
+
+    def _on_relate(self, relations: List[Tuple]):
+        self._write(OP_RELATE, [
+            [origin_type.value, str(origin), relation.value, destination_type.value,
+             str(destination)]
+            for origin_type, origin, relation, destination_type, destination in relations
+        ])
+
+    def _wrap(self):
+        recorder = self
+        commit = PersistentResource.commit
+        commit_many = PersistentResource.commit_many
+        create_full = RelationsManager.create_full
+        create_many_full = RelationsManager.create_many_full
+        delete_many = PersistentResource.delete_many
+
+        def traced_commit(resource, lock: bool = True):
+            commit(resource, lock)
+            recorder._on_commit([resource])
+
+        def traced_commit_many(resources):
+            resources = list(resources)
+            commit_many(resources)
+            recorder._on_commit(resources)
+
+        def traced_delete_many(resources):
+            resources = list(resources)
+            delete_many(resources)
+            if resources:
+                recorder._on_delete(resources)
+
+        def traced_create_full(origin_type, origin, relation, destination_type, destination,
+                               value=None):
+            create_full(origin_type, origin, relation, destination_type, destination, value)
+            recorder._on_relate([(origin_type, origin, relation, destination_type, destination)])
+
+        def traced_create_many_full(relations, value=None):
+            relations = list(relations)
+            create_many_full(relations, value)
+            recorder._on_relate(relations)
+
+        self._originals = {
+            (PersistentResource, "commit"): PersistentResource.__dict__["commit"],
+            (PersistentResource, "commit_many"): PersistentResource.__dict__["commit_many"],
+            (PersistentResource, "delete_many"): PersistentResource.__dict__["delete_many"],
+            (RelationsManager, "create_full"): RelationsManager.__dict__["create_full"],
+            (RelationsManager, "create_many_full"):
+                RelationsManager.__dict__["create_many_full"],
+        }
+        PersistentResource.commit = traced_commit
+        PersistentResource.commit_many = staticmethod(traced_commit_many)
+        PersistentResource.delete_many = staticmethod(traced_delete_many)
+        RelationsManager.create_full = staticmethod(traced_create_full)
+        RelationsManager.create_many_full = staticmethod(traced_create_many_full)
+
+    def _unwrap(self):
+        for (klass, name), original in self._originals.items():
+            setattr(klass, name, original)
+        self._originals = {}
+
+
+class TraceReader:
+
+    def __init__(self, path: str):
+        self._path: str = path
+        self.header: Dict[str, Any] = {}
+
+    def __iter__(self) -> Iterator[TraceRecord]:
+        with open(self._path, "rb") as fin:
+            decoder = cbor2.CBORDecoder(fin)
+            self.header = decoder.decode()
+            if not isinstance(self.header, dict) or self.header.get("format") != TRACE_FORMAT:
+                raise ValueError(f"File '{self._path}' is not a cattleman trace.")
+            while True:
+                try:
+                    t, op, items = decoder.decode()
+                except cbor2.CBORDecodeEOF:
+                    # end of the trace, or the recorder was killed in the middle of a record
+                    return
+                yield t, op, items
+
+
+@dataclasses.dataclass
+class OperationStats:
+    records: int = 0
+    items: int = 0
+    latencies: List[float] = dataclasses.field(default_factory=list)
+
+    def percentile(self, q: float) -> float:
+        return percentile(self.latencies, q)
+
+
+@dataclasses.dataclass
+class ReplayReport:
+    records: int
+    items: int
+    duration: float
+    # size of the database files before and after the replay
+    db_size_before: int
+    db_size_after: int
+    operations: Dict[str, OperationStats]
+    # how far behind schedule the replay fell (only meaningful when not at max speed)
+    max_lag: float = 0.0
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.items / self.duration if self.duration else 0.0
+
+    @property
+    def db_growth(self) -> int:
+        return self.db_size_after - self.db_size_before
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(lat for s in self.operations.values() for lat in s.latencies)
+        return {
+            "records": self.records,
+            "operations": self.items,
+            "duration_s": round(self.duration, 3),
+            "ops_per_second": round(self.ops_per_second, 1),
+            "commit_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "commit_p90_ms": round(percentile(latencies, 90) * 1000, 3),
+            "commit_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "commit_max_ms": round((latencies[-1] if latencies else 0.0) * 1000, 3),
+            "db_size_before": self.db_size_before,
+            "db_size_after": self.db_size_after,
+            "db_growth": self.db_growth,
+            "max_lag_s": round(self.max_lag, 3),
+        }
+
+
+class TraceReplayer:
+
+    def __init__(self, path: str, speed: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        # `speed` scales the recorded timing (2.0 replays twice as fast), None means max speed
+        self._reader: TraceReader = TraceReader(path)
+        self._speed: Optional[float] = speed
+        self._sleep: Callable[[float], None] = sleep
+        self._classes: Dict[ResourceType, Type[PersistentResource]] = _resource_classes()
+
+    def replay(self, database: Optional[str] = None) -> ReplayReport:
+        if database is not None:
+            # start from scratch
+            KnowledgeBase.clear()
+            Persistency.relocate("resources", database)
+        db = Persistency.database("resources")
+        before = self._size(db.path)
+        operations: Dict[str, OperationStats] = {}
+        records = items = 0
+        max_lag = 0.0
+        stime = time.perf_counter()
+        for t, op, batch in self._reader:
+            if self._speed is not None:
+                lag = (time.perf_counter() - stime) - t / self._speed
+                if lag < 0:
+                    self._sleep(-lag)
+                max_lag = max(max_lag, lag)
+            otime = time.perf_counter()
+            self._execute(op, batch)
+            latency = time.perf_counter() - otime
+            stats = operations.setdefault(op, OperationStats())
+            stats.records += 1
+            stats.items += len(batch)
+            stats.latencies.append(latency)
+            records += 1
+            items += len(batch)
+        duration = time.perf_counter() - stime
+        # make sure everything reached the file before measuring it
+        db.commit()
+        for stats in operations.values():
+            stats.latencies.sort()
+        return ReplayReport(records, items, duration, before, self._size(db.path), operations,
+                            max(0.0, max_lag))
+
+    def _execute(self, op: str, batch: List[Any]):
+        if op == OP_RELATE:
+            relations = [
+                (ResourceType(ot), ResourceID(o), RelationType(r), ResourceType(dt), ResourceID(d))
+                for ot, o, r, dt, d in batch
+            ]
+            if len(relations) == 1:
+                RelationsManager.create_full(*relations[0])
+            else:
+                RelationsManager.create_many_full(relations)
+            return
+        if op == OP_DELETE:
+            # the resources were made earlier in the trace (or exist in the database)
+            resources = []
+            for _, id in batch:
+                try:
+                    resources.append(KnowledgeBase.get(ResourceID(id)))
+                except ResourceNotFoundException:
+                    logger.warning(f"Resource '{id}' to delete is not known, skipped.")
+            PersistentResource.delete_many(resources)
+            return
+        if op not in (OP_MAKE, OP_SET, OP_REQUEST):
+            logger.warning(f"Unknown operation '{op}' in trace, skipped.")
+            return
+        resources = [
+            self._classes[ResourceType(type)].deserialize(value, {"id": id})
+            for type, id, value in batch
+        ]
+        if len(resources) == 1:
+            resources[0].commit()
+        else:
+            PersistentResource.commit_many(resources)
+
+    @staticmethod
+    def _size(path: str) -> int:
+        if path == ":memory:":
+            return 0
+        return sum(os.path.getsize(p) for p in (path, f"{path}-wal", f"{path}-journal")
+                   if os.path.exists(p))
+
+
+__all__ = [
+    "TRACE_FORMAT",
+    "TRACE_VERSION",
+    "TraceRecorder",
+    "TraceReader",
+    "TraceReplayer",
+    "OperationStats",
+    "ReplayReport",
+    "percentile",
+]
@@ -30,8 +30,8 @@ def _get_all_files(parent: str, child: str) -> List[str]:
     return files
 
 
-if sys.version_info < (3, 6):
-    msg = 'cattleman works with Python 3.6 and later.\nDetected %s.' % str(sys.version)
+if sys.version_info < (3, 8):
+    msg = 'cattleman works with Python 3.8 and later.\nDetected %s.' % str(sys.version)
     sys.exit(msg)
 
 lib_version = get_version(filename='include/cattleman/__init__.py')
@@ -42,6 +42,10 @@ setup(
         'cattleman',
         'cattleman.cli',
         'cattleman.cli.commands',
+        'cattleman.network',
+        'cattleman.orchestrator',
+        'cattleman.resources',
+        'cattleman.runtime',
         'cattleman.utils'
     ],
     package_dir={
@@ -49,7 +53,8 @@ setup(
     },
     package_data={
         "cattleman": [
-            "schemas/*/*.json"
+            "schemas/*/*/*.json",
+            "schemas/*/*/*.sql"
         ],
     },
     version=lib_version,
@@ -60,6 +65,7 @@ setup(
     url='https://github.com/afdaniele/cattleman',
     download_url='https://github.com/afdaniele/cattleman/tarball/{}'.format(lib_version),
     zip_safe=False,
+    python_requires='>=3.8',
     include_package_data=True,
     keywords=['TODO', 'code', 'container', 'containerization', 'package', 'toolkit', 'docker'],
     install_requires=[
@@ -72,8 +78,6 @@ setup(
         'sshconf',
         'ipaddress',
         'cryptography',
-        'semantic-version',
-        *(['dataclasses'] if sys.version_info < (3, 7) else [])
     ],
     scripts=[
         'include/cattleman/bin/cattle'
@@ -84,7 +88,9 @@ setup(
         'Topic :: Software Development :: Build Tools',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
 )
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import random
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+from cattleman.network.dns import DNSIndex
+from cattleman.resources import DNSRecord
+from cattleman.types import DNSRecordType, ResourceID, ResourceType
+
+RECORDS = 100000
+LOOKUPS = 1000000
+SEED = 1
+
+
+def make_records():
+    records = []
+    for i in range(RECORDS):
+        # one in four names is an alias
+        if i % 4 == 0 and i > 0:
+            type, value = DNSRecordType.CNAME, f"svc{i - 1}.cluster.local"
+        else:
+            type, value = DNSRecordType.A, f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        records.append(DNSRecord(
+            id=ResourceID.make(ResourceType.DNS_RECORD),
+            name=f"svc{i}.cluster.local",
+            description=None,
+            _type=type,
+            _value=value,
+            _ttl=300
+        ))
+    return records
+
+
+def main():
+    rng = random.Random(SEED)
+    index = DNSIndex()
+    records = make_records()
+    report("index 100k records", measure(lambda: DNSIndex().add_many(records), 3), ops=RECORDS)
+    index.add_many(records)
+    names = [f"svc{rng.randrange(RECORDS)}.cluster.local" for _ in range(LOOKUPS)]
+    misses = [f"missing{i}.cluster.local" for i in range(LOOKUPS // 10)]
+
+    def lookups():
+        resolve = index.resolve
+        for name in names:
+            resolve(name)
+
+    def negative():
+        resolve = index.resolve
+        for name in misses:
+            resolve(name)
+
+    # first pass fills the cache
+    report("resolve (cold)", measure(lookups, 1), ops=LOOKUPS)
+    report("resolve (warm)", measure(lookups, 3), ops=LOOKUPS)
+    report("resolve (negative)", measure(negative, 3), ops=len(misses))
+
+
+if __name__ == '__main__':
+    main()
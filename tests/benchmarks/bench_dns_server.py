@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import asyncio
+import multiprocessing
+import random
+import socket
+import struct
+import time
+
+# noinspection PyUnresolvedReferences
+from utils import report
+
+from cattleman.network.dns import DNSIndex
+from cattleman.network.dns_server import DNSServer, encode_name
+from cattleman.resources import DNSRecord
+from cattleman.types import DNSRecordType, ResourceID, ResourceType
+
+RECORDS = 10000
+QUERIES = 200000
+# queries in flight
+WINDOW = 64
+SEED = 1
+
+
+def make_index() -> DNSIndex:
+    index = DNSIndex()
+    index.add_many(
+        DNSRecord(
+            id=ResourceID.make(ResourceType.DNS_RECORD),
+            name=f"svc{i}.cluster.local",
+            description=None,
+            _type=DNSRecordType.A,
+            _value=f"10.0.{(i >> 8) & 255}.{i & 255}",
+            _ttl=300
+        )
+        for i in range(RECORDS)
+    )
+    return index
+
+
+def serve(ready: multiprocessing.Queue):
+    async def run():
+        server = DNSServer(make_index(), "127.0.0.1", 0)
+        await server.start()
+        ready.put(server.address)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def make_queries():
+    rng = random.Random(SEED)
+    return [
+        encode_name(f"svc{rng.randrange(RECORDS)}.cluster.local") + struct.pack("!HH", 1, 1)
+        for _ in range(QUERIES)
+    ]
+
+
+def load(address, questions):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(address)
+    sock.settimeout(1.0)
+    sent = {}
+    latencies = []
+    lost = 0
+    i = 0
+    stime = time.perf_counter()
+    while i < len(questions) or sent:
+        # keep the window full
+        while i < len(questions) and len(sent) < WINDOW:
+            qid = i & 0xFFFF
+            sock.send(struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0) + questions[i])
+            sent[qid] = time.perf_counter()
+            i += 1
+        try:
+            response = sock.recv(512)
+        except socket.timeout:
+            lost += len(sent)
+            sent.clear()
+            continue
+        qid = struct.unpack("!H", response[:2])[0]
+        start = sent.pop(qid, None)
+        if start is not None:
+            latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - stime
+    sock.close()
+    return elapsed, latencies, lost
+
+
+def main():
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ready,), daemon=True)
+    server.start()
+    address = ready.get()
+    try:
+        questions = make_queries()
+        # warm up the wire cache
+        load(address, questions[:RECORDS])
+        elapsed, latencies, lost = load(address, questions)
+        latencies.sort()
+        report(f"{QUERIES} queries, window {WINDOW}", {"min": elapsed, "mean": elapsed},
+               ops=len(latencies))
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"{'latency':40s} p50: {p50:9.1f}us  p99: {p99:9.1f}us  lost: {lost}")
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
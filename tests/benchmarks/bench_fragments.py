@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import copy
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+from cattleman.fragments import FragmentTree, diff, patch
+from cattleman.types import Fragment
+
+SIZES = [1000, 5000, 20000]
+
+
+def make_fragment(n: int) -> Fragment:
+    return Fragment(
+        services=[
+            {
+                "application": f"application:{i:08x}",
+                "port": {"internal": 8080, "external": 1024 + i, "protocol": "tcp"},
+                "dns": {"type": "A", "value": f"10.0.{i // 256 % 256}.{i % 256}", "ttl": 60},
+            }
+            for i in range(n)
+        ],
+        retire=[f"service:{i:08x}" for i in range(n // 10)]
+    )
+
+
+def main():
+    for n in SIZES:
+        old = make_fragment(n)
+        new = copy.deepcopy(old)
+        new["services"][n // 2]["port"]["external"] = 1
+        # hashing is paid once per fragment
+        report(f"tree/{n}", measure(lambda: FragmentTree(new)))
+        # diff against a cached tree of the previous submission
+        old_tree, new_tree = FragmentTree(old), FragmentTree(new)
+        report(f"diff(trees)/{n}", measure(lambda: diff(old_tree, new_tree)))
+        report(f"diff(fragments)/{n}", measure(lambda: diff(old_tree, new)))
+        changes = diff(old_tree, new_tree)
+        report(f"patch/{n}", measure(lambda: patch(old, changes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import tempfile
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+os.environ["CATTLEMAN_RESOURCES_DB"] = os.path.join(tempfile.mkdtemp(), "resources.db")
+
+from cattleman.orchestrator.heartbeat import HeartbeatMonitor
+from cattleman.resources import Node
+from cattleman.types import ResourceID, ResourceType
+
+NODES = 100000
+HEARTBEATS = 1000000
+SEED = 1
+
+
+class Clock:
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+def main():
+    rng = random.Random(SEED)
+    clock = Clock()
+    monitor = HeartbeatMonitor(clock=clock)
+    nodes = [Node(id=ResourceID.make(ResourceType.NODE), name=f"node{i}", description=None)
+             for i in range(NODES)]
+    for node in nodes:
+        monitor.add_node(node)
+    ids = [node.id for node in nodes]
+    stream = [ids[rng.randrange(NODES)] for _ in range(HEARTBEATS)]
+
+    def ingest():
+        heartbeat = monitor.heartbeat
+        for node in stream:
+            clock.time += 1e-5
+            heartbeat(node)
+
+    def ingest_batch():
+        # a batch of heartbeats received in the same instant
+        monitor.heartbeat_many(stream, clock.time)
+
+    report("heartbeat", measure(ingest, 3), ops=HEARTBEATS)
+    report("heartbeat_many", measure(ingest_batch, 3), ops=HEARTBEATS)
+    report(f"check ({NODES} nodes, no transitions)", measure(lambda: monitor.check(), 5))
+
+
+if __name__ == '__main__':
+    main()
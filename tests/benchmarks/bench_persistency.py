@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import random
+import shutil
+import tempfile
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report, fixture, sizes, label
+
+from cattleman.logger import cmlogger
+from cattleman.persistency import Persistency
+from cattleman.relations import RelationsManager
+from cattleman.resources import Pod
+from cattleman.types import KnowledgeBase, ResourceID, ResourceType, RelationType
+
+SIZES = sizes([1000, 100000, 1000000])
+# operations per measurement
+COMMITS = 1000
+RELATIONS = 1000
+LOOKUPS = 1000
+SCANS = 10
+# (de)serialization does not depend on the size of the database past this
+SERIALIZE = 100000
+SEED = 1
+
+
+def make_fixture(resources: int) -> str:
+    # ~80% pods and nodes, ~15% services, ports and DNS records
+    clusters = max(1, resources // 100000)
+    return fixture(clusters=clusters, nodes=max(1, resources // 15 // clusters), pods=10,
+                   services=max(1, resources // 20 // clusters),
+                   applications=max(1, resources // 100), seed=SEED)
+
+
+def run(size: int, path: str):
+    rng = random.Random(SEED)
+    tag = f"@{label(size)}"
+    KnowledgeBase.clear()
+    Persistency.relocate("resources", path)
+    database = Persistency.database("resources")
+    total = sum(
+        database.fetchall(f"SELECT COUNT(*) FROM {table};")[0][0]
+        for table in ["clusters", "nodes", "ip_addresses", "applications", "pods", "ports",
+                      "dns_records", "services"]
+    )
+    pods = [row["id"] for row in database.fetchall("SELECT id FROM pods;")]
+    nodes = [row["id"] for row in database.fetchall("SELECT id FROM nodes;")]
+    applications = [row["id"] for row in database.fetchall("SELECT id FROM applications;")]
+    values = [row["value"] for row in
+              database.fetchall("SELECT value FROM pods LIMIT ?;", SERIALIZE)]
+
+    # what 'cattle info' reads, it should not depend on the size
+    report(f"summary {tag}", measure(Persistency.summary, 10), ops=1)
+
+    def load():
+        KnowledgeBase.clear()
+        Persistency.load_from_disk()
+
+    report(f"load_from_disk {tag}",
+           measure(load, 1 if total > 100000 else 3), ops=total)
+    # ---
+    objects = [Pod.deserialize(value, {"id": pods[i]}) for i, value in enumerate(values)]
+    report(f"deserialize {tag}",
+           measure(lambda: [Pod.deserialize(value, {"id": "pod:0"}) for value in values], 3),
+           ops=len(values))
+    report(f"serialize {tag}", measure(lambda: [o.serialize() for o in objects], 3),
+           ops=len(objects))
+    # ---
+    sequence = iter(range(1 << 62))
+
+    def commit():
+        for _ in range(COMMITS):
+            Pod(id=ResourceID(f"pod:b{next(sequence):015x}"), name="bench",
+                description=None).commit()
+
+    def update():
+        for pod in rng.sample(objects, min(COMMITS, len(objects))):
+            pod.commit()
+
+    report(f"commit (new) {tag}", measure(commit, 3), ops=COMMITS)
+    report(f"commit (update) {tag}", measure(update, 3), ops=min(COMMITS, len(objects)))
+    # ---
+    origins = [ResourceID(rng.choice(pods)) for _ in range(LOOKUPS)]
+    destinations = [ResourceID(rng.choice(nodes)) for _ in range(SCANS)]
+    report(f"relations by origin {tag}",
+           measure(lambda: [RelationsManager.get(origin=o) for o in origins], 3), ops=LOOKUPS)
+    report(f"relations by destination {tag}",
+           measure(lambda: [RelationsManager.get(destination=d) for d in destinations], 3),
+           ops=SCANS)
+
+    def create():
+        for _ in range(RELATIONS):
+            RelationsManager.create_full(ResourceType.POD, ResourceID(rng.choice(pods)),
+                                         RelationType.BELONGS_TO, ResourceType.APPLICATION,
+                                         ResourceID(rng.choice(applications)))
+
+    report(f"create_full {tag}", measure(create, 3), ops=RELATIONS)
+    Persistency.database("resources").close()
+
+
+def main():
+    cmlogger.setLevel(logging.WARNING)
+    logging.getLogger("DB:resources").setLevel(logging.WARNING)
+    for size in SIZES:
+        # benchmarks write, the cached fixture is left untouched
+        directory = tempfile.mkdtemp(prefix="cattle-bench-")
+        try:
+            path = os.path.join(directory, "resources.db")
+            shutil.copyfile(make_fixture(size), path)
+            run(size, path)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    KnowledgeBase.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import random
+import time
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report, fixture
+
+from cattleman.orchestrator.planner import DependencyGraph, Planner
+from cattleman.persistency import Persistency
+from cattleman.types import ResourceID, ResourceType
+
+CLUSTERS = 10
+NODES = 1000
+APPLICATIONS = 500
+PODS = 20000
+# simulated start-up latency of a single resource
+LATENCY = 0.001
+SEED = 1
+
+
+def main():
+    rng = random.Random(SEED)
+    make = ResourceID.make
+    clusters = [make(ResourceType.CLUSTER) for _ in range(CLUSTERS)]
+    nodes = [make(ResourceType.NODE) for _ in range(NODES)]
+    applications = [make(ResourceType.APPLICATION) for _ in range(APPLICATIONS)]
+
+    def build() -> DependencyGraph:
+        graph = DependencyGraph()
+        for node in nodes:
+            graph.add_dependency(node, rng.choice(clusters))
+        for _ in range(PODS):
+            pod = make(ResourceType.POD)
+            graph.add_dependency(pod, rng.choice(nodes))
+            graph.add_dependency(pod, rng.choice(applications))
+        return graph
+
+    graph = build()
+    report(f"build ({PODS} pods)", measure(build, 3), ops=PODS)
+    report("waves", measure(graph.waves, 5), ops=len(graph))
+    # sequential vs. wave-parallel bring-up of a single cluster
+    planner = Planner(graph.subgraph(clusters[0]), workers=64)
+    resources = planner.graph.resources
+    report(f"sequential bring-up ({len(resources)})",
+           measure(lambda: [time.sleep(LATENCY) for _ in resources], 1), ops=len(resources))
+    report(f"parallel bring-up ({len(planner.waves)} waves)",
+           measure(lambda: planner.bring_up(lambda _: time.sleep(LATENCY)), 1),
+           ops=len(resources))
+    # the same shape, read back from a synthetic database
+    Persistency.relocate("resources", fixture(clusters=CLUSTERS, nodes=NODES // CLUSTERS,
+                                              pods=PODS // NODES, applications=APPLICATIONS,
+                                              seed=SEED))
+    relations = Persistency.database("resources").fetchall(
+        "SELECT COUNT(*) FROM relations;")[0][0]
+    report(f"from database ({relations} relations)", measure(DependencyGraph.from_database, 3),
+           ops=relations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import socket
+import tempfile
+import time
+
+# noinspection PyUnresolvedReferences
+from utils import report
+
+os.environ["CATTLEMAN_RESOURCES_DB"] = os.path.join(tempfile.mkdtemp(), "resources.db")
+
+from cattleman.orchestrator.probes import ProbeEngine, ProbeTarget
+from cattleman.resources import IPAddress
+from cattleman.types import IPAddressType, ResourceID, ResourceType
+
+TARGETS = 5000
+LISTENERS = 50
+
+
+def main():
+    listeners = [socket.create_server(("127.0.0.1", 0), backlog=4096) for _ in range(LISTENERS)]
+    targets = []
+    for i in range(TARGETS):
+        # every other target points to a closed port
+        port = listeners[i % LISTENERS].getsockname()[1] if i % 2 == 0 else 1
+        address = IPAddress(id=ResourceID.make(ResourceType.IP_ADDRESS), name=f"ip{i}",
+                            description=None, _type=IPAddressType.IPv4, _value="127.0.0.1")
+        targets.append(ProbeTarget.for_address(address, port, timeout=1.0))
+    for concurrency in [1, 64, 1024]:
+        engine = ProbeEngine(concurrency=concurrency)
+        count = TARGETS if concurrency > 1 else TARGETS // 10
+        stime = time.perf_counter()
+        asyncio.run(engine.run_once(targets[:count]))
+        elapsed = time.perf_counter() - stime
+        report(f"probe {count} targets (concurrency {concurrency})",
+               {"min": elapsed, "mean": elapsed}, ops=count)
+        writer = engine.writer.stats
+        print(f"{'':40s} written: {writer.written}  batches: {writer.batches}")
+        # listeners never accept, drain their backlog between rounds
+        for listener in listeners:
+            listener.setblocking(False)
+            try:
+                while True:
+                    listener.accept()[0].close()
+            except BlockingIOError:
+                pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import asyncio
+import multiprocessing
+import socket
+import time
+
+# noinspection PyUnresolvedReferences
+from utils import report
+
+from cattleman.network.proxy import Proxy, ProxyRoute, SPLICE_AVAILABLE
+from cattleman.types import TransportProtocol
+
+BACKENDS = 4
+CLIENTS = 32
+# request/response round trips per client
+REQUESTS = 2000
+REQUEST_SIZE = 64
+# bytes streamed per client in the throughput test
+STREAM_SIZE = 64 * 1024 * 1024
+
+
+def echo_backends(ready: multiprocessing.Queue):
+    async def handle(reader, writer):
+        while data := await reader.read(256 * 1024):
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    async def run():
+        servers = [await asyncio.start_server(handle, "127.0.0.1", 0) for _ in range(BACKENDS)]
+        ready.put([s.sockets[0].getsockname()[1] for s in servers])
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def run_proxy(backends, port: int, zero_copy: bool, ready: multiprocessing.Queue):
+    async def run():
+        proxy = Proxy("127.0.0.1", zero_copy=zero_copy)
+        await proxy.apply([
+            ProxyRoute("echo", TransportProtocol.TCP, port, [("127.0.0.1", b) for b in backends])
+        ])
+        ready.put(True)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+async def latency_client(port: int, latencies: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    sock = writer.get_extra_info("socket")
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    payload = b"x" * REQUEST_SIZE
+    for _ in range(REQUESTS):
+        stime = time.perf_counter()
+        writer.write(payload)
+        await reader.readexactly(REQUEST_SIZE)
+        latencies.append(time.perf_counter() - stime)
+    writer.close()
+
+
+async def stream_client(port: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    chunk = b"x" * (256 * 1024)
+
+    async def send():
+        for _ in range(STREAM_SIZE // len(chunk)):
+            writer.write(chunk)
+            await writer.drain()
+        writer.write_eof()
+
+    async def receive():
+        received = 0
+        while data := await reader.read(256 * 1024):
+            received += len(data)
+        return received
+
+    _, received = await asyncio.gather(send(), receive())
+    writer.close()
+    return received
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    ready = multiprocessing.Queue()
+    backends = multiprocessing.Process(target=echo_backends, args=(ready,), daemon=True)
+    backends.start()
+    ports = ready.get()
+    modes = [False, True] if SPLICE_AVAILABLE else [False]
+    try:
+        for zero_copy in modes:
+            mode = "splice" if zero_copy else "copy"
+            port = free_port()
+            proxy = multiprocessing.Process(target=run_proxy, args=(ports, port, zero_copy, ready),
+                                            daemon=True)
+            proxy.start()
+            ready.get()
+            try:
+                # request/response latency
+                latencies = []
+
+                async def latency():
+                    await asyncio.gather(*[latency_client(port, latencies)
+                                           for _ in range(CLIENTS)])
+
+                stime = time.perf_counter()
+                asyncio.run(latency())
+                elapsed = time.perf_counter() - stime
+                latencies.sort()
+                report(f"round trips, {CLIENTS} clients ({mode})",
+                       {"min": elapsed, "mean": elapsed}, ops=len(latencies))
+                p50 = latencies[len(latencies) // 2] * 1e6
+                p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+                print(f"{'latency':40s} p50: {p50:9.1f}us  p99: {p99:9.1f}us")
+
+                # streaming throughput
+                async def stream():
+                    return await asyncio.gather(*[stream_client(port) for _ in range(4)])
+
+                stime = time.perf_counter()
+                total = sum(asyncio.run(stream()))
+                elapsed = time.perf_counter() - stime
+                print(f"{f'throughput ({mode})':40s} {total / elapsed / 2 ** 20:9.1f} MiB/s")
+            finally:
+                proxy.terminate()
+    finally:
+        backends.terminate()
+
+
+if __name__ == '__main__':
+    main()
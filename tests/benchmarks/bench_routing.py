@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import time
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+from cattleman.network.routing import HashRing
+
+MEMBERS = 1000
+KEYS = 200000
+
+
+def make_ring() -> HashRing:
+    ring = HashRing()
+    ring.add_many([f"pod:{i:08x}" for i in range(MEMBERS)])
+    return ring
+
+
+def moved(before, after) -> int:
+    return sum(1 for a, b in zip(before, after) if a != b)
+
+
+def main():
+    keys = [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(KEYS)]
+    report(f"build ring ({MEMBERS} members)", measure(make_ring, 3), ops=MEMBERS)
+    ring = make_ring()
+
+    def lookups():
+        lookup = ring.lookup
+        for key in keys:
+            lookup(key)
+
+    report("lookup", measure(lookups, 3), ops=KEYS)
+    before = [ring.lookup(k) for k in keys]
+    # incremental membership changes
+    stime = time.perf_counter()
+    ring.add("pod:new")
+    elapsed = time.perf_counter() - stime
+    report("add 1 member", {"min": elapsed, "mean": elapsed})
+    after = [ring.lookup(k) for k in keys]
+    print(f"{'keys moved (add)':40s} {moved(before, after) / KEYS:9.3%}  "
+          f"(ideal: {1 / (MEMBERS + 1):.3%})")
+    stime = time.perf_counter()
+    ring.remove("pod:00000000")
+    ring.remove("pod:new")
+    elapsed = time.perf_counter() - stime
+    report("remove 2 members", {"min": elapsed, "mean": elapsed})
+    after = [ring.lookup(k) for k in keys]
+    print(f"{'keys moved (remove 1)':40s} {moved(before, after) / KEYS:9.3%}  "
+          f"(ideal: {1 / MEMBERS:.3%})")
+    # a 10% scale-up
+    stime = time.perf_counter()
+    ring.add_many([f"pod:new{i}" for i in range(MEMBERS // 10)])
+    elapsed = time.perf_counter() - stime
+    report(f"add {MEMBERS // 10} members", {"min": elapsed, "mean": elapsed})
+    scaled = [ring.lookup(k) for k in keys]
+    print(f"{'keys moved (scale up 10%)':40s} {moved(after, scaled) / KEYS:9.3%}  "
+          f"(ideal: {(MEMBERS // 10) / (MEMBERS - 1 + MEMBERS // 10):.3%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+from cattleman.runtime.driver import PodHandle
+from cattleman.runtime.fake import FakeRuntime
+from cattleman.types import ResourceID, ResourceType
+
+NODES = 1000
+PODS = 20000
+# round-trip of a runtime call and per-pod cost on the host
+LATENCY = 0.005
+POD_LATENCY = 0.00001
+
+
+def main():
+    nodes = [ResourceID.make(ResourceType.NODE) for _ in range(NODES)]
+    pods = [PodHandle(ResourceID.make(ResourceType.POD), nodes[i % NODES]) for i in range(PODS)]
+
+    def cycle(batch_size: int):
+        runtime = FakeRuntime(latency=LATENCY, pod_latency=POD_LATENCY, batch_size=batch_size)
+
+        async def run():
+            await runtime.start_many(pods)
+            await runtime.stop_many(pods)
+            await runtime.close()
+
+        asyncio.run(run())
+
+    for batch_size in (1, 16, 256):
+        report(f"start+stop (batch: {batch_size})", measure(lambda: cycle(batch_size), 1),
+               ops=2 * PODS)
+
+
+if __name__ == '__main__':
+    main()
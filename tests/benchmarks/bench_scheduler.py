@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import time
+
+# noinspection PyUnresolvedReferences
+from utils import report
+
+from cattleman.orchestrator.scheduler import Scheduler, PodSpec, BinPackPolicy, SpreadPolicy, \
+    ApplicationSpreadPolicy
+from cattleman.types import ResourceID
+
+NODES = 5000
+PODS = 100000
+APPLICATIONS = 100
+CLUSTERS = 5
+
+
+def make_scheduler(policy) -> Scheduler:
+    scheduler = Scheduler(policy)
+    for i in range(NODES):
+        scheduler.add_node(ResourceID(f"node:{i:08x}"), ResourceID(f"cluster:{i % CLUSTERS:08x}"),
+                           capacity=2 * PODS // NODES)
+    return scheduler
+
+
+def make_pods():
+    return [
+        PodSpec(f"pod{i}", ResourceID(f"application:{i % APPLICATIONS:08x}"),
+                ResourceID(f"cluster:{i % CLUSTERS:08x}"))
+        for i in range(PODS)
+    ]
+
+
+def main():
+    pods = make_pods()
+    for policy in [SpreadPolicy(), BinPackPolicy(), ApplicationSpreadPolicy()]:
+        scheduler = make_scheduler(policy)
+        stime = time.perf_counter()
+        scheduler.place_many(pods)
+        elapsed = time.perf_counter() - stime
+        name = f"place {PODS} pods on {NODES} nodes ({type(policy).__name__})"
+        report(name, {"min": elapsed, "mean": elapsed}, ops=PODS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+import os
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+os.environ["CATTLEMAN_RESOURCES_DB"] = ":memory:"
+
+from cattleman.orchestrator.simulation import Scenario, Simulation
+
+HOURS = 4
+NODES = 500
+SEED = 1
+
+
+def main():
+    scenario = Scenario.generate(hours=HOURS, nodes=NODES, seed=SEED)
+    results = []
+    report(f"simulate {HOURS}h ({NODES} nodes)",
+           measure(lambda: results.append(Simulation(scenario).run()), 1),
+           ops=int(HOURS * 3600 * 10))
+    summary = results[0].summary()
+    for key in ("speedup", "convergence_mean_s", "convergence_max", "queue_depth_mean",
+                "queue_depth_max", "db_writes_per_hour", "started", "failed_starts", "evicted"):
+        print(f"  {key:38s} {summary[key]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import random
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+from cattleman.utils.timing_wheel import TimingWheel, VirtualClock
+
+TIMERS = 1000000
+# timers spread over one hour with a 10ms tick
+HORIZON = 3600.0
+TICK = 0.01
+SEED = 1
+
+
+def main():
+    rng = random.Random(SEED)
+    delays = [rng.uniform(0, HORIZON) for _ in range(TIMERS)]
+    state = {}
+
+    def expired(payloads):
+        state["expired"] += len(payloads)
+
+    def schedule():
+        clock = VirtualClock()
+        wheel = TimingWheel(tick=TICK, clock=clock)
+        state["clock"], state["wheel"] = clock, wheel
+        state["timers"] = [wheel.schedule(delay, expired) for delay in delays]
+        state["expired"] = 0
+
+    def cancel():
+        for timer in state["timers"][::2]:
+            timer.cancel()
+
+    def advance():
+        clock, wheel = state["clock"], state["wheel"]
+        # one advance per tick, as the orchestrator would
+        while clock.time < HORIZON:
+            clock.advance(TICK)
+            wheel.advance()
+
+    report(f"schedule ({TIMERS} timers)", measure(schedule, 3), ops=TIMERS)
+    # cancelling twice is a no-op, measure a single pass
+    report("cancel (half)", measure(cancel, 1), ops=TIMERS // 2)
+    report(f"advance ({int(HORIZON / TICK)} ticks)", measure(advance, 1), ops=TIMERS // 2)
+    assert state["expired"] == TIMERS // 2, state["expired"]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+
+# noinspection PyUnresolvedReferences
+from utils import measure, report
+
+TMP = tempfile.mkdtemp()
+os.environ["CATTLEMAN_RESOURCES_DB"] = os.path.join(TMP, "recording.db")
+
+from cattleman.resources import Cluster, Node, Application, Port, Request
+from cattleman.types import TransportProtocol, Fragment
+from cattleman.utils.trace import TraceRecorder, TraceReplayer
+
+NODES = 200
+APPLICATIONS = 500
+REQUESTS = 2000
+
+
+def workload():
+    cluster = Cluster.make("cluster")
+    for i in range(NODES):
+        Node.make(f"node{i}", [], cluster)
+    for i in range(APPLICATIONS):
+        Application.make(f"app{i}")
+        port = Port.make(f"port{i}", 80, 30000 + i, TransportProtocol.TCP)
+        port.external = 40000 + i
+    for i in range(0, REQUESTS, 100):
+        Request.make_many([f"r{j}" for j in range(i, i + 100)], [Fragment()] * 100,
+                          validate=False)
+
+
+def main():
+    trace = os.path.join(TMP, "trace.cbor")
+    with TraceRecorder(trace) as recorder:
+        report("record", measure(workload, 1), ops=NODES * 2 + APPLICATIONS * 3 + REQUESTS)
+    print(f"  {recorder.records} records, {os.path.getsize(trace):,} bytes")
+    runs = []
+
+    def replay():
+        database = os.path.join(tempfile.mkdtemp(dir=TMP), "resources.db")
+        runs.append(TraceReplayer(trace).replay(database))
+
+    report("replay (max speed)", measure(replay, 3), ops=runs[0].items if runs else 1)
+    summary = runs[-1].summary()
+    for key in ("ops_per_second", "commit_p50_ms", "commit_p99_ms", "db_growth"):
+        print(f"  {key:38s} {summary[key]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Tuple
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+def run(benchmarks: List[str], sizes: str) -> Tuple[Results, List[str]]:
+    results: Results = {}
+    failed = []
+    for benchmark in benchmarks:
+        name = os.path.splitext(os.path.basename(benchmark))[0]
+        print(f"==> {name}", flush=True)
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as fout:
+            output = fout.name
+        env = {**os.environ, "CATTLEMAN_BENCH_OUTPUT": output}
+        if sizes:
+            env["CATTLEMAN_BENCH_SIZES"] = sizes
+        try:
+            if subprocess.run([sys.executable, benchmark], cwd=HERE, env=env).returncode != 0:
+                failed.append(name)
+                continue
+            with open(output, "rt") as fin:
+                results[name] = json.load(fin) if os.path.getsize(output) else {}
+        finally:
+            os.remove(output)
+    return results, failed
+
+
+def compare(current: Results, baseline: Results, threshold: float) -> List[Tuple[str, float]]:
+    # best times are compared, they are the least affected by noise
+    regressions = []
+    print(f"\n{'benchmark':64s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for benchmark, measurements in sorted(current.items()):
+        for name, stats in measurements.items():
+            before = baseline.get(benchmark, {}).get(name)
+            if before is None or not before["min"]:
+                continue
+            change = stats["min"] / before["min"] - 1.0
+            flag = ""
+            if change > threshold:
+                regressions.append((f"{benchmark}: {name}", change))
+                flag = "  <-- REGRESSION"
+            print(f"{benchmark + ': ' + name:64s} {before['min'] * 1000:10.3f}ms "
+                  f"{stats['min'] * 1000:10.3f}ms {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("benchmarks", nargs="*",
+                        help="Benchmarks to run, e.g., 'persistency', defaults to all")
+    parser.add_argument("--output", default=None, help="Where to store the results as JSON")
+    parser.add_argument("--baseline", default=None,
+                        help="Results of a previous run to compare against")
+    parser.add_argument("--threshold", default=0.25, type=float,
+                        help="Slowdown (as a fraction) that counts as a regression")
+    parser.add_argument("--sizes", default=None,
+                        help="Database sizes for the benchmarks that take them, "
+                             "e.g., '1k,100k,1M'")
+    parsed = parser.parse_args()
+    if parsed.benchmarks:
+        benchmarks = [os.path.join(HERE, f"bench_{name}.py") for name in parsed.benchmarks]
+        missing = [b for b in benchmarks if not os.path.isfile(b)]
+        if missing:
+            print(f"Benchmarks not found: {', '.join(missing)}")
+            sys.exit(2)
+    else:
+        benchmarks = sorted(glob.glob(os.path.join(HERE, "bench_*.py")))
+    results, failed = run(benchmarks, parsed.sizes)
+    if parsed.output:
+        document: Dict[str, Any] = {
+            "date": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "benchmarks": results,
+        }
+        with open(parsed.output, "wt") as fout:
+            json.dump(document, fout, indent=4)
+        print(f"\nResults written to '{parsed.output}'")
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+    regressions = []
+    if parsed.baseline:
+        with open(parsed.baseline, "rt") as fin:
+            baseline = json.load(fin)["benchmarks"]
+        regressions = compare(results, baseline, parsed.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {parsed.threshold:.0%}:")
+            for name, change in regressions:
+                print(f"  {name} ({change:+.1%})")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
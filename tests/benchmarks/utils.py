@@ -0,0 +1,87 @@
+import atexit
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Any, List
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..")
+INCLUDE = os.path.abspath(os.path.join(ROOT, "include"))
+TESTS = os.path.abspath(os.path.join(ROOT, "tests"))
+
+FIXTURES = os.path.join(TESTS, "databases", "fixtures")
+GENERATOR = os.path.join(TESTS, "databases", "utils", "generate.py")
+
+# set by the suite runner (run.py) to collect the results as JSON
+OUTPUT = os.environ.get("CATTLEMAN_BENCH_OUTPUT")
+SIZES = os.environ.get("CATTLEMAN_BENCH_SIZES")
+
+# make the library importable
+sys.path.insert(0, INCLUDE)
+
+_results: Dict[str, Dict[str, float]] = {}
+
+
+def sizes(default: List[int]) -> List[int]:
+    # e.g., CATTLEMAN_BENCH_SIZES=1k,100k
+    if not SIZES:
+        return default
+    units = {"k": 1000, "m": 1000000}
+    return [
+        int(float(size[:-1]) * units[size[-1].lower()]) if size[-1].lower() in units
+        else int(size)
+        for size in SIZES.split(",")
+    ]
+
+
+def label(size: int) -> str:
+    if size >= 1000000 and size % 1000000 == 0:
+        return f"{size // 1000000}M"
+    if size >= 1000 and size % 1000 == 0:
+        return f"{size // 1000}k"
+    return str(size)
+
+
+def fixture(clusters: int = 1, nodes: int = 100, pods: int = 10, services: int = 100,
+            applications: int = 100, seed: int = 0) -> str:
+    # synthetic databases are generated once and shared by all the benchmarks
+    name = f"c{clusters}-n{nodes}-p{pods}-s{services}-a{applications}-seed{seed}.sqlite"
+    path = os.path.join(FIXTURES, name)
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES, exist_ok=True)
+        subprocess.run([
+            sys.executable, GENERATOR, "--output", path, "--clusters", str(clusters),
+            "--nodes", str(nodes), "--pods", str(pods), "--services", str(services),
+            "--applications", str(applications), "--seed", str(seed)
+        ], check=True)
+    return path
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        stime = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - stime)
+    return {
+        "min": min(times),
+        "mean": statistics.mean(times),
+        "max": max(times),
+    }
+
+
+def report(name: str, stats: Dict[str, float], ops: int = 1):
+    line = f"{name:40s} min: {stats['min'] * 1000:9.3f}ms  mean: {stats['mean'] * 1000:9.3f}ms"
+    if ops > 1:
+        line += f"  ({ops / stats['min']:,.0f} ops/s)"
+    print(line, flush=True)
+    _results[name] = {**stats, "ops": ops}
+
+
+@atexit.register
+def _save():
+    if OUTPUT and _results:
+        with open(OUTPUT, "wt") as fout:
+            json.dump(_results, fout, indent=4)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+import argparse
+import copy
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Tuple, Dict, Any
+
+import cbor2
+
+# noinspection PyUnresolvedReferences
+from utils import INCLUDE, LIB
+
+# include lib
+sys.path.insert(0, INCLUDE)
+from cattleman.resources import Cluster, Node, IPAddress, Application, Pod, Port, Service, \
+    DNSRecord
+from cattleman.types import ResourceID, ResourceType, RelationType, IPAddressType, \
+    DNSRecordType, TransportProtocol, PersistentResource
+
+SCHEMA = os.path.join(LIB, "schemas", "database", "1.0", "schema.sql")
+TABLES = ["clusters", "nodes", "ip_addresses", "applications", "pods", "ports", "dns_records",
+          "services", "relations"]
+# every row carries the same date, two runs with the same parameters give the same file
+DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# rows written by a single worker task
+UNIT_SIZE = 100000
+
+Row = Tuple[Any, ...]
+
+
+def _id(type: ResourceType, i: int) -> str:
+    # sequential IDs keep the primary key indices append-only, the 's' keeps them apart from
+    # those of ResourceID.make() (hex digits only), so benchmarks can add resources to a fixture
+    return f"{type.value}:s{i:07x}"
+
+
+def _templates() -> Dict[str, dict]:
+    # one serialized resource per type, rows are produced by swapping fields in a copy
+    placeholder = dict(name="", description=None)
+    resources = {
+        "clusters": Cluster(id=ResourceID("cluster:0"), **placeholder),
+        "nodes": Node(id=ResourceID("node:0"), **placeholder),
+        "ip_addresses": IPAddress(id=ResourceID("ip:0"), **placeholder, _value="",
+                                  _type=IPAddressType.IPv4),
+        "applications": Application(id=ResourceID("application:0"), **placeholder),
+        "pods": Pod(id=ResourceID("pod:0"), **placeholder),
+        "ports": Port(id=ResourceID("port:0"), **placeholder, _internal=0, _external=0,
+                      _protocol=TransportProtocol.TCP),
+        "dns_records": DNSRecord(id=ResourceID("dns:0"), **placeholder, _type=DNSRecordType.A,
+                                 _value="", _ttl=300),
+        "services": Service(id=ResourceID("service:0"), **placeholder),
+    }
+    templates = {}
+    for table, resource in resources.items():
+        data = cbor2.loads(PersistentResource.serialize(resource))
+        for status in data["status"]:
+            status["date"] = DATE
+        templates[table] = data
+    return templates
+
+
+class Generator:
+
+    def __init__(self, clusters: int, nodes: int, pods: int, services: int, applications: int,
+                 seed: int):
+        # `nodes`, `pods` and `services` are per cluster, per node and per cluster respectively
+        self.clusters = clusters
+        self.nodes = nodes
+        self.pods = pods
+        self.services = services
+        self.applications = applications
+        self.seed = seed
+        self._templates = _templates()
+        self._relation = cbor2.dumps({})
+
+    @property
+    def relations_per_node(self) -> int:
+        # node -> cluster, ip -> node, (pod -> node, pod -> application) x pods
+        return 2 + 2 * self.pods
+
+    @property
+    def total_relations(self) -> int:
+        return self.clusters * (self.nodes * self.relations_per_node + 3 * self.services)
+
+    def units(self) -> List[Tuple[int, int, int]]:
+        # (cluster, first node, last node), services go with the first unit of their cluster
+        size = max(1, UNIT_SIZE // self.relations_per_node)
+        return [
+            (c, n, min(n + size, self.nodes))
+            for c in range(self.clusters)
+            for n in range(0, max(1, self.nodes), size)
+        ]
+
+    def _row(self, table: str, id: str, **fields) -> Row:
+        data = copy.copy(self._templates[table])
+        data.update(fields)
+        return id, str(DATE), True, cbor2.dumps(data)
+
+    def _relation_row(self, i: int, origin: str, destination: str) -> Row:
+        # type names are the prefix of the IDs
+        return (_id(ResourceType.RELATION, i), origin.split(":")[0], origin,
+                RelationType.BELONGS_TO.value, destination.split(":")[0], destination, str(DATE),
+                self._relation)
+
+    def head(self) -> Dict[str, List[Row]]:
+        return {
+            "clusters": [
+                self._row("clusters", _id(ResourceType.CLUSTER, c), name=f"cluster{c}")
+                for c in range(self.clusters)
+            ],
+            "applications": [
+                self._row("applications", _id(ResourceType.APPLICATION, a), name=f"app{a}")
+                for a in range(self.applications)
+            ],
+        }
+
+    def unit(self, cluster: int, first: int, last: int) -> Dict[str, List[Row]]:
+        rng = random.Random(f"{self.seed}:{cluster}:{first}")
+        rows: Dict[str, List[Row]] = {table: [] for table in TABLES}
+        cluster_id = _id(ResourceType.CLUSTER, cluster)
+        for n in range(first, last):
+            g = cluster * self.nodes + n
+            node, ip = _id(ResourceType.NODE, g), _id(ResourceType.IP_ADDRESS, g)
+            rows["nodes"].append(self._row("nodes", node, name=f"node{g}"))
+            rows["ip_addresses"].append(self._row(
+                "ip_addresses", ip, name=f"ip{g}",
+                _value=f"10.{(g >> 16) & 255}.{(g >> 8) & 255}.{g & 255}"
+            ))
+            r = g * self.relations_per_node
+            relations = rows["relations"]
+            relations.append(self._relation_row(r, node, cluster_id))
+            relations.append(self._relation_row(r + 1, ip, node))
+            r += 2
+            for p in range(self.pods):
+                pod = _id(ResourceType.POD, g * self.pods + p)
+                application = _id(ResourceType.APPLICATION, rng.randrange(self.applications))
+                rows["pods"].append(self._row("pods", pod, name=f"pod{g * self.pods + p}"))
+                relations.append(self._relation_row(r, pod, node))
+                relations.append(self._relation_row(r + 1, pod, application))
+                r += 2
+        if first == 0:
+            self._services(cluster, rng, rows)
+        return rows
+
+    def _services(self, cluster: int, rng: random.Random, rows: Dict[str, List[Row]]):
+        # service relations come after those of all the nodes
+        base = self.clusters * self.nodes * self.relations_per_node
+        for s in range(self.services):
+            i = cluster * self.services + s
+            service, port, dns = _id(ResourceType.SERVICE, i), _id(ResourceType.PORT, i), \
+                _id(ResourceType.DNS_RECORD, i)
+            application = _id(ResourceType.APPLICATION, rng.randrange(self.applications))
+            rows["services"].append(self._row("services", service, name=f"svc{i}"))
+            rows["ports"].append(self._row(
+                "ports", port, name=f"port{i}", _internal=rng.randrange(1024, 65536),
+                _external=1024 + s % (65536 - 1024)
+            ))
+            rows["dns_records"].append(self._row(
+                "dns_records", dns, name=f"svc{s}.cluster{cluster}.local",
+                _value=f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+            ))
+            r = base + 3 * i
+            rows["relations"].append(self._relation_row(r, service, application))
+            rows["relations"].append(self._relation_row(r + 1, service, port))
+            rows["relations"].append(self._relation_row(r + 2, service, dns))
+
+
+def _insert(db: sqlite3.Connection, rows: Dict[str, List[Row]]):
+    for table, values in rows.items():
+        if values:
+            marks = ", ".join("?" * len(values[0]))
+            db.executemany(f"INSERT INTO {table} VALUES ({marks});", values)
+
+
+def _open(path: str, indices: bool) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=OFF;")
+    db.execute("PRAGMA synchronous=OFF;")
+    with open(SCHEMA, "rt") as fin:
+        schema = fin.read()
+    if not indices:
+        # secondary indices and the summary (counts kept by triggers) are built at the end, in
+        # one go
+        schema = "\n\n".join(s for s in schema.split("\n\n")
+                             if "index if not exists" not in s and "resource_counts" not in s)
+    db.executescript(schema)
+    return db
+
+
+def _work(args) -> str:
+    generator, directory, (cluster, first, last) = args
+    path = os.path.join(directory, f"{cluster:06d}-{first:09d}.sqlite")
+    db = _open(path, indices=False)
+    _insert(db, generator.unit(cluster, first, last))
+    db.commit()
+    db.close()
+    return path
+
+
+def generate(output: str, clusters: int, nodes: int, pods: int, services: int,
+             applications: int, seed: int, workers: int) -> Dict[str, int]:
+    generator = Generator(clusters, nodes, pods, services, applications, seed)
+    partial = f"{output}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    db = _open(partial, indices=False)
+    _insert(db, generator.head())
+    directory = tempfile.mkdtemp(prefix="cattleman-db-")
+    tasks = [(generator, directory, unit) for unit in generator.units()]
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            # shards are merged in order, the result does not depend on the number of workers
+            for shard in pool.imap(_work, tasks):
+                db.execute("ATTACH DATABASE ? AS shard;", (shard,))
+                for table in TABLES:
+                    db.execute(f"INSERT INTO main.{table} SELECT * FROM shard.{table};")
+                db.commit()
+                db.execute("DETACH DATABASE shard;")
+                os.remove(shard)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    with open(SCHEMA, "rt") as fin:
+        db.executescript(fin.read())
+    counts = {table: db.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+              for table in TABLES}
+    db.close()
+    os.replace(partial, output)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic resources database")
+    parser.add_argument("--clusters", type=int, default=1, help="Number of clusters")
+    parser.add_argument("--nodes", type=int, default=100, help="Nodes per cluster")
+    parser.add_argument("--pods", type=int, default=10, help="Pods per node")
+    parser.add_argument("--services", type=int, default=100, help="Services per cluster")
+    parser.add_argument("--applications", type=int, default=100, help="Number of applications")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random content")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("--output", required=True, help="Where to write the database")
+    parser.add_argument("--force", default=False, action="store_true",
+                        help="Overwrite the output if it exists")
+    parsed = parser.parse_args()
+    if os.path.exists(parsed.output) and not parsed.force:
+        print(f"File '{parsed.output}' exists, use --force to overwrite it.")
+        sys.exit(1)
+    stime = time.perf_counter()
+    counts = generate(parsed.output, parsed.clusters, parsed.nodes, parsed.pods,
+                      parsed.services, parsed.applications, parsed.seed, parsed.workers)
+    print(f"Produced: {os.path.abspath(parsed.output)} in {time.perf_counter() - stime:.1f}s")
+    for table, count in counts.items():
+        print(f"  {table:16s} {count:>12,}")
+
+
+if __name__ == '__main__':
+    main()
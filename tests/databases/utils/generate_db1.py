@@ -17,17 +17,18 @@ make_empty(DB_NAME)
 
 # include lib
 sys.path.insert(0, INCLUDE)
-from cattleman.types import Cluster, IPAddressType, IPAddress, Node
+from cattleman.resources import Cluster, IPAddress, Node
+from cattleman.types import IPAddressType
 from cattleman.persistency import Persistency
 
 
 def main():
     # create 1x cluster, 1x IP address and 1x Node
     with Persistency.session("resources"):
-        cluster = Cluster("local", description="My local cluster")
+        cluster = Cluster.make("local", description="My local cluster")
         # create node
-        ip = IPAddress("ip0", IPAddressType.IPv4, "8.8.8.8")
-        node = Node("node0", ip, cluster, description="My local node")
+        ip = IPAddress.make("ip0", "8.8.8.8", IPAddressType.IPv4)
+        Node.make("node0", [ip], cluster, description="My local node")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.network.dns import DNSIndex
+from cattleman.resources import DNSRecord
+from cattleman.types import DNSRecordType, ResourceID, ResourceType, PersistentResource
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+A = DNSRecordType.A
+AAAA = DNSRecordType.AAAA
+CNAME = DNSRecordType.CNAME
+
+
+def record(name: str, type: DNSRecordType, value: str, ttl: int = 60) -> DNSRecord:
+    return DNSRecord(
+        id=ResourceID.make(ResourceType.DNS_RECORD),
+        name=name,
+        description=None,
+        _type=type,
+        _value=value,
+        _ttl=ttl
+    )
+
+
+class Clock:
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+class TestDNSIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.index = DNSIndex(clock=self.clock, negative_ttl=5)
+
+    def test_resolve(self):
+        self.index.add_many([
+            record("web.local", A, "10.0.0.1"),
+            record("web.local", A, "10.0.0.2"),
+            record("web.local", AAAA, "fd00::1"),
+        ])
+        self.assertEqual(sorted(self.index.resolve("web.local").values), ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(self.index.resolve("WEB.local.", AAAA).values, ["fd00::1"])
+        self.assertTrue(self.index.resolve("db.local").negative)
+
+    def test_cname_chain(self):
+        self.index.add_many([
+            record("www.local", CNAME, "app.local", ttl=300),
+            record("app.local", CNAME, "web.local", ttl=300),
+            record("web.local", A, "10.0.0.1", ttl=30),
+        ])
+        answer = self.index.resolve("www.local")
+        self.assertEqual([r.name for r in answer.records], ["www.local", "app.local", "web.local"])
+        self.assertEqual(answer.values, ["10.0.0.1"])
+        # the answer lives as long as its shortest TTL
+        self.assertEqual(answer.ttl, 30)
+        self.assertEqual(answer.expires, 30)
+        # CNAME queries are not followed
+        self.assertEqual(self.index.resolve("www.local", CNAME).values, ["app.local"])
+
+    def test_cname_loop(self):
+        self.index.add_many([
+            record("a.local", CNAME, "b.local"),
+            record("b.local", CNAME, "a.local"),
+        ])
+        answer = self.index.resolve("a.local")
+        self.assertTrue(answer.loop)
+        self.assertTrue(answer.negative)
+
+    def test_ttl_expiry(self):
+        web = record("web.local", A, "10.0.0.1", ttl=10)
+        self.index.add(web)
+        first = self.index.resolve("web.local")
+        self.assertIs(self.index.resolve("web.local"), first)
+        self.clock.time = 11
+        self.assertIsNot(self.index.resolve("web.local"), first)
+
+    def test_negative_cache_invalidation(self):
+        self.assertTrue(self.index.resolve("www.local").negative)
+        # a record added at the end of the chain invalidates the cached negative answer
+        self.index.add(record("www.local", CNAME, "web.local"))
+        self.assertTrue(self.index.resolve("www.local").negative)
+        web = record("web.local", A, "10.0.0.1")
+        self.index.add(web)
+        self.assertEqual(self.index.resolve("www.local").values, ["10.0.0.1"])
+        invalidated = []
+        self.index.on_invalidate(invalidated.append)
+        self.index.remove(web)
+        self.assertEqual(invalidated, [{"web.local"}])
+        self.assertTrue(self.index.resolve("www.local").negative)
+
+    def test_cache_bounded(self):
+        self.index.add(record("web.local", A, "10.0.0.1"))
+        # spellings of the same name share an entry
+        first = self.index.resolve("web.local")
+        self.assertIs(self.index.resolve("WEB.Local."), first)
+        index = DNSIndex(clock=self.clock, max_entries=2)
+        index.add(record("web.local", A, "10.0.0.1"))
+        web = index.resolve("web.local")
+        for i in range(100):
+            index.resolve(f"host{i}.local")
+            # a hit keeps web.local in the cache
+            self.assertIs(index.resolve("web.local"), web)
+        self.assertEqual(len(index._cache), 2)
+        self.assertEqual(set(index._dependents), {"web.local", "host99.local"})
+
+    def test_sync_with_resources(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.index.attach()
+        try:
+            web = DNSRecord.make("web.local", A, "10.0.0.1", 60)
+            DNSRecord.make("www.local", CNAME, "web.local", 60)
+            self.assertEqual(self.index.resolve("www.local").values, ["10.0.0.1"])
+            web.value = "10.0.0.2"
+            self.assertEqual(self.index.resolve("www.local").values, ["10.0.0.2"])
+            web.type = AAAA
+            self.assertTrue(self.index.resolve("www.local").negative)
+            self.assertEqual(self.index.resolve("www.local", AAAA).values, ["10.0.0.2"])
+            # deleted records stop resolving right away
+            PersistentResource.delete_many([web])
+            self.assertTrue(self.index.resolve("www.local", AAAA).negative)
+            self.assertFalse(self.index.exists("web.local"))
+        finally:
+            self.index.detach()
+        # rebuild from the dns_records table
+        index = DNSIndex()
+        index.load_from_disk()
+        self.assertEqual(index.resolve("web.local", A).values, [])
+        self.assertEqual(len(index), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import asyncio
+import socket
+import struct
+import unittest
+
+from cattleman.network.dns import DNSIndex
+from cattleman.network.dns_server import DNSResponder, DNSServer
+from cattleman.resources import DNSRecord
+from cattleman.types import DNSRecordType, ResourceID, ResourceType
+
+A = DNSRecordType.A
+CNAME = DNSRecordType.CNAME
+
+
+def record(name: str, type: DNSRecordType, value: str, ttl: int = 60) -> DNSRecord:
+    return DNSRecord(
+        id=ResourceID.make(ResourceType.DNS_RECORD),
+        name=name,
+        description=None,
+        _type=type,
+        _value=value,
+        _ttl=ttl
+    )
+
+
+def query(id: int, name: str, qtype: int = 1) -> bytes:
+    # names are encoded by hand to keep their case
+    qname = b"".join(bytes((len(label),)) + label.encode() for label in name.split(".")) + b"\x00"
+    return struct.pack("!HHHHHH", id, 0x0100, 1, 0, 0, 0) + qname + struct.pack("!HH", qtype, 1)
+
+
+def header(response: bytes):
+    # id, rcode, number of answers
+    id, flags, _, ancount, _, _ = struct.unpack("!HHHHHH", response[:12])
+    return id, flags & 0x0F, ancount
+
+
+class TestDNSResponder(unittest.TestCase):
+
+    def setUp(self):
+        self.time = 0.0
+        self.index = DNSIndex(clock=lambda: self.time)
+        self.index.add_many([
+            record("www.local", CNAME, "web.local"),
+            record("web.local", A, "10.0.0.1", ttl=30),
+        ])
+        self.responder = DNSResponder(self.index, clock=lambda: self.time)
+
+    def test_answer(self):
+        response = self.responder.respond(query(1234, "web.local"))
+        self.assertEqual(header(response), (1234, 0, 1))
+        # TTL and address of the A record
+        self.assertEqual(response[-10:-6], struct.pack("!I", 30))
+        self.assertEqual(response[-4:], socket.inet_aton("10.0.0.1"))
+        # second query is served from the wire cache with its own ID and case
+        response = self.responder.respond(query(42, "WEB.local"))
+        self.assertEqual(header(response), (42, 0, 1))
+        self.assertIn(b"\x03WEB", response)
+        self.assertEqual((self.responder.hits, self.responder.misses), (1, 1))
+
+    def test_flags_and_remaining_ttl(self):
+        response = self.responder.respond(query(1, "web.local"))
+        flags = struct.unpack("!H", response[2:4])[0]
+        # RD is echoed but recursion is never available
+        self.assertTrue(flags & 0x0100)
+        self.assertFalse(flags & 0x0080)
+        # cached answers carry the time left until they expire
+        self.time = 10
+        response = self.responder.respond(query(2, "web.local"))
+        self.assertEqual(self.responder.hits, 1)
+        self.assertEqual(response[-10:-6], struct.pack("!I", 20))
+        self.time = 29.5
+        response = self.responder.respond(query(3, "web.local"))
+        self.assertEqual(response[-10:-6], struct.pack("!I", 1))
+        self.assertEqual(response[-4:], socket.inet_aton("10.0.0.1"))
+
+    def test_cname_and_negative(self):
+        self.assertEqual(header(self.responder.respond(query(1, "www.local"))), (1, 0, 2))
+        self.assertEqual(header(self.responder.respond(query(2, "db.local"))), (2, 3, 0))
+        # known name, unsupported type (MX)
+        self.assertEqual(header(self.responder.respond(query(3, "web.local", 15))), (3, 0, 0))
+        # responses and truncated packets are dropped
+        self.assertIsNone(self.responder.respond(b"\x00\x01\x81\x00" + query(4, "x")[4:]))
+        self.assertIsNone(self.responder.respond(query(5, "web.local")[:-2]))
+
+    def test_invalidation_and_ttl(self):
+        self.responder.respond(query(1, "www.local"))
+        self.index.add(record("web.local", A, "10.0.0.2", ttl=30))
+        self.assertEqual(header(self.responder.respond(query(1, "www.local"))), (1, 0, 3))
+        self.assertEqual(self.responder.misses, 2)
+        self.responder.respond(query(1, "www.local"))
+        self.assertEqual(self.responder.misses, 2)
+        # answers are rebuilt when their TTL expires
+        self.time = 31
+        self.responder.respond(query(1, "www.local"))
+        self.assertEqual(self.responder.misses, 3)
+
+    def test_bounded(self):
+        responder = DNSResponder(self.index, clock=lambda: self.time, max_entries=2)
+        responder.respond(query(1, "www.local"))
+        responder.respond(query(2, "web.local"))
+        # a hit makes www.local the most recently used entry
+        responder.respond(query(3, "www.local"))
+        responder.respond(query(4, "db.local"))
+        self.assertEqual(len(responder._wire), 2)
+        responder.respond(query(5, "www.local"))
+        self.assertEqual(responder.misses, 3)
+        # web.local was evicted
+        responder.respond(query(5, "web.local"))
+        self.assertEqual(responder.misses, 4)
+        # names of evicted answers are forgotten
+        for _ in range(10):
+            for name in ("a.local", "b.local", "c.local"):
+                responder.respond(query(6, name))
+        self.assertLessEqual(len(responder._dependents), 3)
+        self.assertTrue(all(responder._dependents.values()))
+        self.assertEqual(len(responder._wire), 2)
+
+    def test_truncation(self):
+        self.index.add_many([record("big.local", A, f"10.0.1.{i}") for i in range(40)])
+        response = self.responder.respond(query(9, "big.local"))
+        self.assertLessEqual(len(response), 512)
+        # TC is set and only whole records are kept
+        id, flags, _, ancount, _, _ = struct.unpack("!HHHHHH", response[:12])
+        self.assertTrue(flags & 0x0200)
+        # the first record points to the question, the others spell out big.local
+        self.assertEqual(len(response), len(query(9, "big.local")) + 16 + (ancount - 1) * 25)
+        self.assertGreater(len(response) + 25, 512)
+        # small answers are not truncated
+        self.assertFalse(struct.unpack("!H", self.responder.respond(query(1, "web.local"))[2:4])[0]
+                         & 0x0200)
+
+    def test_udp(self):
+        async def run():
+            server = DNSServer(self.index, "127.0.0.1", 0)
+            await server.start()
+            loop = asyncio.get_running_loop()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, server.address)
+                await loop.sock_sendall(sock, query(7, "web.local"))
+                return await asyncio.wait_for(loop.sock_recv(sock, 512), 2)
+            finally:
+                sock.close()
+                server.close()
+
+        self.assertEqual(header(asyncio.run(run())), (7, 0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import copy
+import unittest
+
+from cattleman.exceptions import FragmentPatchException
+from cattleman.fragments import diff, patch, ChangeType, FragmentChange, FragmentTree
+from cattleman.types import Fragment
+
+
+def _service(i: int, external: int = 80) -> dict:
+    return {
+        "application": f"application:{i:08x}",
+        "port": {
+            "internal": 8080,
+            "external": external,
+            "protocol": "tcp"
+        }
+    }
+
+
+def _fragment(n: int) -> Fragment:
+    return Fragment(
+        services=[_service(i, 1000 + i) for i in range(n)],
+        retire=["service:0000000a", "service:0000000b"]
+    )
+
+
+class TestFragments(unittest.TestCase):
+
+    def test_diff_identical(self):
+        a = _fragment(10)
+        b = copy.deepcopy(a)
+        self.assertEqual(diff(a, b), [])
+        self.assertEqual(FragmentTree(a).digest, FragmentTree(b).digest)
+
+    def test_diff_one_service_changed(self):
+        a = _fragment(10)
+        b = copy.deepcopy(a)
+        b["services"][3]["port"]["external"] = 9999
+        changes = diff(a, b)
+        self.assertEqual(changes, [
+            FragmentChange(ChangeType.REPLACE,
+                           ("services", "application:00000003", "port", "external"), 9999)
+        ])
+
+    def test_diff_is_ordered(self):
+        a = _fragment(5)
+        b = copy.deepcopy(a)
+        b["services"].insert(2, _service(100))
+        del b["services"][0]
+        b["services"][-1]["port"]["protocol"] = "udp"
+        b["retire"] = ["service:0000000b", "service:0000000c"]
+        changes = diff(a, b)
+        types = [c.type for c in changes]
+        self.assertEqual(types, sorted(types, key=[
+            ChangeType.REMOVE, ChangeType.REPLACE, ChangeType.ADD
+        ].index))
+        self.assertIn(FragmentChange(ChangeType.REMOVE, ("services", "application:00000000")),
+                      changes)
+        self.assertIn(FragmentChange(ChangeType.REMOVE, ("retire", "service:0000000a")), changes)
+
+    def test_patch_roundtrip(self):
+        a = _fragment(20)
+        b = copy.deepcopy(a)
+        b["services"].insert(0, _service(200))
+        b["services"].insert(7, _service(201))
+        del b["services"][10]
+        b["services"][4]["port"]["internal"] = 81
+        b["retire"].append("service:0000000f")
+        b["applications"] = []
+        self.assertEqual(patch(a, diff(a, b)), b)
+
+    def test_patch_does_not_modify_input(self):
+        a = _fragment(3)
+        original = copy.deepcopy(a)
+        b = copy.deepcopy(a)
+        b["services"][1]["port"]["external"] = 1
+        patched = patch(a, diff(a, b))
+        self.assertEqual(a, original)
+        # unchanged branches are shared
+        self.assertIs(patched["services"][0], a["services"][0])
+
+    def test_reordered_list_is_replaced(self):
+        a = _fragment(3)
+        b = copy.deepcopy(a)
+        b["services"].reverse()
+        changes = diff(a, b)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0].type, ChangeType.REPLACE)
+        self.assertEqual(changes[0].path, ("services",))
+        self.assertEqual(patch(a, changes), b)
+
+    def test_patch_missing_path(self):
+        change = FragmentChange(ChangeType.REMOVE, ("services", "application:ffffffff"))
+        with self.assertRaises(FragmentPatchException):
+            patch(_fragment(2), [change])
+
+
+if __name__ == '__main__':
+    unittest.main()
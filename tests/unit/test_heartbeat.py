@@ -0,0 +1,77 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.orchestrator.heartbeat import HeartbeatMonitor, HEARTBEAT_STATUS_KEY, phi
+from cattleman.resources import Node, Cluster
+from cattleman.types import Status
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestHeartbeat(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.time = 0.0
+        self.monitor = HeartbeatMonitor(threshold=8.0, clock=lambda: self.time)
+        cluster = Cluster.make("cluster")
+        self.nodes = [Node.make(f"node{i}", [], cluster) for i in range(3)]
+        for node in self.nodes:
+            self.monitor.add_node(node, expected_interval=1.0)
+
+    def _beat(self, seconds: int, nodes):
+        for _ in range(seconds):
+            self.time += 1.0
+            self.monitor.heartbeat_many([n.id for n in nodes])
+
+    def test_phi(self):
+        self.assertLess(phi(1.0, 1.0, 0.2), 0.5)
+        self.assertGreater(phi(3.0, 1.0, 0.2), 8.0)
+        self._beat(10, self.nodes)
+        self.assertLess(self.monitor.phi(self.nodes[0].id), 1.0)
+        self.assertGreater(self.monitor.phi(self.nodes[0].id, self.time + 5), 8.0)
+
+    def test_transitions(self):
+        self._beat(10, self.nodes)
+        self.assertEqual(self.monitor.check(), [])
+        # node 2 goes silent
+        self._beat(3, self.nodes[:2])
+        self.assertEqual(self.monitor.check(), [(self.nodes[2].id, True)])
+        self.assertTrue(self.monitor.is_suspected(self.nodes[2].id))
+        status = self.nodes[2].get_status(HEARTBEAT_STATUS_KEY)
+        self.assertEqual(status.value, Status.FAILURE)
+        # suspicion is reported once
+        self._beat(3, self.nodes[:2])
+        self.assertEqual(self.monitor.check(), [])
+        # and it comes back
+        self._beat(1, self.nodes)
+        self.assertEqual(self.monitor.check(), [(self.nodes[2].id, False)])
+        self.assertEqual(self.nodes[2].get_status(HEARTBEAT_STATUS_KEY).value, Status.SUCCESS)
+        # two transitions, two writes
+        self.assertEqual(self.monitor.writer.stats.written, 2)
+
+    def test_remove_node(self):
+        self.monitor.remove_node(self.nodes[0].id)
+        self.assertNotIn(self.nodes[0].id, self.monitor)
+        self.assertFalse(self.monitor.heartbeat(self.nodes[0].id))
+        self._beat(5, self.nodes[1:])
+        self.time += 10
+        self.assertEqual({n for n, _ in self.monitor.check()}, {n.id for n in self.nodes[1:]})
+
+    def test_remove_recovered_node(self):
+        self._beat(10, self.nodes)
+        self._beat(3, self.nodes[:2])
+        self.assertEqual(self.monitor.check(), [(self.nodes[2].id, True)])
+        # node 2 recovers and is removed before the next check
+        self._beat(1, self.nodes)
+        self.monitor.remove_node(self.nodes[2].id)
+        self.assertEqual(self.monitor.check(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.exceptions import QueueFullException, RateLimitedException, \
+    SchemaValidationException
+from cattleman.orchestrator.ingestion import RequestIngestion, RequestPriority, \
+    MIN_BUCKETS_SWEEP
+from cattleman.types import Fragment
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class _Clock:
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+class TestIngestion(unittest.TestCase):
+
+    def setUp(self):
+        print()
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.clock = _Clock()
+
+    def test_batches(self):
+        queue = RequestIngestion(capacity=10, batch_size=4, clock=self.clock)
+        futures = [queue.submit(f"r{i}", Fragment()) for i in range(6)]
+        self.assertEqual(queue.depth, 6)
+        self.clock.time = 1.5
+        self.assertEqual(queue.flush(), 4)
+        self.assertEqual(queue.flush(), 2)
+        self.assertEqual([f.result(0).name for f in futures], [f"r{i}" for i in range(6)])
+        stats = queue.stats
+        self.assertEqual((stats.persisted, stats.batches, stats.depth), (6, 2, 0))
+        self.assertAlmostEqual(stats.wait_time_max, 1.5)
+
+    def test_priorities(self):
+        queue = RequestIngestion(capacity=10, batch_size=2, clock=self.clock)
+        low = queue.submit("low", Fragment(), priority=RequestPriority.LOW)
+        high = queue.submit("high", Fragment(), priority=RequestPriority.HIGH)
+        queue.submit("normal", Fragment())
+        queue.flush()
+        self.assertTrue(high.done())
+        self.assertFalse(low.done())
+
+    def test_backpressure(self):
+        queue = RequestIngestion(capacity=2, clock=self.clock)
+        queue.submit("normal", Fragment())
+        low = queue.submit("low", Fragment(), priority=RequestPriority.LOW)
+        with self.assertRaises(QueueFullException):
+            queue.submit("low", Fragment(), priority=RequestPriority.LOW)
+        # a higher priority request evicts the newest lower priority one
+        queue.submit("high", Fragment(), priority=RequestPriority.HIGH)
+        self.assertIsInstance(low.exception(0), QueueFullException)
+        with self.assertRaises(QueueFullException):
+            queue.submit("normal", Fragment())
+        stats = queue.stats
+        self.assertEqual((stats.rejected_full, stats.evicted, stats.depth), (2, 1, 2))
+
+    def test_rate_limit(self):
+        queue = RequestIngestion(rate=1.0, burst=2.0, clock=self.clock)
+        queue.submit("a", Fragment(), source="client1")
+        queue.submit("b", Fragment(), source="client1")
+        with self.assertRaises(RateLimitedException):
+            queue.submit("c", Fragment(), source="client1")
+        # other sources have their own budget
+        queue.submit("c", Fragment(), source="client2")
+        self.clock.time = 1.0
+        queue.submit("d", Fragment(), source="client1")
+        self.assertEqual(queue.stats.rejected_rate, 1)
+
+    def test_fractional_rate(self):
+        queue = RequestIngestion(rate=0.5, clock=self.clock)
+        queue.submit("a", Fragment())
+        with self.assertRaises(RateLimitedException):
+            queue.submit("b", Fragment())
+        self.clock.time = 2.0
+        queue.submit("b", Fragment())
+        self.assertEqual(queue.stats.accepted, 2)
+
+    def test_idle_sources(self):
+        queue = RequestIngestion(capacity=10 * MIN_BUCKETS_SWEEP, rate=1.0, clock=self.clock)
+        for i in range(MIN_BUCKETS_SWEEP):
+            queue.submit(f"r{i}", Fragment(), source=f"client{i}")
+        # the buckets of the sources that went quiet are dropped once they refill
+        self.clock.time = 1.0
+        queue.submit("x", Fragment(), source="client0")
+        queue.submit("y", Fragment(), source="new")
+        self.assertEqual(len(queue._buckets), 2)
+        with self.assertRaises(RateLimitedException):
+            queue.submit("z", Fragment(), source="client0")
+
+    def test_invalid_fragment(self):
+        queue = RequestIngestion(clock=self.clock)
+        with self.assertRaises(SchemaValidationException):
+            queue.submit("bad", Fragment(retire=[1]))
+        self.assertEqual(queue.depth, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.exceptions import IPPoolExhaustedException, IPAddressConflictException
+from cattleman.network.ipam import IPAM, IPPool
+from cattleman.types import IPAddressType, PersistentResource
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestIPAM(unittest.TestCase):
+
+    def test_ipv4_pool(self):
+        pool = IPPool("v4", "10.0.0.0/29")
+        self.assertEqual(pool.type, IPAddressType.IPv4)
+        # network and broadcast addresses are skipped
+        addresses = pool.allocate_many(6)
+        self.assertEqual(addresses, [f"10.0.0.{i}" for i in range(1, 7)])
+        with self.assertRaises(IPPoolExhaustedException):
+            pool.allocate()
+        pool.free("10.0.0.3")
+        self.assertEqual(pool.allocate(), "10.0.0.3")
+        with self.assertRaises(IPAddressConflictException):
+            pool.reserve("10.0.0.4")
+        with self.assertRaises(ValueError):
+            pool.reserve("10.0.1.1")
+
+    def test_ipv4_pool_exhaustion_is_atomic(self):
+        pool = IPPool("v4", "10.0.0.0/30")
+        with self.assertRaises(IPPoolExhaustedException):
+            pool.allocate_many(3)
+        self.assertEqual(pool.allocate_many(2), ["10.0.0.1", "10.0.0.2"])
+
+    def test_ipv6_pool(self):
+        pool = IPPool("v6", "fd00::/64")
+        self.assertEqual(pool.type, IPAddressType.IPv6)
+        # the subnet-router anycast address is skipped
+        self.assertEqual(pool.allocate_many(3), ["fd00::1", "fd00::2", "fd00::3"])
+        self.assertIn("fd00::", pool)
+        pool.reserve("fd00::ffff")
+        pool.free("fd00::1")
+        self.assertEqual(pool.allocate(), "fd00::1")
+        self.assertEqual(pool.allocate(), "fd00::4")
+        self.assertIn("fd00::ffff", pool)
+        self.assertEqual(pool.used, 6)
+        # point-to-point networks use both addresses
+        self.assertEqual(IPPool("p2p", "fd00::/127").allocate_many(2), ["fd00::", "fd00::1"])
+
+    def test_large_ipv4_pool(self):
+        pool = IPPool("v4", "10.0.0.0/8")
+        self.assertEqual(pool.allocate_many(3), ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        pool.reserve("10.255.255.1")
+        self.assertEqual(pool.used, 6)
+        self.assertIn("10.255.255.255", pool)
+        # freed addresses are reused lowest first
+        pool.free("10.0.0.2")
+        pool.free("10.0.0.1")
+        self.assertEqual(pool.allocate(), "10.0.0.1")
+        self.assertEqual(pool.allocate(), "10.0.0.2")
+        self.assertEqual(pool.allocate(), "10.0.0.4")
+
+    def test_persistence(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        ipam = IPAM()
+        ipam.create_pool("nodes", "192.168.0.0/24")
+        ipam.create_pool("nodes6", "fd00::/120")
+        addresses = ipam.make_addresses("nodes", [f"node{i}" for i in range(10)])
+        self.assertEqual(addresses[-1].value, "192.168.0.10")
+        ipam.pool("nodes6").allocate_many(4)
+        ipam.commit()
+        # restore from disk
+        ipam2 = IPAM()
+        ipam2.load_from_disk()
+        self.assertEqual(ipam2.pool("nodes").used, ipam.pool("nodes").used)
+        self.assertEqual(ipam2.pool("nodes").allocate(), "192.168.0.11")
+        self.assertEqual(ipam2.pool("nodes6").allocate(), "fd00::5")
+
+    def test_delete(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        ipam = IPAM()
+        ipam.create_pool("nodes", "192.168.0.0/24")
+        ipam.attach()
+        try:
+            addresses = ipam.make_addresses("nodes", ["node0", "node1", "node2"])
+            PersistentResource.delete_many(addresses[1:2])
+            self.assertNotIn("192.168.0.2", ipam.pool("nodes"))
+            # network and broadcast addresses plus the two left
+            self.assertEqual(ipam.pool("nodes").used, 4)
+        finally:
+            ipam.detach()
+        # the freed address is persisted and handed out again
+        ipam2 = IPAM()
+        ipam2.load_from_disk()
+        self.assertEqual(ipam2.pool("nodes").allocate(), "192.168.0.2")
+
+
+if __name__ == '__main__':
+    unittest.main()
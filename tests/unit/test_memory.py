@@ -0,0 +1,76 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.resources import Cluster, IPAddress, Node, Request
+from cattleman.types import Fragment, IPAddressType, KnowledgeBase
+from cattleman.utils.memory import MemoryAccountant, deep_sizeof
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestMemory(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        KnowledgeBase.clear()
+
+    def test_deep_sizeof(self):
+        shared = "x" * 1000
+        a, b = {"s": shared}, {"s": shared}
+        seen = set()
+        size = deep_sizeof(a, seen)
+        self.assertGreater(size, 1000)
+        # the string is already accounted for
+        self.assertLess(deep_sizeof(b, seen), 1000)
+        # cycles
+        c = []
+        c.append(c)
+        self.assertGreater(deep_sizeof(c), 0)
+
+    def test_report(self):
+        cluster = Cluster.make("cluster")
+        ip = IPAddress.make("ip0", "8.8.8.8", IPAddressType.IPv4)
+        Node.make("node", [ip], cluster)
+        small = Request.make("small", Fragment(a=1))
+        large = Request.make("large", Fragment(blob=[f"{i:1000d}" for i in range(1000)]))
+        self.assertIs(KnowledgeBase.get(large.id), large)
+        accountant = MemoryAccountant(top=2)
+        report = accountant.report({"cache": {"key": "z" * 5000}})
+        self.assertEqual(report.types["request"].count, 2)
+        self.assertEqual(report.types["cluster"].count, 1)
+        self.assertEqual(report.types["node"].count, 1)
+        self.assertEqual(sum(u.count for u in report.types.values()), KnowledgeBase.size())
+        # the large request comes first
+        self.assertEqual(len(report.largest), 2)
+        self.assertEqual(report.largest[0][1], large.id)
+        self.assertGreater(report.largest[0][0], 1000 * 1000)
+        self.assertNotIn(small.id, [id for _, id, _ in report.largest[1:]])
+        self.assertGreater(report.index, 0)
+        self.assertGreater(report.caches["cache"], 5000)
+        # nothing traced
+        self.assertEqual(report.traced, 0)
+        self.assertEqual(report.sites, [])
+        summary = report.summary()
+        self.assertEqual(summary["knowledge_base"]["resources"], report.resources)
+        self.assertEqual(summary["largest"][0]["type"], "request")
+
+    def test_traced(self):
+        accountant = MemoryAccountant(top=3)
+        accountant.start()
+        try:
+            Request.make("large", Fragment(blob=[f"{i:1000d}" for i in range(1000)]))
+            report = accountant.report()
+        finally:
+            accountant.stop()
+        self.assertGreater(report.traced, 1000 * 1000)
+        self.assertLessEqual(len(report.sites), 3)
+        self.assertTrue(report.sites)
+
+
+if __name__ == '__main__':
+    unittest.main()
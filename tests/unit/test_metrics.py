@@ -0,0 +1,120 @@
+import importlib
+import math
+import os
+import random
+import tempfile
+import unittest
+import urllib.request
+
+import cattleman
+from cattleman.orchestrator.orchestrator import Orchestrator
+from cattleman.orchestrator.scheduler import Scheduler, PodSpec
+from cattleman.runtime.fake import FakeRuntime
+from cattleman.types import ResourceID, ResourceType
+from cattleman.utils.metrics import MetricsRegistry, Histogram, PrometheusExporter
+from cattleman.utils.timing_wheel import VirtualClock
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+
+    def test_histogram(self):
+        histogram, rng = Histogram("latency", "Latency"), random.Random(0)
+        values = sorted(rng.expovariate(100.0) for _ in range(20000))
+        for value in values:
+            histogram.observe(value)
+        self.assertEqual(histogram.count, len(values))
+        for q in (50, 90, 99, 99.9):
+            exact = values[math.ceil(q / 100 * len(values)) - 1]
+            # two significant digits
+            self.assertAlmostEqual(histogram.percentile(q), exact, delta=exact * 0.01)
+        self.assertEqual(histogram.percentile(100), values[-1])
+        # bounds that fall inside a bucket are rounded down to its start
+        for bound, seen in histogram.cumulative():
+            self.assertLessEqual(seen, sum(1 for v in values if v < bound))
+            self.assertGreaterEqual(seen, sum(1 for v in values if v < bound * 0.99))
+
+    def test_registry(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests")
+        self.assertIs(registry.counter("requests_total", "Requests"), counter)
+        with self.assertRaises(ValueError):
+            registry.gauge("requests_total", "Requests")
+        counter.inc()
+        counter.inc(2)
+        size = [7]
+        registry.gauge("size", "Size", lambda: size[0])
+        registry.histogram("duration_seconds", "Duration", buckets=(0.1, 1.0)).observe(0.5)
+        text = registry.expose()
+        self.assertIn("# TYPE cattleman_requests_total counter\ncattleman_requests_total 3\n",
+                      text)
+        self.assertIn("cattleman_size 7\n", text)
+        self.assertIn('cattleman_duration_seconds_bucket{le="0.1"} 0\n', text)
+        self.assertIn('cattleman_duration_seconds_bucket{le="1"} 1\n', text)
+        self.assertIn('cattleman_duration_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn("cattleman_duration_seconds_count 1\n", text)
+
+    def test_exporter(self):
+        registry = MetricsRegistry()
+        registry.counter("ticks_total", "Ticks").inc(5)
+        exporter = PrometheusExporter(registry)
+        path = os.path.join(tempfile.mkdtemp(), "metrics.prom")
+        exporter.write(path)
+        with open(path, "rt") as fin:
+            self.assertIn("cattleman_ticks_total 5", fin.read())
+        exporter.serve(0)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{exporter.address[1]}/metrics") as r:
+                self.assertIn("cattleman_ticks_total 5", r.read().decode("utf-8"))
+        finally:
+            exporter.close()
+
+    def test_orchestrator(self):
+        clock = VirtualClock()
+        cluster = ResourceID.make(ResourceType.CLUSTER)
+        application = ResourceID.make(ResourceType.APPLICATION)
+        scheduler = Scheduler()
+        for _ in range(2):
+            scheduler.add_node(ResourceID.make(ResourceType.NODE), cluster, 4)
+        # every start fails, pods are retried twice and then dropped
+        orchestrator = Orchestrator(scheduler=scheduler, runtime=FakeRuntime(failure_rate=1.0),
+                                    clock=clock, handle_signals=False, max_retries=2)
+        orchestrator.submit([PodSpec(f"pod{i}", application, cluster) for i in range(3)])
+        metrics = orchestrator.metrics
+        self.assertEqual(metrics["orchestrator_queue_depth"].value, 3)
+        for _ in range(5):
+            clock.advance(0.1)
+            orchestrator.tick()
+        orchestrator.close()
+        self.assertEqual(metrics["orchestrator_work_items_processed_total"].value, 9)
+        self.assertEqual(metrics["orchestrator_work_items_retried_total"].value, 6)
+        self.assertEqual(metrics["orchestrator_work_items_dropped_total"].value, 3)
+        self.assertEqual(orchestrator.stats.dropped, 3)
+        self.assertEqual(metrics["orchestrator_queue_depth"].value, 0)
+        self.assertEqual(metrics["orchestrator_tick_seconds"].count, 5)
+
+    def test_reconciliation_latency(self):
+        clock = VirtualClock()
+        cluster = ResourceID.make(ResourceType.CLUSTER)
+        application = ResourceID.make(ResourceType.APPLICATION)
+        scheduler = Scheduler()
+        scheduler.add_node(ResourceID.make(ResourceType.NODE), cluster, 4)
+        orchestrator = Orchestrator(scheduler=scheduler, clock=clock, handle_signals=False)
+        orchestrator.submit([PodSpec("pod", application, cluster)])
+        clock.advance(2.0)
+        orchestrator.tick()
+        latency = orchestrator.metrics["orchestrator_reconciliation_latency_seconds"]
+        self.assertEqual(latency.count, 1)
+        self.assertAlmostEqual(latency.percentile(50), 2.0, delta=0.02)
+        self.assertGreaterEqual(orchestrator.metrics["knowledge_base_resources"].value, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
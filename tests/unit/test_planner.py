@@ -0,0 +1,126 @@
+import importlib
+import os
+import threading
+import time
+import unittest
+
+import cattleman
+from cattleman.exceptions import DependencyCycleException
+from cattleman.orchestrator.planner import DependencyGraph, Planner
+from cattleman.resources import Pod, Application, Node, Cluster, Port, DNSRecord, Service
+from cattleman.types import ResourceID, TransportProtocol, DNSRecordType
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+def graph_of(edges) -> DependencyGraph:
+    graph = DependencyGraph()
+    for resource, dependency in edges:
+        graph.add_dependency(ResourceID(resource), ResourceID(dependency))
+    return graph
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def test_waves(self):
+        graph = graph_of([
+            ("pod1", "node"), ("pod1", "app"), ("pod2", "node"), ("pod2", "app"),
+            ("node", "cluster"), ("service", "app"), ("service", "port"),
+        ])
+        self.assertEqual(graph.waves(), [
+            ["app", "cluster", "port"],
+            ["node", "service"],
+            ["pod1", "pod2"],
+        ])
+
+    def test_cycle(self):
+        graph = graph_of([("a", "b"), ("b", "c"), ("c", "a"), ("d", "a"), ("a", "e")])
+        with self.assertRaises(DependencyCycleException) as context:
+            graph.waves()
+        self.assertEqual(context.exception.cycle, ["a", "b", "c", "a"])
+
+    def test_subgraph(self):
+        graph = graph_of([
+            ("node1", "cluster1"), ("node2", "cluster2"), ("pod1", "node1"), ("pod1", "app"),
+            ("pod2", "node2"),
+        ])
+        self.assertEqual(set(graph.subgraph(ResourceID("cluster1")).resources),
+                         {"cluster1", "node1", "pod1", "app"})
+
+    def test_from_database(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        cluster = Cluster.make("cluster")
+        node = Node.make("node", [], cluster)
+        application = Application.make("app")
+        port = Port.make("http", 80, 30080, TransportProtocol.TCP)
+        dns = DNSRecord.make("app.local", DNSRecordType.A, "10.0.0.1", 60)
+        service = Service.make("app", application, port, dns)
+        pod = Pod.make("pod", node, application)
+        waves = DependencyGraph.from_database().waves()
+        self.assertEqual([set(wave) for wave in waves], [
+            {cluster.id, application.id, port.id, dns.id},
+            {node.id, service.id},
+            {pod.id},
+        ])
+        self.assertNotIn(service.id, DependencyGraph.from_database(cluster.id))
+
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = graph_of([
+            ("pod1", "node"), ("pod2", "node"), ("pod3", "node2"), ("node", "cluster"),
+            ("node2", "cluster"),
+        ])
+
+    def test_order(self):
+        planner = Planner(self.graph)
+        order = []
+        lock = threading.Lock()
+
+        def action(resource):
+            with lock:
+                order.append(resource)
+
+        report = planner.bring_up(action)
+        self.assertTrue(report.ok)
+        self.assertEqual(order[0], "cluster")
+        self.assertEqual(set(order[-3:]), {"pod1", "pod2", "pod3"})
+        order.clear()
+        planner.tear_down(action)
+        self.assertEqual(set(order[:3]), {"pod1", "pod2", "pod3"})
+        self.assertEqual(order[-1], "cluster")
+
+    def test_parallel_waves(self):
+        planner = Planner(self.graph, workers=4)
+        report = planner.bring_up(lambda _: time.sleep(0.05))
+        # the three pods start together
+        self.assertEqual(len(report.waves), 3)
+        self.assertLess(report.waves[2].duration, 0.1)
+        self.assertGreaterEqual(report.duration, 0.15)
+
+    def test_failures(self):
+        planner = Planner(self.graph)
+
+        def action(resource):
+            if resource == "node":
+                raise RuntimeError("no route to host")
+
+        with self.assertLogs("planner", level="WARNING"):
+            report = planner.bring_up(action)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.failed, {"node": "no route to host"})
+        # only what depends on the failed node is skipped
+        self.assertEqual(sorted(report.skipped), ["pod1", "pod2"])
+        # tearing down, the node waits on its pods
+        with self.assertLogs("planner", level="WARNING"):
+            report = planner.tear_down(lambda r: action("node" if r == "pod1" else r))
+        self.assertEqual(list(report.failed), ["pod1"])
+        self.assertEqual(sorted(report.skipped), ["cluster", "node"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.exceptions import PortConflictException, PortsExhaustedException
+from cattleman.network.ports import PortAllocator, PortBitmap
+from cattleman.resources import Port
+from cattleman.types import TransportProtocol, PersistentResource
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+TCP = TransportProtocol.TCP
+UDP = TransportProtocol.UDP
+
+
+class TestPorts(unittest.TestCase):
+
+    def setUp(self):
+        self.ports = PortAllocator()
+
+    def test_bitmap_next_free(self):
+        bitmap = PortBitmap()
+        for port in range(1000, 1100):
+            bitmap.set(port)
+        self.assertEqual(bitmap.next_free(1000, 2000), 1100)
+        self.assertEqual(bitmap.next_free(1003, 1099), None)
+        self.assertEqual(bitmap.next_free(998, 2000), 998)
+        bitmap.clear(1050)
+        self.assertEqual(bitmap.next_free(1001, 2000), 1050)
+        self.assertEqual(len(bitmap), 99)
+
+    def test_conflicts(self):
+        self.ports.reserve(8080, TCP)
+        # same port, other protocol
+        self.ports.reserve(8080, UDP)
+        with self.assertRaises(PortConflictException):
+            self.ports.reserve(8080, TCP)
+        self.ports.release(8080, TCP)
+        self.ports.reserve(8080, TCP)
+
+    def test_per_ip(self):
+        self.ports.reserve(80, TCP, ip="10.0.0.1")
+        self.ports.reserve(80, TCP, ip="10.0.0.2")
+        # a wildcard reservation conflicts with every IP
+        with self.assertRaises(PortConflictException):
+            self.ports.reserve(80, TCP)
+        self.ports.reserve(81, TCP)
+        with self.assertRaises(PortConflictException):
+            self.ports.reserve(81, TCP, ip="10.0.0.1")
+        self.assertEqual(self.ports.next_free(TCP, 80, 90), 82)
+        self.assertEqual(self.ports.next_free(TCP, 80, 90, ip="10.0.0.3"), 80)
+
+    def test_allocate_many(self):
+        self.ports.reserve(30001, TCP)
+        ports = self.ports.allocate_many(3, TCP, 30000, 30010)
+        self.assertEqual(ports, [30000, 30002, 30003])
+        with self.assertRaises(PortsExhaustedException):
+            self.ports.allocate_many(10, TCP, 30000, 30010)
+        # failed batches do not leak reservations
+        self.assertEqual(self.ports.next_free(TCP, 30000, 30010), 30004)
+        with self.assertRaises(ValueError):
+            self.ports.allocate_many(5, TCP, 30000, 30010, owners=[None])
+
+    def test_sync_with_resources(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.ports.attach()
+        try:
+            port = Port.make("p1", 80, 8080, TCP)
+            with self.assertRaises(PortConflictException):
+                Port.make("p2", 80, 8080, TCP)
+            port.external = 8081
+            self.assertTrue(self.ports.is_free(8080, TCP))
+            self.assertEqual(self.ports.owner(8081, TCP), port.id)
+            port.protocol = UDP
+            self.assertTrue(self.ports.is_free(8081, TCP))
+            # rejected updates leave the resource untouched
+            Port.make("p3", 80, 9000, UDP)
+            with self.assertRaises(PortConflictException):
+                port.external = 9000
+            self.assertEqual(port.external, 8081)
+        finally:
+            self.ports.detach()
+        # rebuild from the ports table
+        ports = PortAllocator()
+        ports.load_from_disk()
+        self.assertEqual(ports.owner(8081, UDP), port.id)
+
+    def test_update_same_value(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.ports.attach()
+        try:
+            port = Port.make("p", 80, 8180, TCP)
+            port.external = 8180
+            port.protocol = TCP
+            self.assertFalse(self.ports.is_free(8180, TCP))
+            self.assertEqual(self.ports.owner(8180, TCP), port.id)
+            with self.assertRaises(PortConflictException):
+                Port.make("q", 81, 8180, TCP)
+        finally:
+            self.ports.detach()
+
+    def test_delete(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.ports.attach()
+        try:
+            port = Port.make("p", 80, 8280, TCP)
+            PersistentResource.delete_many([port])
+            self.assertTrue(self.ports.is_free(8280, TCP))
+            # the port can be taken again
+            other = Port.make("q", 80, 8280, TCP)
+            self.assertEqual(self.ports.owner(8280, TCP), other.id)
+        finally:
+            self.ports.detach()
+
+
+if __name__ == '__main__':
+    unittest.main()
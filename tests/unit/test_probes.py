@@ -0,0 +1,110 @@
+import asyncio
+import importlib
+import os
+import socket
+import unittest
+
+import cattleman
+from cattleman.orchestrator.probes import ProbeEngine, ProbeTarget, StatusWriter
+from cattleman.persistency import Persistency
+from cattleman.resources import Port, IPAddress
+from cattleman.types import TransportProtocol, Status, IPAddressType
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+TCP = TransportProtocol.TCP
+UDP = TransportProtocol.UDP
+
+
+def closed_port(type: int = socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, type) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestProbes(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.listener = socket.create_server(("127.0.0.1", 0), backlog=1024)
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(("127.0.0.1", 0))
+
+    def tearDown(self):
+        self.listener.close()
+        self.udp.close()
+
+    def _target(self, protocol: TransportProtocol, port: int, **kwargs) -> ProbeTarget:
+        resource = Port.make(f"p{port}", port, port, protocol)
+        return ProbeTarget.for_port(resource, "127.0.0.1", timeout=0.5, **kwargs)
+
+    def test_tcp_and_udp(self):
+        up_tcp = self._target(TCP, self.listener.getsockname()[1])
+        down_tcp = self._target(TCP, closed_port())
+        up_udp = self._target(UDP, self.udp.getsockname()[1])
+        down_udp = self._target(UDP, closed_port(socket.SOCK_DGRAM))
+        engine = ProbeEngine()
+        results = asyncio.run(engine.run_once([up_tcp, down_tcp, up_udp, down_udp]))
+        self.assertEqual([r.ok for r in results], [True, False, True, False])
+        self.assertEqual(results[1].error, "connection refused")
+        self.assertEqual(up_tcp.resource.get_status("reachable").value, Status.SUCCESS)
+        self.assertEqual(down_udp.resource.get_status("reachable").value, Status.FAILURE)
+        # the statuses were committed
+        row = Persistency.database("resources").get("ports", down_tcp.resource.id)
+        port = Port.deserialize(row["value"], dict(row))
+        self.assertEqual(port.get_status("reachable").value, Status.FAILURE)
+
+    def test_writer_coalescing(self):
+        writer = StatusWriter(batch_size=2)
+        ports = [Port.make(f"p{i}", 80, 30000 + i, TCP) for i in range(5)]
+        for port in ports:
+            writer.report(port, "reachable", Status.FAILURE)
+            writer.report(port, "reachable", Status.SUCCESS)
+        self.assertEqual(writer.pending, 5)
+        self.assertEqual(writer.flush(), 5)
+        # unchanged statuses are not written again
+        for port in ports:
+            writer.report(port, "reachable", Status.SUCCESS)
+        writer.report(ports[0], "reachable", Status.FAILURE, "timeout")
+        self.assertEqual(writer.flush(), 1)
+        stats = writer.stats
+        self.assertEqual((stats.coalesced, stats.unchanged, stats.written, stats.batches),
+                         (6, 4, 6, 4))
+
+    def test_concurrency_limit(self):
+        targets = [
+            ProbeTarget.for_address(IPAddress.make(f"ip{i}", "127.0.0.1", IPAddressType.IPv4),
+                                    self.listener.getsockname()[1], key=f"reachable:{i}")
+            for i in range(200)
+        ]
+        engine = ProbeEngine(concurrency=16)
+        results = asyncio.run(engine.run_once(targets))
+        self.assertTrue(all(r.ok for r in results))
+        self.assertLessEqual(engine.stats.max_in_flight, 16)
+        # the engine can be reused from another event loop
+        results = asyncio.run(engine.run_once(targets))
+        self.assertTrue(all(r.ok for r in results))
+        self.assertLessEqual(engine.stats.max_in_flight, 16)
+
+    def test_run(self):
+        target = self._target(TCP, self.listener.getsockname()[1], interval=0.02)
+        engine = ProbeEngine(flush_interval=0.05, seed=1)
+        engine.add(target)
+
+        async def run():
+            task = asyncio.create_task(engine.run())
+            await asyncio.sleep(0.3)
+            engine.shutdown()
+            await task
+
+        asyncio.run(run())
+        # probed repeatedly, written once
+        self.assertGreater(engine.stats.probes, 5)
+        self.assertEqual(engine.writer.stats.written, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
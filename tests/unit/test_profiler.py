@@ -0,0 +1,91 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+
+from cattleman.utils.profiler import SamplingProfiler, install_toggle
+
+
+def busy_loop(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.output = os.path.join(tempfile.mkdtemp(), "profile.folded")
+
+    def test_collapsed_stacks(self):
+        profiler = SamplingProfiler(self.output, interval=0.001)
+        profiler.start()
+        busy_loop(0.3)
+        profiler.stop()
+        self.assertFalse(profiler.running)
+        self.assertGreater(profiler.samples, 10)
+        with open(self.output, "rt") as fin:
+            lines = fin.read().splitlines()
+        stacks = {}
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            stacks[stack] = int(count)
+        self.assertEqual(stacks, profiler.stacks())
+        # root first, leaf last, thread name on top
+        busy = [s for s in stacks if "busy_loop (test_profiler.py:" in s]
+        self.assertTrue(busy)
+        self.assertTrue(all(s.startswith("MainThread;") for s in busy))
+        self.assertLess(busy[0].index("test_collapsed_stacks"), busy[0].index("busy_loop"))
+        # the sampler does not sample itself
+        self.assertFalse(any(s.startswith("profiler;") for s in stacks))
+
+    def test_periodic_flush(self):
+        profiler = SamplingProfiler(self.output, interval=0.001, flush_interval=0.05)
+        profiler.start()
+        try:
+            busy_loop(0.2)
+            self.assertTrue(os.path.isfile(self.output))
+        finally:
+            profiler.stop()
+
+    def test_sessions(self):
+        def first_session():
+            busy_loop(0.1)
+
+        def second_session():
+            busy_loop(0.1)
+
+        profiler = SamplingProfiler(self.output, interval=0.001)
+        profiler.start()
+        first_session()
+        profiler.stop()
+        profiler.start()
+        second_session()
+        profiler.stop()
+        # a new session does not carry the samples of the previous one
+        stacks = profiler.stacks()
+        self.assertFalse(any("first_session" in stack for stack in stacks))
+        self.assertTrue(any("second_session" in stack for stack in stacks))
+        with open(self.output, "rt") as fin:
+            self.assertNotIn("first_session", fin.read())
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 is not available")
+    def test_signal_toggle(self):
+        profiler = SamplingProfiler(self.output, interval=0.001)
+        previous = install_toggle(profiler)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            busy_loop(0.1)
+            self.assertTrue(profiler.running)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            busy_loop(0.1)
+            self.assertFalse(profiler.running)
+            self.assertTrue(os.path.isfile(self.output))
+        finally:
+            profiler.stop()
+            signal.signal(signal.SIGUSR1, previous)
+
+
+if __name__ == '__main__':
+    unittest.main()
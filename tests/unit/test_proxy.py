@@ -0,0 +1,193 @@
+import asyncio
+import importlib
+import os
+import socket
+import unittest
+
+import cattleman
+from cattleman.network.proxy import Proxy, ProxyRoute, routes_from_database, SPLICE_AVAILABLE
+from cattleman.relations import RelationsManager
+from cattleman.resources import Port, IPAddress
+from cattleman.types import TransportProtocol, ResourceID, ResourceType, RelationType, \
+    IPAddressType, PersistentResource, Status
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+TCP = TransportProtocol.TCP
+UDP = TransportProtocol.UDP
+
+
+def free_port(type: int = socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, type) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def tcp_echo(tag: bytes = b""):
+    async def handle(reader, writer):
+        while data := await reader.read(65536):
+            writer.write(tag + data)
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+class _UDPEcho(asyncio.DatagramProtocol):
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+async def roundtrip(port: int, payload: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(payload)
+    writer.write_eof()
+    data = await asyncio.wait_for(reader.read(), 2)
+    writer.close()
+    return data
+
+
+class TestProxy(unittest.TestCase):
+
+    def _run(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+    def _test_tcp(self, zero_copy: bool):
+        async def run():
+            server, backend = await tcp_echo()
+            port = free_port()
+            proxy = Proxy("127.0.0.1", zero_copy=zero_copy, pool_size=2)
+            await proxy.apply([ProxyRoute("echo", TCP, port, [("127.0.0.1", backend)])])
+            try:
+                payload = os.urandom(1024 * 1024)
+                self.assertEqual(await roundtrip(port, payload), payload)
+                # connections opened ahead of time are used by the next clients
+                results = await asyncio.gather(*[roundtrip(port, b"x" * i) for i in range(8)])
+                self.assertEqual(results, [b"x" * i for i in range(8)])
+                self.assertEqual(proxy.stats.connections, 9)
+                self.assertEqual(proxy.stats.failed, 0)
+            finally:
+                await proxy.close()
+                server.close()
+
+        self._run(run())
+
+    def test_tcp_copy(self):
+        self._test_tcp(zero_copy=False)
+
+    @unittest.skipUnless(SPLICE_AVAILABLE, "os.splice is not available")
+    def test_tcp_splice(self):
+        self._test_tcp(zero_copy=True)
+
+    def test_udp(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            echo, _ = await loop.create_datagram_endpoint(_UDPEcho, local_addr=("127.0.0.1", 0))
+            backend = echo.get_extra_info("sockname")[1]
+            port = free_port(socket.SOCK_DGRAM)
+            proxy = Proxy("127.0.0.1")
+            await proxy.apply([ProxyRoute("echo", UDP, port, [("127.0.0.1", backend)])])
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, ("127.0.0.1", port))
+                for i in range(3):
+                    await loop.sock_sendall(sock, b"ping%d" % i)
+                    self.assertEqual(await loop.sock_recv(sock, 64), b"ping%d" % i)
+                self.assertEqual(proxy.stats.datagrams, 3)
+            finally:
+                sock.close()
+                await proxy.close()
+                echo.close()
+
+        self._run(run())
+
+    def test_live_reload(self):
+        async def run():
+            server1, backend1 = await tcp_echo(b"1:")
+            server2, backend2 = await tcp_echo(b"2:")
+            port = free_port()
+            proxy = Proxy("127.0.0.1", pool_size=0)
+            await proxy.apply([ProxyRoute("echo", TCP, port, [("127.0.0.1", backend1)])])
+            try:
+                self.assertEqual(await roundtrip(port, b"a"), b"1:a")
+                # new connections go to the new backend
+                await proxy.apply([ProxyRoute("echo", TCP, port, [("127.0.0.1", backend2)])])
+                self.assertEqual(await roundtrip(port, b"b"), b"2:b")
+                # removed routes stop listening
+                await proxy.apply([])
+                with self.assertRaises(OSError):
+                    await roundtrip(port, b"c")
+            finally:
+                await proxy.close()
+                server1.close()
+                server2.close()
+
+        self._run(run())
+
+    def test_reload_triggers(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        proxy = Proxy("127.0.0.1")
+        proxy.attach()
+        try:
+            port = Port.make("http", 8080, 30080, TCP)
+            self.assertTrue(proxy.dirty)
+            proxy._dirty = False
+            # health checks do not move routes
+            port.update_status("reachable", Status.FAILURE, "timeout")
+            port.commit()
+            self.assertFalse(proxy.dirty)
+            port.external = 30081
+            self.assertTrue(proxy.dirty)
+            proxy._dirty = False
+            PersistentResource.delete_many([port])
+            self.assertTrue(proxy.dirty)
+        finally:
+            proxy.detach()
+
+    def test_affinity(self):
+        backends = [("10.0.0.%d" % i, 80) for i in range(1, 5)]
+        route = ProxyRoute("echo", TCP, 80, list(backends))
+        # round-robin
+        self.assertEqual([route.next_backend() for _ in range(5)], backends + backends[:1])
+        # consistent hashing on the client address
+        chosen = {c: route.next_backend(c) for c in ("a", "b", "c", "d", "e")}
+        self.assertEqual(chosen, {c: route.next_backend(c) for c in chosen})
+        self.assertEqual(len(route.candidates("a")), 4)
+        # clients of the backends that stay are not moved
+        route.update(backends[:3])
+        for client, backend in chosen.items():
+            if backend != backends[3]:
+                self.assertEqual(route.next_backend(client), backend)
+
+    def test_routes_from_database(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        port = Port.make("http", 8080, 30080, TCP)
+        ip = IPAddress.make("node1", "10.0.0.5", IPAddressType.IPv4)
+        service, application, pod, node = [ResourceID.make(t) for t in (
+            ResourceType.SERVICE, ResourceType.APPLICATION, ResourceType.POD, ResourceType.NODE
+        )]
+        RelationsManager.create_many_full([
+            (ResourceType.SERVICE, service, RelationType.BELONGS_TO, ResourceType.PORT, port.id),
+            (ResourceType.SERVICE, service, RelationType.BELONGS_TO, ResourceType.APPLICATION,
+             application),
+            (ResourceType.POD, pod, RelationType.BELONGS_TO, ResourceType.APPLICATION,
+             application),
+            (ResourceType.POD, pod, RelationType.BELONGS_TO, ResourceType.NODE, node),
+            (ResourceType.IP_ADDRESS, ip.id, RelationType.BELONGS_TO, ResourceType.NODE, node),
+        ])
+        routes = routes_from_database()
+        self.assertEqual(routes, [ProxyRoute(service, TCP, 30080, [("10.0.0.5", 8080)])])
+
+
+if __name__ == '__main__':
+    unittest.main()
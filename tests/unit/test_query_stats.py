@@ -0,0 +1,94 @@
+import importlib
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import cattleman
+from cattleman.persistency import Persistency, QueryStats, QUERY_SAMPLES
+from cattleman.relations import RelationsManager
+from cattleman.resources import Cluster, Node
+from cattleman.types import ResourceType
+from cattleman.utils.sqlite import normalize_query
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestQueryStats(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.database = Persistency.database("resources")
+
+    def tearDown(self):
+        self.database.profile(False)
+
+    def test_disabled(self):
+        self.assertFalse(self.database.profiling)
+        Cluster.make("cluster")
+        self.assertEqual(self.database.query_stats(), {})
+
+    def test_normalize(self):
+        self.assertEqual(normalize_query("SELECT * FROM pods\n  WHERE id='a''b' AND n=12;"),
+                         "SELECT * FROM pods WHERE id=? AND n=?;")
+        self.assertEqual(normalize_query("SELECT * FROM t WHERE id IN (?, ?,?)"),
+                         "SELECT * FROM t WHERE id IN (?, ...)")
+
+    def test_stats(self):
+        self.database.profile()
+        cluster = Cluster.make("cluster")
+        for i in range(3):
+            Node.make(f"node{i}", [], cluster)
+        rows = RelationsManager.get(destination=cluster.id)
+        self.assertEqual(len(rows), 3)
+        stats = self.database.query_stats()
+        select = [s for sql, s in stats.items() if sql.startswith("SELECT * FROM relations")]
+        self.assertEqual(len(select), 1)
+        self.assertEqual(select[0].calls, 1)
+        self.assertEqual(select[0].rows, 3)
+        # one statement for all the nodes, another for the cluster
+        inserts = [s for sql, s in stats.items() if sql.startswith("INSERT INTO nodes")]
+        self.assertEqual(inserts[0].calls, 3)
+        self.assertEqual(inserts[0].rows, 3)
+        self.database.reset_query_stats()
+        self.assertEqual(self.database.query_stats(), {})
+
+    def test_slow_queries(self):
+        self.database.profile(slow_threshold=0.0)
+        Cluster.make("cluster")
+        with self.assertLogs("DB:resources:slow", level="WARNING") as logs:
+            RelationsManager.get(origin_type=ResourceType.NODE)
+        self.assertIn("SELECT * FROM relations WHERE origin_type=?;", logs.output[0])
+        # the plan is part of the log
+        self.assertIn("SCAN relations", logs.output[0])
+        self.assertTrue(all(s.slow == s.calls for s in self.database.query_stats().values()))
+
+    def test_samples(self):
+        stats, rng = QueryStats(), random.Random(0)
+        for i in range(QUERY_SAMPLES * 4):
+            stats.add(i / 1000.0, 1, rng)
+        self.assertEqual(len(stats.samples), QUERY_SAMPLES)
+        self.assertEqual(stats.calls, QUERY_SAMPLES * 4)
+        # the sample spans the whole run
+        self.assertAlmostEqual(stats.percentile(50), QUERY_SAMPLES * 2 / 1000.0,
+                               delta=QUERY_SAMPLES * 0.4 / 1000.0)
+
+    def test_save(self):
+        path = os.path.join(tempfile.mkdtemp(), "queries.json")
+        self.assertIsNone(Persistency.save_query_stats(path))
+        self.database.profile()
+        Cluster.make("cluster")
+        self.assertEqual(Persistency.save_query_stats(path), path)
+        with open(path, "rt") as fin:
+            saved = json.load(fin)
+        self.assertIn("resources", saved["databases"])
+        summary = next(iter(saved["databases"]["resources"].values()))
+        self.assertEqual(summary["calls"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import importlib
+import os
+import unittest
+from collections import Counter
+
+import cattleman
+from cattleman.network.routing import HashRing, RoutingTable
+from cattleman.resources import Pod, Application, Node, Cluster, Port, DNSRecord, Service
+from cattleman.types import ResourceID, ResourceType, TransportProtocol, DNSRecordType, \
+    PersistentResource
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+KEYS = [f"client{i}" for i in range(10000)]
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_lookup(self):
+        ring = HashRing()
+        self.assertIsNone(ring.lookup("key"))
+        ring.add_many(["a", "b", "c"])
+        self.assertEqual(ring.size, 300)
+        counts = Counter(ring.lookup(k) for k in KEYS)
+        self.assertEqual(set(counts), {"a", "b", "c"})
+        # roughly balanced
+        self.assertGreater(min(counts.values()), len(KEYS) / 3 * 0.7)
+        self.assertEqual(ring.lookup_n("key", 5), ring.lookup_n("key", 3))
+        self.assertEqual(len(set(ring.lookup_n("key", 3))), 3)
+
+    def test_membership_changes(self):
+        ring = HashRing()
+        ring.add_many([f"m{i}" for i in range(10)])
+        before = {k: ring.lookup(k) for k in KEYS}
+        ring.add("m10")
+        after = {k: ring.lookup(k) for k in KEYS}
+        moved = [k for k in KEYS if before[k] != after[k]]
+        # only keys taken over by the new member move
+        self.assertTrue(all(after[k] == "m10" for k in moved))
+        self.assertLess(len(moved), len(KEYS) / 11 * 1.5)
+        # removing it restores the original assignment
+        ring.remove("m10")
+        self.assertEqual({k: ring.lookup(k) for k in KEYS}, before)
+
+    def test_weights(self):
+        ring = HashRing()
+        ring.add("small", 1.0)
+        ring.add("big", 3.0)
+        counts = Counter(ring.lookup(k) for k in KEYS)
+        self.assertGreater(counts["big"], 2 * counts["small"])
+        # lowering a weight only drops virtual nodes
+        ring.add("big", 1.0)
+        self.assertEqual(ring.size, 200)
+        reference = HashRing()
+        reference.add_many(["small", "big"])
+        self.assertEqual([ring.lookup(k) for k in KEYS], [reference.lookup(k) for k in KEYS])
+
+
+class TestRoutingTable(unittest.TestCase):
+
+    def test_incremental_updates(self):
+        table = RoutingTable()
+        application = ResourceID.make(ResourceType.APPLICATION)
+        service = ResourceID.make(ResourceType.SERVICE)
+        pods = [ResourceID.make(ResourceType.POD) for _ in range(3)]
+        table.add_pod(pods[0], application)
+        table.add_service(service, application)
+        table.add_pod(pods[1], application)
+        table.add_pod(pods[2], application)
+        self.assertEqual(set(table.ring(service).members), set(pods))
+        table.retire_pod(pods[0])
+        self.assertIn(table.route(service, "client"), pods[1:])
+        self.assertIsNone(table.route(ResourceID.make(ResourceType.SERVICE), "client"))
+
+    def test_sync_with_resources(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        application = Application.make("app")
+        node = Node.make("node", [], Cluster.make("cluster"))
+        port = Port.make("http", 80, 30080, TransportProtocol.TCP)
+        dns = DNSRecord.make("app.local", DNSRecordType.A, "10.0.0.1", 60)
+        service = Service.make("app", application, port, dns)
+        pod = Pod.make("pod1", node, application)
+        table = RoutingTable()
+        table.load_from_disk()
+        self.assertEqual(table.ring(service.id).members, [pod.id])
+        # pods created later join the ring
+        table.attach()
+        try:
+            new = Pod.make("pod2", node, application)
+        finally:
+            table.detach()
+        self.assertEqual(set(table.ring(service.id).members), {pod.id, new.id})
+
+    def test_retired_pods_leave(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        application = Application.make("app")
+        node = Node.make("node", [], Cluster.make("cluster"))
+        port = Port.make("http", 80, 30081, TransportProtocol.TCP)
+        dns = DNSRecord.make("app2.local", DNSRecordType.A, "10.0.0.2", 60)
+        service = Service.make("app", application, port, dns)
+        pods = [Pod.make(f"pod{i}", node, application) for i in range(2)]
+        table = RoutingTable()
+        table.load_from_disk()
+        table.attach()
+        try:
+            PersistentResource.delete_many([pods[0]])
+        finally:
+            table.detach()
+        self.assertEqual(table.ring(service.id).members, [pods[1].id])
+        self.assertEqual({table.route(service.id, k) for k in KEYS[:100]}, {pods[1].id})
+        # the deleted pod is not loaded again either
+        table = RoutingTable()
+        table.load_from_disk()
+        self.assertEqual(table.ring(service.id).members, [pods[1].id])
+
+
+if __name__ == '__main__':
+    unittest.main()
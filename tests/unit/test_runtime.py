@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+
+from cattleman.runtime.driver import PodHandle, PodState
+from cattleman.runtime.fake import FakeRuntime
+from cattleman.types import ResourceID, ResourceType
+
+
+def handles(nodes: int, pods: int):
+    nodes = [ResourceID.make(ResourceType.NODE) for _ in range(nodes)]
+    return [PodHandle(ResourceID.make(ResourceType.POD), nodes[i % len(nodes)])
+            for i in range(pods)]
+
+
+class TestFakeRuntime(unittest.TestCase):
+
+    def test_batching(self):
+        pods = handles(4, 100)
+        runtime = FakeRuntime(batch_size=10)
+
+        async def run():
+            results = await runtime.start_many(pods)
+            listing = await runtime.list({p.node for p in pods})
+            return results, listing
+
+        results, listing = asyncio.run(run())
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([r.pod for r in results], pods)
+        self.assertEqual({i.pod for i in listing if i.state is PodState.RUNNING},
+                         {p.pod for p in pods})
+        # 25 pods per node in batches of 10, plus one listing per node
+        self.assertEqual(runtime.stats.calls, 4 * 3 + 4)
+        self.assertEqual(runtime.stats.started, 100)
+
+    def test_pooling(self):
+        pods = handles(2, 40)
+        runtime = FakeRuntime(latency=0.01, batch_size=1, pool_size=3)
+
+        async def run():
+            await runtime.start_many(pods)
+            await runtime.stop_many(pods)
+
+        asyncio.run(run())
+        stats = runtime.pool.stats
+        # at most `pool_size` connections per node, reused across calls
+        self.assertEqual(stats.created, 6)
+        self.assertEqual(stats.reused, 80 - 6)
+        self.assertEqual(runtime.pods(), [])
+
+    def test_event_loops(self):
+        # e.g., the orchestrator runs each batch of calls in its own event loop
+        pods = handles(1, 10)
+        runtime = FakeRuntime(latency=0.001, batch_size=1, pool_size=1)
+        self.assertTrue(all(r.ok for r in asyncio.run(runtime.start_many(pods))))
+        self.assertTrue(all(r.ok for r in asyncio.run(runtime.stop_many(pods))))
+        self.assertEqual(runtime.pool.stats.created, 1)
+        self.assertEqual(runtime.pods(), [])
+
+    def test_failures(self):
+        pods = handles(2, 200)
+        broken = pods[0].node
+        runtime = FakeRuntime(failure_rate=0.1, seed=1, unreachable={broken})
+
+        with self.assertLogs("runtime", level="WARNING"):
+            results = asyncio.run(runtime.start_many(pods))
+        unreachable = [r for r in results if r.pod.node == broken]
+        self.assertTrue(all(not r.ok and "unreachable" in r.error for r in unreachable))
+        failed = [r for r in results if r.pod.node != broken and not r.ok]
+        self.assertTrue(0 < len(failed) < 30)
+        self.assertEqual(runtime.stats.failures, 100 + len(failed))
+
+    def test_watch(self):
+        pods = handles(1, 3)
+        runtime = FakeRuntime()
+
+        async def run():
+            events = []
+
+            async def consume():
+                async for event in runtime.watch():
+                    events.append((event.pod, event.state))
+
+            task = asyncio.create_task(consume())
+            await asyncio.sleep(0)
+            await runtime.start_many(pods)
+            runtime.crash(pods[0].pod)
+            await runtime.stop(pods[1])
+            await asyncio.sleep(0)
+            task.cancel()
+            return events
+
+        events = asyncio.run(run())
+        self.assertEqual(events[:2], [(pods[0].pod, PodState.STARTING),
+                                      (pods[0].pod, PodState.RUNNING)])
+        self.assertEqual(events[-2:], [(pods[0].pod, PodState.FAILED),
+                                       (pods[1].pod, PodState.STOPPED)])
+
+
+if __name__ == '__main__':
+    unittest.main()
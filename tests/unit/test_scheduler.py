@@ -0,0 +1,103 @@
+import importlib
+import os
+import unittest
+
+import cattleman
+from cattleman.exceptions import SchedulingException
+from cattleman.orchestrator.scheduler import Scheduler, PodSpec, BinPackPolicy, SpreadPolicy, \
+    ApplicationSpreadPolicy
+from cattleman.relations import RelationsManager
+from cattleman.types import ResourceID, RelationType, ResourceType
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+CLUSTER = ResourceID("cluster:00000000")
+
+
+def _node(i: int) -> ResourceID:
+    return ResourceID(f"node:{i:08x}")
+
+
+def _app(i: int) -> ResourceID:
+    return ResourceID(f"application:{i:08x}")
+
+
+def _pods(n: int, app: int = 0, demand: int = 1):
+    return [PodSpec(f"pod{i}", _app(app), CLUSTER, demand) for i in range(n)]
+
+
+class TestScheduler(unittest.TestCase):
+
+    @staticmethod
+    def _scheduler(policy, capacities):
+        scheduler = Scheduler(policy)
+        for i, capacity in enumerate(capacities):
+            scheduler.add_node(_node(i), CLUSTER, capacity)
+        return scheduler
+
+    def test_spread(self):
+        scheduler = self._scheduler(SpreadPolicy(), [4, 4, 4])
+        placements = scheduler.place_many(_pods(6))
+        used = [scheduler.node(_node(i)).used for i in range(3)]
+        self.assertEqual(used, [2, 2, 2])
+        self.assertEqual(len(placements), 6)
+
+    def test_binpack(self):
+        scheduler = self._scheduler(BinPackPolicy(), [4, 4, 4])
+        scheduler.place_many(_pods(6))
+        used = sorted(scheduler.node(_node(i)).used for i in range(3))
+        self.assertEqual(used, [0, 2, 4])
+
+    def test_application_spread(self):
+        scheduler = self._scheduler(ApplicationSpreadPolicy(), [10, 10, 10])
+        scheduler.place_many(_pods(3, app=0) + _pods(3, app=1))
+        for i in range(3):
+            self.assertEqual(scheduler.node(_node(i)).applications,
+                             {_app(0): 1, _app(1): 1})
+
+    def test_demand_and_capacity(self):
+        scheduler = self._scheduler(BinPackPolicy(), [1, 3])
+        self.assertEqual(scheduler.place(_pods(1, demand=2)[0]), _node(1))
+        self.assertEqual(scheduler.place(_pods(1, demand=2)[0]), None)
+        with self.assertRaises(SchedulingException):
+            scheduler.place_many(_pods(3))
+        # nothing was placed by the failed batch
+        self.assertEqual(scheduler.node(_node(0)).used, 0)
+        self.assertEqual(scheduler.node(_node(1)).used, 2)
+
+    def test_release(self):
+        scheduler = self._scheduler(SpreadPolicy(), [1, 1])
+        placements = scheduler.place_many(_pods(2))
+        self.assertIsNone(scheduler.place(_pods(1)[0]))
+        scheduler.release(placements[0].node, _app(0))
+        self.assertEqual(scheduler.place(_pods(1)[0]), placements[0].node)
+
+    def test_remove_node(self):
+        scheduler = self._scheduler(SpreadPolicy(), [5, 1])
+        scheduler.remove_node(_node(0))
+        self.assertEqual(scheduler.place(_pods(1)[0]), _node(1))
+        self.assertIsNone(scheduler.place(_pods(1)[0]))
+
+    def test_empty_cluster(self):
+        scheduler = self._scheduler(SpreadPolicy(), [1])
+        pod = PodSpec("pod", _app(0), ResourceID("cluster:0000000b"), 1)
+        for _ in range(3):
+            self.assertIsNone(scheduler.place(pod))
+
+    def test_bind(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        scheduler = self._scheduler(SpreadPolicy(), [2, 2])
+        placements = scheduler.place_many(_pods(3))
+        pods = Scheduler.bind(placements)
+        self.assertEqual(len(pods), 3)
+        relations = RelationsManager.get(origin=pods[0].id)
+        self.assertEqual({r["destination_type"] for r in relations},
+                         {ResourceType.NODE.value, ResourceType.APPLICATION.value})
+        self.assertEqual({r["relation"] for r in relations}, {RelationType.BELONGS_TO.value})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+
+from cattleman.exceptions import SchemaValidationException
+from cattleman.types import ResourceID, ResourceType
+from cattleman.utils.schemas import SchemaRegistry, load_schema
+
+TEST_VERSION = "test"
+
+
+def _register(name: str, schema: dict):
+    # schemas of a version that does not exist on disk
+    # noinspection PyUnresolvedReferences
+    SchemaRegistry._SchemaRegistry__versions.add(TEST_VERSION)
+    # noinspection PyUnresolvedReferences
+    SchemaRegistry._SchemaRegistry__raw[(name, TEST_VERSION)] = schema
+
+
+def _service(**port) -> dict:
+    return {
+        "application": "application:abcdef02",
+        "port": {
+            "internal": 8080,
+            "external": 80,
+            "protocol": "tcp",
+            **port
+        }
+    }
+
+
+class TestSchemas(unittest.TestCase):
+
+    def test_load_bundled_schema(self):
+        schema = load_schema("fragment", "1.0")
+        self.assertEqual(schema["type"], "object")
+        # schemas are loaded once
+        self.assertIs(schema, load_schema("fragment", "v1.0"))
+
+    def test_missing_schema(self):
+        with self.assertRaises(FileNotFoundError):
+            load_schema("not_a_schema", "1.0")
+
+    def test_refs_are_resolved(self):
+        schema = SchemaRegistry.resolved("fragment", "1.0")
+        service = schema["properties"]["services"]["items"]
+        self.assertNotIn("$ref", service)
+        self.assertEqual(service["properties"]["port"]["properties"]["internal"]["maximum"], 65535)
+        self.assertEqual(schema["properties"]["retire"]["items"]["type"], "string")
+
+    def test_validator_is_cached(self):
+        self.assertIs(SchemaRegistry.validator("fragment", "1.0"),
+                      SchemaRegistry.validator("fragment", "1.0"))
+
+    def test_valid_fragment(self):
+        SchemaRegistry.validate("fragment", "1.0", {
+            "services": [_service()],
+            "retire": ["service:abcdef01"]
+        })
+
+    def test_invalid_fragments(self):
+        fragments = [
+            {"services": [_service(internal=0)]},
+            {"services": [_service(protocol="sctp")]},
+            {"services": [_service(extra=1)]},
+            {"services": [{"port": _service()["port"]}]},
+            {"retire": ["not-an-id"]},
+            {"services": {}},
+        ]
+        errors = SchemaRegistry.validate_many("fragment", "1.0", fragments)
+        self.assertTrue(all(e is not None for e in errors), errors)
+        self.assertTrue(errors[0].startswith("/services/0/port/internal:"), errors[0])
+        with self.assertRaises(SchemaValidationException):
+            SchemaRegistry.validate("fragment", "1.0", fragments[0])
+
+    def test_generated_ids(self):
+        # IDs made by ResourceID.make, written by older versions and by the database generator
+        ids = [ResourceID.make(ResourceType.APPLICATION), "application:abcdef02",
+               "application:s0000001"]
+        errors = SchemaRegistry.validate_many("fragment", "1.0", [
+            {"services": [dict(_service(), application=id)]} for id in ids
+        ])
+        self.assertEqual(errors, [None] * 3)
+        errors = SchemaRegistry.validate_many("fragment", "1.0", [
+            {"retire": [id]} for id in ("service:abcdef0", "service:abcdef0123", "Service:abcdef01")
+        ])
+        self.assertTrue(all(e is not None for e in errors), errors)
+
+    def test_bulk_validation(self):
+        fragments = [{"services": [_service()]}] * 10 + [{"retire": [1]}]
+        errors = SchemaRegistry.validate_many("fragment", "1.0", fragments)
+        self.assertEqual(errors[:10], [None] * 10)
+        self.assertIsNotNone(errors[10])
+
+    def test_recursive_pointer(self):
+        _register("tree", {
+            "definitions": {
+                "node": {
+                    "type": "object",
+                    "properties": {"children": {"type": "array",
+                                                "items": {"$ref": "#/definitions/node"}}}
+                },
+                "leaf": {"$ref": "#/definitions/value"},
+                "value": {"type": "integer"},
+            },
+            "$ref": "#/definitions/node"
+        })
+        with self.assertRaises(SchemaValidationException) as context:
+            SchemaRegistry.resolved("tree", TEST_VERSION)
+        self.assertIn("tree.json#/definitions/node -> tree.json#/definitions/node",
+                      str(context.exception))
+        # the same target reached twice, but not recursively, is fine
+        _register("pair", {
+            "type": "array",
+            "items": [{"$ref": "tree.json#/definitions/leaf"},
+                      {"$ref": "tree.json#/definitions/leaf"}]
+        })
+        self.assertEqual(SchemaRegistry.resolved("pair", TEST_VERSION)["items"],
+                         [{"type": "integer"}, {"type": "integer"}])
+
+    def test_tuple_items(self):
+        _register("tuple", {
+            "type": "array",
+            "items": [{"type": "string"}, {"type": "integer"}],
+            "maxItems": 3
+        })
+        errors = SchemaRegistry.validate_many("tuple", TEST_VERSION, [
+            ["a", 1], ["a"], ["a", 1, None], [1, 1], ["a", "b"], ["a", 1, None, None]
+        ])
+        self.assertEqual(errors[:3], [None] * 3)
+        self.assertTrue(errors[3].startswith("/0:"), errors[3])
+        self.assertTrue(errors[4].startswith("/1:"), errors[4])
+        self.assertIsNotNone(errors[5])
+
+
+if __name__ == '__main__':
+    unittest.main()
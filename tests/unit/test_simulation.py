@@ -0,0 +1,104 @@
+import importlib
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import cattleman
+from cattleman.persistency import Persistency
+from cattleman.orchestrator.simulation import Scenario, Simulation, RequestBurst, NodeFailure, \
+    PodChurn
+from cattleman.types import KnowledgeBase, ResourceType
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+INCLUDE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "include"))
+
+# runs a scenario in a fresh interpreter and prints its summary
+SIMULATE = """
+import json
+from cattleman.orchestrator.simulation import Scenario, Simulation
+scenario = Scenario.generate(hours=2, nodes=60, failures_per_hour=20, seed=7)
+summary = Simulation(scenario).run().summary()
+summary.pop("wall_time_s")
+summary.pop("speedup")
+print(json.dumps(summary))
+"""
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+
+    def test_convergence(self):
+        scenario = Scenario(duration=120.0, nodes=10, capacity=10, applications=2, events=[
+            RequestBurst(0.0, 60),
+            NodeFailure(30.0, nodes=2, detection=5.0, recovery=None),
+            RequestBurst(60.0, 20),
+        ])
+        simulation = Simulation(scenario)
+        report = simulation.run()
+        stats = report.orchestrator
+        self.assertEqual(report.ticks, 1200)
+        self.assertEqual(simulation.orchestrator.running, 80)
+        self.assertEqual(simulation.orchestrator.pending, 0)
+        self.assertGreater(stats.evicted, 0)
+        self.assertEqual(stats.started, 80 + stats.evicted)
+        # the initial burst, the eviction and the second burst
+        self.assertEqual(stats.convergences, 3)
+        self.assertLess(stats.convergence_max, 1.0)
+        self.assertGreater(report.db_writes, 80)
+
+    def test_saturation(self):
+        scenario = Scenario(duration=60.0, nodes=2, capacity=5, events=[RequestBurst(0.0, 12)])
+        stats = Simulation(scenario).run().orchestrator
+        # two pods never fit, the cluster never converges
+        self.assertEqual(stats.queue_depth_max, 12)
+        self.assertEqual(stats.convergences, 0)
+        self.assertAlmostEqual(stats.queue_depth_mean, 2.0, delta=0.1)
+
+    def test_deterministic(self):
+        scenario = Scenario.generate(hours=2, nodes=60, failures_per_hour=20, seed=7)
+        self.assertTrue(any(isinstance(e, PodChurn) for e in scenario.events))
+        # separate processes, so that nothing depends on memory addresses or string hashes
+        reports = []
+        for seed in ("1", "2"):
+            env = {**os.environ, "PYTHONPATH": INCLUDE, "PYTHONHASHSEED": seed}
+            process = subprocess.run([sys.executable, "-c", SIMULATE], env=env, check=True,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            reports.append(json.loads(process.stdout))
+        self.assertEqual(reports[0], reports[1])
+        self.assertGreater(reports[0]["evicted"], 0)
+        self.assertGreater(reports[0]["failed_starts"], 0)
+        self.assertGreater(reports[0]["retired"], 0)
+
+    def test_no_phantom_pods(self):
+        # a scratch database, nothing left over from the other tests
+        Persistency.relocate("resources", ":memory:")
+        KnowledgeBase.clear()
+        scenario = Scenario.generate(hours=0.25, nodes=20, capacity=8, failure_rate=0.05, seed=3)
+        simulation = Simulation(scenario)
+        stats = simulation.run().orchestrator
+        self.assertGreater(stats.failed_starts, 0)
+        self.assertGreater(stats.retired, 0)
+        # only the running pods are left, in the database and in the KnowledgeBase
+        running = set(simulation.orchestrator.pods())
+        self.assertEqual(len(running), simulation.orchestrator.running)
+        database = Persistency.database("resources")
+        self.assertEqual({row["id"] for row in database.all("pods")}, running)
+        relations = database.fetchall("SELECT origin FROM relations WHERE origin_type=?;",
+                                      ResourceType.POD.value)
+        self.assertEqual({row["origin"] for row in relations}, running)
+        self.assertEqual(len(relations), 2 * len(running))
+        pods = {id for id, r in KnowledgeBase.resources().items()
+                if r.get_type() is ResourceType.POD}
+        self.assertEqual(pods, running)
+
+
+if __name__ == '__main__':
+    unittest.main()
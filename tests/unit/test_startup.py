@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CATTLE = os.path.join(ROOT, "include", "cattleman", "bin", "cattle")
+
+# microseconds spent importing modules, from the first cattleman module on
+BUDGET = 100000
+# none of these are needed to print the help or the summary of the database
+HEAVY = ["cbor2", "dateutil", "semantic_version", "cpk", "docker", "jsonschema",
+         "cattleman.types"]
+
+
+def _importtime(*args: str) -> Tuple[int, List[str]]:
+    directory = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.path.join(ROOT, "include"),
+        "CATTLEMAN_USER_DATA_DIR": directory,
+        "CATTLEMAN_RESOURCES_DB": os.path.join(directory, "resources.db"),
+    }
+    process = subprocess.run([sys.executable, "-X", "importtime", CATTLE, *args], env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                             check=True)
+    # lines look like "import time: <self us> | <cumulative us> | <indented module name>"
+    total, modules, started = 0, [], False
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        started = started or name.strip().startswith("cattleman")
+        # top-level imports only, the nested ones are part of their cumulative time
+        if started and not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
+
+
+class TestStartup(unittest.TestCase):
+
+    def _check(self, total: int, modules: List[str], heavy: List[str]):
+        for module in heavy:
+            self.assertNotIn(module, modules)
+        self.assertLess(total, BUDGET, f"imports took {total / 1000:.1f}ms")
+
+    def test_help(self):
+        total, modules = _importtime("--help")
+        self._check(total, modules, HEAVY + ["cattleman.persistency"])
+        # commands are only imported when they run
+        self.assertFalse([m for m in modules if m.startswith("cattleman.cli.commands.")])
+
+    def test_info(self):
+        total, modules = _importtime("info")
+        self._check(total, modules, HEAVY)
+        self.assertIn("cattleman.cli.commands.info", modules)
+        self.assertNotIn("cattleman.cli.commands.manager", modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
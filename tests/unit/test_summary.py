@@ -0,0 +1,107 @@
+import importlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import cattleman
+from cattleman.persistency import Persistency
+from cattleman.resources import Application, Cluster, IPAddress, Node, Pod
+from cattleman.types import IPAddressType, PersistentResource, Status
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestSummary(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+
+    @staticmethod
+    def _failing(key: str) -> int:
+        return Persistency.summary().failures.get("pod", {}).get(key, 0)
+
+    def test_counts(self):
+        before = Persistency.summary()
+        cluster = Cluster.make("cluster")
+        ip = IPAddress.make("ip0", "8.8.8.8", IPAddressType.IPv4)
+        node = Node.make("node", [ip], cluster)
+        application = Application.make("application")
+        for i in range(3):
+            Pod.make(f"pod{i}", node, application)
+        # updates do not count
+        application.commit()
+        after = Persistency.summary()
+        delta = {t: after.resources[t] - before.resources.get(t, 0) for t in after.resources}
+        self.assertEqual(delta["clusters"], 1)
+        self.assertEqual(delta["nodes"], 1)
+        self.assertEqual(delta["ip_addresses"], 1)
+        self.assertEqual(delta["applications"], 1)
+        self.assertEqual(delta["pods"], 3)
+        self.assertEqual(delta["requests"], 0)
+        # the counts match the tables
+        db = Persistency.database("resources")
+        for table, count in after.resources.items():
+            self.assertEqual(count, db.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0])
+        relations = db.fetchall("SELECT relation, COUNT(*) AS n FROM relations GROUP BY relation;")
+        self.assertEqual(after.relations, {row["relation"]: row["n"] for row in relations})
+        self.assertGreater(after.size, 0)
+
+    def test_failures(self):
+        cluster = Cluster.make("cluster")
+        ip = IPAddress.make("ip0", "8.8.8.8", IPAddressType.IPv4)
+        node = Node.make("node", [ip], cluster)
+        application = Application.make("application")
+        pods = [Pod.make(f"pod{i}", node, application) for i in range(3)]
+        failing = self._failing("health")
+        pods[0].update_status("health", Status.FAILURE, "probe timed out")
+        pods[0].commit()
+        self.assertEqual(self._failing("health"), failing + 1)
+        recent = Persistency.summary(recent=100).recent_failures
+        self.assertIn((pods[0].id, "health", "probe timed out"),
+                      [(f["id"], f["key"], f["description"]) for f in recent])
+        # batches
+        for pod in pods[1:]:
+            pod.update_status("health", Status.FAILURE)
+        pods[0].update_status("health", Status.SUCCESS)
+        PersistentResource.commit_many(pods)
+        self.assertEqual(self._failing("health"), failing + 2)
+
+    def test_failures_on_load(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "resources.db")
+        Persistency.relocate("resources", path)
+        try:
+            cluster = Cluster.make("cluster")
+            node = Node.make("node", [], cluster)
+            pod = Pod.make("pod", node, Application.make("application"))
+            pod.update_status("health", Status.FAILURE)
+            pod.commit()
+            # loading does not write
+            db = Persistency.database("resources")
+            changes = db.changes
+            Persistency.load_from_disk()
+            self.assertEqual(db.changes, changes)
+            # a database written before the table existed
+            db.execute("DROP TABLE failures;")
+            db.commit()
+            Persistency.relocate("resources", path)
+            db = Persistency.database("resources")
+            self.assertEqual(db.created_tables, {"failures"})
+            self.assertEqual(self._failing("health"), 0)
+            Persistency.load_from_disk()
+            self.assertEqual(self._failing("health"), 1)
+            # filled once
+            changes = db.changes
+            Persistency.load_from_disk()
+            self.assertEqual(db.changes, changes)
+        finally:
+            Persistency.relocate("resources", ":memory:")
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
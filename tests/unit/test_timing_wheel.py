@@ -0,0 +1,120 @@
+import unittest
+
+from cattleman.utils.timing_wheel import TimingWheel, VirtualClock
+
+
+class Recorder:
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.calls = []
+
+    def __call__(self, payloads):
+        self.calls.append((self.clock(), sorted(payloads)))
+
+    @property
+    def payloads(self):
+        return [p for _, batch in self.calls for p in batch]
+
+
+class TestTimingWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.wheel = TimingWheel(tick=1.0, clock=self.clock)
+        self.fired = Recorder(self.clock)
+
+    def _run_until(self, when: float):
+        while self.clock() < when:
+            self.clock.advance(1.0)
+            self.wheel.advance()
+
+    def test_never_early(self):
+        self.wheel.schedule(2.5, self.fired, "a")
+        self._run_until(2.0)
+        self.assertEqual(self.fired.calls, [])
+        self._run_until(3.0)
+        self.assertEqual(self.fired.calls, [(3.0, ["a"])])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancel(self):
+        timer = self.wheel.schedule(5, self.fired, "a")
+        self.wheel.schedule(5, self.fired, "b")
+        self.assertEqual(len(self.wheel), 2)
+        self.assertTrue(timer.cancel())
+        self.assertFalse(timer.cancel())
+        self.assertFalse(timer.active)
+        self._run_until(10)
+        self.assertEqual(self.fired.payloads, ["b"])
+
+    def test_batching(self):
+        other = Recorder(self.clock)
+        for i in range(100):
+            self.wheel.schedule(3, self.fired, i)
+        self.wheel.schedule(3, other, "x")
+        self.clock.advance(10)
+        self.assertEqual(self.wheel.advance(), 101)
+        # one call per callback per tick
+        self.assertEqual(self.fired.calls, [(10, list(range(100)))])
+        self.assertEqual(other.payloads, ["x"])
+
+    def test_cascading(self):
+        # timers beyond the first level move down the wheels and still fire on time
+        delays = [1, 255, 256, 257, 1000, 65535, 65536, 70000, 3 * 65536 + 17]
+        for delay in delays:
+            self.wheel.schedule(delay, self.fired, delay)
+        self._run_until(max(delays))
+        self.assertEqual(self.fired.calls, [(float(d), [d]) for d in delays])
+
+    def test_insertion_order(self):
+        # same-tick timers fire in the order they were set, also after cascading
+        calls = []
+        order = [f"t{i}" for i in reversed(range(50))]
+        for delay in (3, 300):
+            for payload in order:
+                self.wheel.schedule(delay, calls.append, payload)
+            self.wheel.schedule(delay, calls.append, "late")
+        self._run_until(300)
+        self.assertEqual(calls, [order + ["late"]] * 2)
+
+    def test_beyond_span(self):
+        wheel = TimingWheel(tick=1.0, clock=self.clock, bits=2, levels=2)
+        wheel.schedule(40, self.fired, "far")
+        for _ in range(40):
+            self.clock.advance(1.0)
+            wheel.advance()
+        self.assertEqual(self.fired.calls, [(40.0, ["far"])])
+
+    def test_large_steps(self):
+        self.wheel.schedule(100000, self.fired, "late")
+        self.wheel.schedule(10, self.fired, "early")
+        self.clock.advance(99999)
+        self.assertEqual(self.wheel.advance(), 1)
+        self.clock.advance(1)
+        self.assertEqual(self.wheel.advance(), 1)
+        self.assertEqual(self.fired.payloads, ["early", "late"])
+
+    def test_rescheduling_from_callback(self):
+        def again(payloads):
+            self.fired(payloads)
+            if len(self.fired.calls) < 3:
+                self.wheel.schedule(0, again, payloads[0])
+
+        self.wheel.schedule(1, again, "a")
+        self._run_until(5)
+        # a timer scheduled while expiring fires on the next tick
+        self.assertEqual([t for t, _ in self.fired.calls], [1.0, 2.0, 3.0])
+
+    def test_failing_callback(self):
+        def fail(_):
+            raise RuntimeError("boom")
+
+        self.wheel.schedule(1, fail, "a")
+        self.wheel.schedule(1, self.fired, "b")
+        with self.assertLogs("timers", level="ERROR"):
+            self._run_until(1)
+        self.assertEqual(self.fired.payloads, ["b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import importlib
+import os
+import tempfile
+import unittest
+
+import cattleman
+from cattleman.persistency import Persistency
+from cattleman.relations import RelationsManager
+from cattleman.resources import Application, Node, Cluster, Port, DNSRecord, Service, Pod, \
+    Request
+from cattleman.types import TransportProtocol, DNSRecordType, Fragment, PersistentResource
+from cattleman.utils.trace import TraceRecorder, TraceReader, TraceReplayer, percentile
+
+os.environ.update({
+    f"CATTLEMAN_RESOURCES_DB": ":memory:"
+})
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        # noinspection PyTypeChecker
+        importlib.reload(cattleman.persistency)
+        self.tmp = tempfile.mkdtemp()
+        self.trace = os.path.join(self.tmp, "trace.cbor")
+
+    def _record(self):
+        with TraceRecorder(self.trace) as recorder:
+            cluster = Cluster.make("cluster")
+            node = Node.make("node", [], cluster)
+            application = Application.make("app")
+            port = Port.make("http", 80, 30080, TransportProtocol.TCP)
+            dns = DNSRecord.make("app.local", DNSRecordType.A, "10.0.0.1", 60)
+            Service.make("app", application, port, dns)
+            Pod.make("pod", node, application)
+            # e.g., a retired pod
+            PersistentResource.delete_many([Pod.make("retired", node, application)])
+            port.external = 30081
+            Request.make_many(["r1", "r2"], [Fragment(), Fragment()], validate=False)
+        return recorder
+
+    def test_record(self):
+        recorder = self._record()
+        self.assertFalse(recorder.recording)
+        # the original methods are back
+        self.assertNotIn("traced", PersistentResource.commit.__name__)
+        records = list(TraceReader(self.trace))
+        self.assertEqual(len(records), recorder.records)
+        ops = [op for _, op, _ in records]
+        self.assertEqual(ops.count("make"), 8)
+        self.assertEqual(ops.count("set"), 1)
+        self.assertEqual(ops.count("delete"), 1)
+        # node -> cluster, service -> application/port/dns, pods -> node/application
+        self.assertEqual(sum(len(items) for _, op, items in records if op == "relate"), 8)
+        # one record for the whole batch of requests
+        self.assertEqual([len(items) for _, op, items in records if op == "request"], [2])
+        times = [t for t, _, _ in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_replay(self):
+        self._record()
+        target = os.path.join(self.tmp, "replay.db")
+        report = TraceReplayer(self.trace).replay(target)
+        self.assertEqual(report.items, 8 + 1 + 8 + 2 + 1)
+        # the empty schema is the baseline
+        self.assertGreater(report.db_size_before, 0)
+        self.assertGreaterEqual(report.db_growth, 0)
+        self.assertGreater(report.summary()["ops_per_second"], 0)
+        # the new database has the same content
+        database = Persistency.database("resources")
+        self.assertEqual(database.path, target)
+        port = database.fetchall("SELECT * FROM ports;")[0]
+        self.assertEqual(Port.deserialize(port["value"], dict(port)).external, 30081)
+        self.assertEqual(len(RelationsManager.get()), 6)
+        # the deleted pod is gone
+        pods = [Pod.deserialize(row["value"], dict(row)).name for row in database.all("pods")]
+        self.assertEqual(pods, ["pod"])
+        self.assertEqual(len(database.all("requests")), 2)
+
+    def test_replay_speed(self):
+        self._record()
+        waits = []
+        records = list(TraceReader(self.trace))
+        TraceReplayer(self.trace, speed=2.0, sleep=waits.append).replay(
+            os.path.join(self.tmp, "replay.db"))
+        # never waits longer than the (scaled) recording lasted
+        self.assertTrue(waits)
+        self.assertLessEqual(max(waits), records[-1][0] / 2.0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()